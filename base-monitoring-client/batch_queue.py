@@ -0,0 +1,190 @@
+# base-monitoring-client/batch_queue.py
+"""
+Bounded buffer between pipeline stages, built for bulk hand-over.
+
+BatchQueue keeps queue.Queue's item interface (put/get with timeouts,
+queue.Full/queue.Empty, qsize), so monitor_impl code does not change, and
+adds bulk operations for the stages that move many items at once:
+
+    raw = BatchQueue(1000, policy="drop_oldest", name="raw")
+    raw.put_many(records)                              # one lock round-trip
+    items = raw.drain_all(timeout=4.0, min_items=500)  # one wake-up
+
+drain_all() sleeps until min_items are buffered (or the timeout expires)
+and then takes everything. Producers only wake the consumer once that
+threshold is reached, not on every put, so a push window costs a single
+wake-up. The buffer is meant for a single consumer at a time.
+
+What happens when the buffer is full is a per-buffer policy:
+
+* drop_newest - refuse the new item (queue.Full), without waiting;
+* drop_oldest - evict the oldest buffered item and take the new one;
+* block       - wait for room up to the caller's put() timeout (or
+                block_timeout_s), then refuse the item.
+
+Every refused or evicted item is counted in `dropped` and, for a named
+buffer, in the queue_dropped_total{queue=<name>} self-metric.
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+from self_metrics import METRICS
+
+POLICIES = ("drop_newest", "drop_oldest", "block")
+
+
+class BatchQueue:
+    def __init__(
+        self,
+        maxsize: int,
+        policy: str = "drop_newest",
+        name: str = "",
+        block_timeout_s: float = 1.0,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(
+                f"unknown overflow policy {policy!r} (expected one of {', '.join(POLICIES)})"
+            )
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.block_timeout_s = block_timeout_s
+        self.dropped = 0
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._wake_at = 0  # items the waiting consumer wants; 0: nobody waits
+        self._interrupted = False
+        self._m_dropped = METRICS.counter("queue_dropped_total", queue=name) if name else None
+
+    # ---- producer side ----
+
+    def put(self, item, block: bool = True, timeout: float = None):
+        """Add one item; raises queue.Full if the policy refuses it."""
+        if not self._put(item, block, timeout):
+            raise queue.Full
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    def put_many(self, items, timeout: float = None) -> int:
+        """Add a sequence of items in order under one lock; returns how many were accepted."""
+        end = None
+        if self.policy == "block":
+            end = time.monotonic() + (self.block_timeout_s if timeout is None else timeout)
+        accepted = 0
+        with self._lock:
+            for item in items:
+                if len(self._items) >= self.maxsize and not self._make_room(True, timeout, end):
+                    break
+                self._items.append(item)
+                accepted += 1
+            if accepted < len(items):
+                self._count_drop(len(items) - accepted)
+            self._wake_consumer()
+        return accepted
+
+    def _put(self, item, block: bool, timeout: float) -> bool:
+        with self._lock:
+            if len(self._items) >= self.maxsize and not self._make_room(block, timeout):
+                self._count_drop(1)
+                return False
+            self._items.append(item)
+            self._wake_consumer()
+            return True
+
+    def _make_room(self, block: bool, timeout: float, end: float = None) -> bool:
+        """With the lock held and the buffer full: True once an item fits."""
+        if self.policy == "drop_oldest":
+            self._items.popleft()
+            self._count_drop(1)
+            return True
+        if self.policy == "drop_newest" or not block:
+            return False
+        if end is None:
+            end = time.monotonic() + (self.block_timeout_s if timeout is None else timeout)
+        self._wake_consumer()  # it may be waiting for exactly this
+        while len(self._items) >= self.maxsize:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._not_full.wait(remaining)
+        return True
+
+    def _wake_consumer(self):
+        if self._wake_at and len(self._items) >= self._wake_at:
+            self._not_empty.notify()
+
+    def _count_drop(self, n: int):
+        self.dropped += n
+        if self._m_dropped is not None:
+            self._m_dropped.inc(n)
+
+    # ---- consumer side ----
+
+    def get(self, block: bool = True, timeout: float = None):
+        """Take the oldest item; raises queue.Empty if none arrives in time."""
+        with self._lock:
+            if not self._wait_for(1 if block else 0, timeout):
+                raise queue.Empty
+            item = self._items.popleft()
+            if self.policy == "block":
+                self._not_full.notify()
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def drain_all(self, timeout: float = None, min_items: int = 1) -> list:
+        """
+        Wait until min_items are buffered (at most timeout seconds; 0 means
+        don't wait), then take everything, oldest first. May return [].
+        """
+        with self._lock:
+            self._wait_for(min(max(1, min_items), self.maxsize) if timeout != 0 else 0, timeout)
+            items = list(self._items)
+            self._items.clear()
+            if items and self.policy == "block":
+                self._not_full.notify_all()
+            return items
+
+    def interrupt(self):
+        """Make the consumer's current (or next) wait return early."""
+        with self._lock:
+            self._interrupted = True
+            self._not_empty.notify_all()
+
+    def _wait_for(self, n: int, timeout: float) -> bool:
+        """With the lock held: wait until n items are buffered; True if any are."""
+        if len(self._items) < n:
+            end = None if timeout is None else time.monotonic() + timeout
+            self._wake_at = n
+            try:
+                while len(self._items) < n and not self._interrupted:
+                    if end is None:
+                        self._not_empty.wait()
+                        continue
+                    remaining = end - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._not_empty.wait(remaining)
+            finally:
+                self._wake_at = 0
+                self._interrupted = False
+        return bool(self._items)
+
+    # ---- queue.Queue compatibility ----
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def empty(self) -> bool:
+        return not self._items
+
+    def full(self) -> bool:
+        return len(self._items) >= self.maxsize
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,81 @@
+# base-monitoring-client/bench/bench_batch_queue.py
+"""
+Hand-over cost between two pipeline stages: queue.Queue with one get() per
+item (the old batching loop) against BatchQueue.drain_all() once per window.
+
+A producer thread puts N items as fast as it can; the consumer collects
+them the way the batching loop does. Reported: wall time and how often the
+consumer had to wake up. Run from base-monitoring-client/:
+
+    python bench/bench_batch_queue.py
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from batch_queue import BatchQueue  # noqa: E402
+
+
+def _produce(q, n):
+    for i in range(n):
+        while True:
+            try:
+                q.put(i, timeout=1)
+                break
+            except queue.Full:
+                pass
+
+
+def run_queue(n: int, maxsize: int):
+    q = queue.Queue(maxsize=maxsize)
+    producer = threading.Thread(target=_produce, args=(q, n))
+    t0 = time.perf_counter()
+    producer.start()
+    got = wakeups = 0
+    while got < n:
+        q.get(timeout=1)
+        got += 1
+        wakeups += 1
+    producer.join()
+    return time.perf_counter() - t0, wakeups
+
+
+def run_batch_queue(n: int, maxsize: int, policy: str):
+    q = BatchQueue(maxsize, policy=policy)
+    producer = threading.Thread(target=_produce, args=(q, n))
+    t0 = time.perf_counter()
+    producer.start()
+    got = wakeups = 0
+    while got < n:
+        got += len(q.drain_all(timeout=1, min_items=maxsize * 3 // 4))
+        wakeups += 1
+    producer.join()
+    return time.perf_counter() - t0, wakeups
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--items", type=int, default=200_000)
+    ap.add_argument("--maxsize", type=int, default=1000)
+    args = ap.parse_args()
+
+    print(f"items={args.items}, maxsize={args.maxsize}")
+    print(f"{'consumer':>26} {'ms':>9} {'wake-ups':>9} {'us/item':>8}")
+    for label, fn in (
+        ("queue.Queue get()", lambda: run_queue(args.items, args.maxsize)),
+        ("BatchQueue drain_all()", lambda: run_batch_queue(args.items, args.maxsize, "block")),
+    ):
+        elapsed, wakeups = fn()
+        print(
+            f"{label:>26} {elapsed * 1000:>9.1f} {wakeups:>9} "
+            f"{elapsed / args.items * 1e6:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# base-monitoring-client/bench/bench_build_write_request.py
+"""
+Compare the original build_write_request() (dict records -> WriteRequest graph
+-> SerializeToString) with the current one (SampleBatch + SeriesRegistry).
+
+Run from base-monitoring-client/ (remote_pb2 must be generated first):
+
+    python -m grpc_tools.protoc -I. --python_out=. remote.proto
+    python bench/bench_build_write_request.py [--samples-per-series 40]
+"""
+import argparse
+import os
+import sys
+import timeit
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from remote_pb2 import Sample, WriteRequest  # noqa: E402
+import remote_write_pusher  # noqa: E402
+from sample_batch import SampleBatch, series_id  # noqa: E402
+
+
+def legacy_build_write_request(records):
+    """The pre-registry implementation, kept verbatim for comparison."""
+    series_map = defaultdict(list)
+
+    for rec in records:
+        try:
+            metric = rec["metric"]
+            labels = rec.get("labels", {})
+            ts_ms = int(rec["timestamp_ms"])
+            value = float(rec["value"])
+        except (KeyError, ValueError, TypeError):
+            continue
+
+        label_items = [("__name__", metric)] + sorted(labels.items())
+        key = tuple(label_items)
+        series_map[key].append(Sample(value=value, timestamp=ts_ms))
+
+    req = WriteRequest()
+    for key, samples in series_map.items():
+        ts = req.timeseries.add()
+        for name, value in key:
+            lab = ts.labels.add()
+            lab.name = name
+            lab.value = value
+        ts.samples.extend(samples)
+
+    return req.SerializeToString()
+
+
+def make_workload(n_series: int, samples_per_series: int):
+    labels = [
+        {"component": f"rail{i}", "source": "bench-device", "board": "bench"}
+        for i in range(n_series)
+    ]
+    records = []
+    batch = SampleBatch()
+    sids = [series_id("bench_power_watts", lab) for lab in labels]
+    for k in range(samples_per_series):
+        ts_ms = 1731080000000 + 100 * k
+        for i, lab in enumerate(labels):
+            value = 1.0 + i + k * 0.001
+            records.append(
+                {
+                    "metric": "bench_power_watts",
+                    "labels": lab,
+                    "value": value,
+                    "timestamp_ms": ts_ms,
+                }
+            )
+            batch.append(sids[i], value, ts_ms)
+    return records, batch
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--samples-per-series", type=int, default=40)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    build = remote_write_pusher.build_write_request
+    print(f"samples/series={args.samples_per_series}, best of {args.repeat}")
+    print(f"{'series':>7} {'legacy ms':>10} {'dicts ms':>10} {'batch ms':>10} {'speedup':>8}")
+    for n_series in (10, 100, 1000):
+        records, batch = make_workload(n_series, args.samples_per_series)
+        assert legacy_build_write_request(records) == build(batch)
+
+        number = max(1, 2000 // n_series)
+        results = []
+        for fn, arg in (
+            (legacy_build_write_request, records),
+            (build, records),
+            (build, batch),
+        ):
+            best = min(timeit.repeat(lambda: fn(arg), number=number, repeat=args.repeat))
+            results.append(best / number * 1000.0)
+        legacy_ms, dicts_ms, batch_ms = results
+        print(
+            f"{n_series:>7} {legacy_ms:>10.3f} {dicts_ms:>10.3f} {batch_ms:>10.3f} "
+            f"{legacy_ms / batch_ms:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# base-monitoring-client/bench/bench_collector_jitter.py
+"""
+Sampling-interval jitter of the collector, as a thread and as a process
+(COLLECTOR_MODE=process), with and without push-like load in the pusher.
+
+The collector wakes at absolute deadlines (t0 + k * interval) and records how
+late each wake-up was. The load threads stand in for pushes in flight: they
+encode a large SampleBatch with the remote-write encoder (and compress it
+with snappy when it is installed) in a loop, holding the GIL most of the
+time. Run from base-monitoring-client/:
+
+    python bench/bench_collector_jitter.py
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from batch_queue import BatchQueue  # noqa: E402
+from process_collector import ProcessCollector  # noqa: E402
+from remote_write_encoder import WriteRequestEncoder, encode_labels  # noqa: E402
+from sample_batch import SampleBatch, SeriesTable  # noqa: E402
+
+try:
+    import snappy
+except ImportError:  # encoder-only load
+    snappy = None
+
+
+def jitter_get_power(output_queue, scrape_interval_s, stop_event):
+    """Collector stand-in: put the lateness (s) of every deadline wake-up."""
+    deadline = time.monotonic()
+    while not stop_event.is_set():
+        deadline += scrape_interval_s
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        output_queue.put(time.monotonic() - deadline, timeout=1)
+
+
+def _push_load(stop_event, n_series=200, samples_per_series=50):
+    table = SeriesTable()
+    sids = [
+        table.register("bench_power_watts", {"component": f"rail{i}", "source": "bench"})
+        for i in range(n_series)
+    ]
+    labels = {sid: encode_labels(table.key(sid)) for sid in sids}
+    batch = SampleBatch()
+    for k in range(samples_per_series):
+        for i, sid in enumerate(sids):
+            batch.append(sid, 1.0 + i + k * 0.001, 1731080000000 + 100 * k)
+    encoder = WriteRequestEncoder()
+    while not stop_event.is_set():
+        req = encoder.encode(batch.series_ids, batch.values, batch.timestamps, labels.get)
+        if snappy is not None:
+            snappy.compress(bytes(req))
+
+
+def run(mode: str, load: int, interval_s: float, duration_s: float):
+    out = BatchQueue(1_000_000)
+    stop = threading.Event()
+    if mode == "process":
+        collector = ProcessCollector(drain_interval_s=0.02, target=jitter_get_power)
+    else:
+        collector = jitter_get_power
+    loaders = [threading.Thread(target=_push_load, args=(stop,)) for _ in range(load)]
+    worker = threading.Thread(target=collector, args=(out, interval_s, stop))
+    worker.start()
+    for t in loaders:
+        t.start()
+    time.sleep(duration_s)
+    stop.set()
+    worker.join()
+    for t in loaders:
+        t.join()
+
+    late = out.drain_all(timeout=0)
+    late = sorted(late[len(late) // 20 :])  # skip the warm-up (e.g. the spawn)
+    if not late:
+        return None
+
+    def pct(p):
+        return late[min(len(late) - 1, int(p / 100.0 * len(late)))] * 1000.0
+
+    return len(late), pct(50), pct(99), late[-1] * 1000.0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--interval", type=float, default=0.005, help="sampling interval (s)")
+    ap.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    ap.add_argument("--load-threads", type=int, default=2)
+    args = ap.parse_args()
+
+    print(
+        f"interval={args.interval * 1000:.1f}ms, {args.duration}s per run, "
+        f"load={'encode+snappy' if snappy else 'encode only'}"
+    )
+    print(f"{'mode':>8} {'pushing':>8} {'samples':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for mode in ("thread", "process"):
+        for load in (0, args.load_threads):
+            result = run(mode, load, args.interval, args.duration)
+            if result is None:
+                print(f"{mode:>8} {'yes' if load else 'no':>8} no samples")
+                continue
+            n, p50, p99, worst = result
+            print(
+                f"{mode:>8} {'yes' if load else 'no':>8} {n:>8} {p50:>8.3f} {p99:>8.3f} {worst:>8.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+# base-monitoring-client/bench/bench_e2e.py
+"""
+End-to-end throughput and latency of the client: the synthetic collector
+(bench/synthetic_impl.py) feeds the real pusher, which pushes to the
+stand-in receiver (bench/receiver.py).
+
+For every series count x sampling rate the pusher runs in a child process
+for --duration seconds and is then stopped as on SIGTERM (final flush
+included). Reported per run:
+
+* generated and delivered samples/s, and the drop rate (generated samples
+  that never reached the receiver), next to queue_dropped_total per queue and
+  the collector ticks the scheduler had to skip;
+* sample-to-acknowledgement latency percentiles: from the sample timestamp
+  to the receiver having decoded the request that carried it;
+* CPU seconds per stage: the collector (get_power), process_data, the
+  batching loop (main thread) and the sender threads, and within those
+  build_write_request and post_payload (the HTTP part of pushing);
+* peak queue depths and the child's RSS (peak and at the end).
+
+A run counts as sustained when nothing was dropped and no tick was skipped.
+Results are written as JSON; --baseline prints the change against an earlier
+file. Run from base-monitoring-client/:
+
+    python bench/bench_e2e.py --series 10,100,1000 --rate-hz 10,100 --duration 10
+    python bench/bench_e2e.py --output after.json --baseline before.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import signal
+import subprocess
+import sys
+import threading
+import time
+from array import array
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CLIENT_DIR = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, CLIENT_DIR)
+
+METRIC = "bench_synthetic_value"
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+# ---- child: one pusher run ----
+
+
+def _metric_values(registry, name: str) -> dict:
+    """Current value of every self-metric called name, by its labels."""
+    with registry._lock:
+        items = list(registry._metrics.items())
+    out = {}
+    for (metric, labels), m in items:
+        if metric == name and hasattr(m, "get"):
+            try:
+                out[",".join(f"{k}={v}" for k, v in labels)] = m.get()
+            except Exception:  # noqa: BLE001 - a gauge callback of a stopped stage
+                continue
+    return out
+
+
+def _thread_cpu_s() -> dict:
+    out = {}
+    for t in threading.enumerate():
+        try:
+            cpu = time.clock_gettime(time.pthread_getcpuclockid(t.ident))
+        except (OSError, TypeError):
+            continue
+        name = "batching_loop" if t is threading.main_thread() else t.name
+        out[name] = out.get(name, 0.0) + cpu
+    return out
+
+
+def _rss_kib() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def run_child(cfg: dict) -> dict:
+    os.environ.update(
+        {
+            "COLLECTORS": "synthetic_impl",
+            "SCRAPE_INTERVAL_S": str(1.0 / cfg["rate_hz"]),
+            "BENCH_SERIES": str(cfg["series"]),
+            "BENCH_METRIC": METRIC,
+            "REMOTE_WRITE_URL": cfg["url"],
+            "OUTPUT_MODE": "push",
+            "LOG_LEVEL": os.getenv("LOG_LEVEL", "ERROR"),
+        }
+    )
+    os.environ.update(cfg["env"])
+    sys.path.insert(0, BENCH_DIR)
+
+    import remote_write_pusher
+    import synthetic_impl
+    from self_metrics import METRICS
+
+    stages = {}  # name -> [cpu s, calls]
+    stages_lock = threading.Lock()
+
+    def timed(name, fn):
+        stages[name] = [0.0, 0]
+
+        def wrapper(*args, **kwargs):
+            t0 = time.thread_time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                dt = time.thread_time() - t0
+                with stages_lock:
+                    stages[name][0] += dt
+                    stages[name][1] += 1
+
+        return wrapper
+
+    # module globals, looked up at call time by the sender
+    remote_write_pusher.build_write_request = timed(
+        "build_write_request", remote_write_pusher.build_write_request
+    )
+    remote_write_pusher.post_payload = timed("post_payload", remote_write_pusher.post_payload)
+
+    result = {}
+    peak_depth = {}
+    done = threading.Event()
+
+    def monitor():
+        start = time.monotonic()
+        result["t_start_ms"] = time.time_ns() // 1_000_000
+        while not done.wait(0.05):
+            for queue_name, depth in _metric_values(METRICS, "queue_depth").items():
+                peak_depth[queue_name] = max(peak_depth.get(queue_name, 0), depth)
+            if time.monotonic() - start >= cfg["duration"]:
+                break
+        result["t_stop_ms"] = time.time_ns() // 1_000_000
+        result["generated_at_stop"] = synthetic_impl.GENERATED
+        # steady state: taken before shutdown so the final flush is not in it
+        result["thread_cpu_s"] = _thread_cpu_s()
+        with stages_lock:
+            result["stage_cpu_s"] = {k: {"cpu_s": v[0], "calls": v[1]} for k, v in stages.items()}
+        result["rss_kib"] = _rss_kib()
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    threading.Thread(target=monitor, daemon=True, name="bench_monitor").start()
+    try:
+        remote_write_pusher.main()
+    except SystemExit:
+        result["supervisor_failed"] = True
+    done.set()
+
+    result["generated"] = synthetic_impl.GENERATED
+    result["queue_dropped"] = _metric_values(METRICS, "queue_dropped_total")
+    result["ticks_skipped"] = sum(_metric_values(METRICS, "scheduler_ticks_skipped_total").values())
+    result["dropped_samples"] = _metric_values(METRICS, "dropped_samples_total")
+    result["peak_queue_depth"] = peak_depth
+    result["max_rss_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+# ---- parent: receiver, sweep, report ----
+
+
+def _percentile(sorted_values, p: float):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, round(p / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def run_one(series: int, rate_hz: float, duration: float, env: dict, faults: str = "") -> dict:
+    from receiver import RemoteWriteReceiver, parse_faults
+
+    latencies = array("q")
+    received = [0]
+
+    def on_series(labels, samples, received_ms):
+        if labels and labels[0] == ("__name__", METRIC):
+            received[0] += len(samples)
+            latencies.extend(received_ms - ts for _, ts in samples)
+
+    rx = RemoteWriteReceiver(faults=parse_faults(faults), on_series=on_series, store=False)
+    rx.start()
+    cfg = {"series": series, "rate_hz": rate_hz, "duration": duration, "url": rx.url, "env": env}
+    t0 = time.monotonic()
+    try:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", json.dumps(cfg)],
+            cwd=CLIENT_DIR,
+            stdout=subprocess.PIPE,
+            text=True,
+            timeout=duration + 60,
+            check=True,
+        )
+    finally:
+        rx.stop()
+    child = json.loads(proc.stdout.strip().splitlines()[-1])
+    wall_s = time.monotonic() - t0
+
+    measured_s = (child["t_stop_ms"] - child["t_start_ms"]) / 1000.0
+    generated = child["generated"]
+    lat = sorted(latencies)
+    cpu = child["thread_cpu_s"]
+    return {
+        "series": series,
+        "rate_hz": rate_hz,
+        "duration_s": measured_s,
+        "wall_s": wall_s,
+        "env": env,
+        "faults": faults,
+        "target_samples_per_s": series * rate_hz,
+        "generated_samples_per_s": child["generated_at_stop"] / measured_s,
+        "delivered_samples_per_s": received[0] / measured_s,
+        "generated": generated,
+        "delivered": received[0],
+        "drop_rate": 1.0 - received[0] / generated if generated else 0.0,
+        "queue_dropped": child["queue_dropped"],
+        "dropped_samples": child["dropped_samples"],
+        "ticks_skipped": child["ticks_skipped"],
+        "sustained": received[0] >= generated and not child["ticks_skipped"],
+        "latency_ms": {f"p{p:g}": _percentile(lat, p) for p in PERCENTILES}
+        | {"max": lat[-1] if lat else None},
+        "thread_cpu_s": cpu,
+        "thread_cpu_fraction": {k: v / measured_s for k, v in cpu.items()},
+        "stage_cpu_s": child["stage_cpu_s"],
+        "peak_queue_depth": child["peak_queue_depth"],
+        "rss_kib": child["rss_kib"],
+        "max_rss_kib": child["max_rss_kib"],
+        "receiver": {
+            "requests": rx.requests,
+            "bytes": rx.bytes,
+            "rejected": sum(1 for info in rx.log if info.status != 204),
+            "violations": len(rx.violations),
+            "first_violations": [p for _, p in rx.violations[:5]],
+        },
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=CLIENT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_run(r: dict):
+    cpu = r["thread_cpu_fraction"]
+    senders = sum(v for k, v in cpu.items() if k.startswith("remote_write_sender"))
+    build = r["stage_cpu_s"].get("build_write_request", {})
+    build_ms = build["cpu_s"] / build["calls"] * 1000.0 if build.get("calls") else 0.0
+    p50, p99 = r["latency_ms"]["p50"], r["latency_ms"]["p99"]
+    print(
+        f"{r['series']:>6} {r['rate_hz']:>7g} {r['target_samples_per_s']:>9.0f} "
+        f"{r['delivered_samples_per_s']:>10.0f} {r['drop_rate'] * 100:>6.2f} "
+        f"{r['ticks_skipped']:>6.0f} {p50 if p50 is not None else '-':>7} "
+        f"{p99 if p99 is not None else '-':>7} "
+        f"{cpu.get('get_power_thread', 0) * 100:>6.1f} "
+        f"{cpu.get('process_data_thread', 0) * 100:>6.1f} "
+        f"{cpu.get('batching_loop', 0) * 100:>6.1f} {senders * 100:>6.1f} "
+        f"{build_ms:>8.2f} {r['max_rss_kib'] / 1024:>7.1f}"
+        f"{'' if r['sustained'] else '  !'}"
+    )
+
+
+def _compare(runs: list, baseline_path: str):
+    with open(baseline_path) as f:
+        before = {(r["series"], r["rate_hz"]): r for r in json.load(f)["runs"]}
+    print(f"\nagainst {baseline_path}:")
+    print(f"{'series':>6} {'Hz':>7} {'delivered/s':>22} {'p99 ms':>16} {'CPU s/s':>16}")
+    for r in runs:
+        b = before.get((r["series"], r["rate_hz"]))
+        if b is None:
+            continue
+        cpu_now = sum(r["thread_cpu_fraction"].values())
+        cpu_before = sum(b["thread_cpu_fraction"].values())
+        print(
+            f"{r['series']:>6} {r['rate_hz']:>7g} "
+            f"{b['delivered_samples_per_s']:>10.0f} -> {r['delivered_samples_per_s']:<9.0f} "
+            f"{b['latency_ms']['p99'] or 0:>6} -> {r['latency_ms']['p99'] or 0:<7} "
+            f"{cpu_before:>6.2f} -> {cpu_now:<7.2f}"
+        )
+
+
+def _parse_env(pairs):
+    env = {}
+    for pair in pairs:
+        name, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"--env expects NAME=VALUE, got {pair!r}")
+        env[name] = value
+    return env
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        print(json.dumps(run_child(json.loads(sys.argv[2]))))
+        return
+
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--series", default="10,100,1000", help="series counts, comma-separated")
+    ap.add_argument("--rate-hz", default="10,100", help="sampling rates, comma-separated")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    ap.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="extra pusher settings, e.g. --env PUSH_INTERVAL_S=1 (repeatable)",
+    )
+    ap.add_argument(
+        "--faults",
+        default="",
+        help="receiver fault schedule, e.g. 503@%%20,latency=0.05 (see bench/receiver.py)",
+    )
+    ap.add_argument("--output", default="bench_e2e.json", help="JSON results file")
+    ap.add_argument("--baseline", help="earlier results file to compare against")
+    args = ap.parse_args()
+    env = _parse_env(args.env)
+
+    print(
+        f"{'series':>6} {'Hz':>7} {'target/s':>9} {'deliv/s':>10} {'drop%':>6} "
+        f"{'skip':>6} {'p50 ms':>7} {'p99 ms':>7} {'col%':>6} {'proc%':>6} "
+        f"{'loop%':>6} {'send%':>6} {'build ms':>8} {'RSS MB':>7}"
+    )
+    runs = []
+    for series in (int(s) for s in args.series.split(",")):
+        for rate_hz in (float(r) for r in args.rate_hz.split(",")):
+            run = run_one(series, rate_hz, args.duration, env, args.faults)
+            _print_run(run)
+            runs.append(run)
+    sustained = [r["target_samples_per_s"] for r in runs if r["sustained"]]
+    if sustained:
+        print(f"highest sustained rate: {max(sustained):.0f} samples/s")
+    print("(! = not sustained: samples dropped or ticks skipped)")
+
+    results = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "runs": runs,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+    if args.baseline:
+        _compare(runs, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
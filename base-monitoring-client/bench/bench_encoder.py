@@ -0,0 +1,90 @@
+# base-monitoring-client/bench/bench_encoder.py
+"""
+Time the hand-rolled WriteRequest encoder against building a remote_pb2
+WriteRequest object graph and calling SerializeToString(). The byte-for-byte
+and round-trip checks, edge cases included, are in
+tests/test_remote_write_encoder.py.
+
+remote_pb2 is only needed here, not at runtime. Run from base-monitoring-client/:
+
+    pip install protobuf grpcio-tools
+    python -m grpc_tools.protoc -I. --python_out=. remote.proto
+    python bench/bench_encoder.py
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from remote_pb2 import WriteRequest  # noqa: E402
+from remote_write_encoder import WriteRequestEncoder, encode_labels  # noqa: E402
+from sample_batch import SampleBatch, SeriesTable  # noqa: E402
+
+
+def encode_with_pb2(table, batch):
+    req = WriteRequest()
+    by_sid = {}
+    for sid, value, ts_ms in zip(batch.series_ids, batch.values, batch.timestamps):
+        ts = by_sid.get(sid)
+        if ts is None:
+            ts = by_sid[sid] = req.timeseries.add()
+            for name, label_value in table.key(sid):
+                lab = ts.labels.add()
+                lab.name = name
+                lab.value = label_value
+        s = ts.samples.add()
+        s.value = value
+        s.timestamp = ts_ms
+    return req.SerializeToString()
+
+
+def encode_with_encoder(encoder, table, batch, label_cache):
+    def label_bytes(sid):
+        encoded = label_cache.get(sid)
+        if encoded is None:
+            encoded = label_cache[sid] = encode_labels(table.key(sid))
+        return encoded
+
+    return encoder.encode(batch.series_ids, batch.values, batch.timestamps, label_bytes)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--samples-per-series", type=int, default=40)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"samples/series={args.samples_per_series}, best of {args.repeat}")
+    print(f"{'series':>7} {'pb2 ms':>10} {'encoder ms':>11} {'speedup':>8}")
+    encoder = WriteRequestEncoder()
+    for n_series in (10, 100, 1000):
+        table = SeriesTable()
+        sids = [
+            table.register("bench_power_watts", {"component": f"rail{i}", "source": "bench"})
+            for i in range(n_series)
+        ]
+        batch = SampleBatch()
+        for k in range(args.samples_per_series):
+            for i, sid in enumerate(sids):
+                batch.append(sid, 1.0 + i + k * 0.001, 1731080000000 + 100 * k)
+        label_cache = {}
+        assert encode_with_encoder(encoder, table, batch, label_cache) == encode_with_pb2(table, batch)
+
+        number = max(1, 2000 // n_series)
+        pb2_ms = min(
+            timeit.repeat(lambda: encode_with_pb2(table, batch), number=number, repeat=args.repeat)
+        ) / number * 1000.0
+        enc_ms = min(
+            timeit.repeat(
+                lambda: encode_with_encoder(encoder, table, batch, label_cache),
+                number=number,
+                repeat=args.repeat,
+            )
+        ) / number * 1000.0
+        print(f"{n_series:>7} {pb2_ms:>10.3f} {enc_ms:>11.3f} {pb2_ms / enc_ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# base-monitoring-client/bench/bench_rw2_payload.py
+"""
+Payload size of Remote-Write 1.0 vs 2.0 for the board metric sets.
+
+Builds one push window per board (series and labels as emitted by the board's
+monitor_impl with default settings), encodes it with both encoders and prints
+raw and snappy-compressed sizes. Every 2.0 request is decoded again and
+checked against the 1.0 one.
+
+Run from base-monitoring-client/:
+
+    python bench/bench_rw2_payload.py [--seed 1]
+"""
+import argparse
+import os
+import random
+import sys
+
+import snappy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import remote_write_pusher  # noqa: E402
+from receiver import decode_v1, decode_v2  # noqa: E402
+from remote_write_encoder import WriteRequestEncoder, WriteRequestV2Encoder  # noqa: E402
+from sample_batch import SERIES, SampleBatch, series_id  # noqa: E402
+
+# (metric, component) pairs per board, with the compose defaults for
+# SCRAPE_INTERVAL_S / PUSH_INTERVAL_S
+BOARDS = {
+    "agx-orin": {
+        "scrape_s": 0.2,
+        "push_s": 4.0,
+        "series": [("agx_orin_power_watts", "total")]
+        + [
+            (metric, rail)
+            for rail in ("VDD_GPU_SOC", "VDD_CPU_CV", "VIN_SYS_5V0", "VDDQ_VDD2_1V8AO")
+            for metric in (
+                "agx_orin_voltage_volts",
+                "agx_orin_current_amps",
+                "agx_orin_power_watts",
+            )
+        ],
+    },
+    "xavier-nx-jtop": {
+        "scrape_s": 0.5,
+        "push_s": 4.0,
+        "series": [
+            (metric, f"cpu{n}")
+            for metric in ("xavier_nx_cpu_util_percent", "xavier_nx_cpu_freq_khz")
+            for n in range(6)
+        ]
+        + [("xavier_nx_memory_util_percent", "RAM"), ("xavier_nx_gpu_util_percent", "gpu")]
+        + [
+            ("xavier_nx_thermal_celsius", zone)
+            for zone in ("AO", "AUX", "CPU", "GPU", "PMIC", "thermal")
+        ],
+    },
+    "cpu-pyjoules": {
+        "scrape_s": 0.1,
+        "push_s": 4.0,
+        "series": [
+            ("pyjoules_remote_write_energy_uj", domain)
+            for domain in ("package_0", "core_0", "uncore_0", "dram_0")
+        ],
+    },
+}
+
+
+def make_window(board: str, spec: dict, samples_per_series: int, rng: random.Random):
+    sids = [
+        series_id(metric, {"component": component, "source": board})
+        for metric, component in spec["series"]
+    ]
+    batch = SampleBatch()
+    step_ms = int(spec["scrape_s"] * 1000)
+    for k in range(samples_per_series):
+        ts_ms = 1731080000000 + k * step_ms
+        for sid in sids:
+            batch.append(sid, round(rng.uniform(0.1, 50.0), 3), ts_ms)
+    return batch
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+
+    build = remote_write_pusher.build_write_request
+    print(
+        f"{'board':<15} {'series':>6} {'samples':>7}   "
+        f"{'1.0 raw':>8} {'2.0 raw':>8} {'ratio':>6}   "
+        f"{'1.0 snappy':>10} {'2.0 snappy':>10} {'ratio':>6}"
+    )
+    for board, spec in BOARDS.items():
+        full = round(spec["push_s"] / spec["scrape_s"])
+        for samples_per_series in (1, full):
+            batch = make_window(board, spec, samples_per_series, rng)
+            v1 = bytes(build(batch, WriteRequestEncoder()))
+            v2 = bytes(build(batch, WriteRequestV2Encoder()))
+            assert decode_v1(v1) == decode_v2(v2), f"{board}: 2.0 round-trip mismatch"
+
+            v1_z, v2_z = len(snappy.compress(v1)), len(snappy.compress(v2))
+            print(
+                f"{board:<15} {len(spec['series']):>6} {len(batch):>7}   "
+                f"{len(v1):>8} {len(v2):>8} {len(v2) / len(v1):>6.2f}   "
+                f"{v1_z:>10} {v2_z:>10} {v2_z / v1_z:>6.2f}"
+            )
+    print(f"({len(SERIES)} series registered)")
+
+
+if __name__ == "__main__":
+    main()
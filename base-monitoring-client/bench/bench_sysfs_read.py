@@ -0,0 +1,114 @@
+# base-monitoring-client/bench/bench_sysfs_read.py
+"""
+Per-sample cost of the Jetson sysfs scrapers: the original open/read/close
+per file (get_value_from_read, path f-string built every time) against the
+current SysfsReader (files opened once, one pread each).
+
+Each board's monitor_impl.power_scraper runs unchanged against a fake
+sysfs tree with the board's ina3221 layout in a temporary directory (its
+/sys paths are redirected there when the files are opened). The legacy
+variant reads the same files the old way. Both are timed end to end, i.e.
+one get_power() dict per sample.
+
+The fake tree lives on a regular filesystem, so this measures the syscall
+and Python overhead only; on the device each read also waits for the
+hwmon driver. Run from base-monitoring-client/:
+
+    python bench/bench_sysfs_read.py [--samples 20000]
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.insert(0, os.path.join(ROOT, "base-monitoring-client"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+BOARDS = ("agx-orin", "agx-xavier", "orin-nx", "xavier-nx")
+
+
+def legacy_get_value_from_read(path):
+    """The original helper, kept verbatim for comparison."""
+    try:
+        with open(path, 'r') as device_file:
+            return device_file.read()
+    except Exception as e:
+        print(f"Error in get_value_from_read: {e}")
+        return None
+
+
+def legacy_get_power(names, prefix, paths):
+    """The original scrape loop: build both paths and read them for every rail."""
+    power = {}
+    for k, name in enumerate(names):
+        v = int(legacy_get_value_from_read(f'{prefix}{paths[2 * k]}'))/1000
+        i = int(legacy_get_value_from_read(f'{prefix}{paths[2 * k + 1]}'))/1000
+        power[name] = {'Voltage': v, 'Current': i, 'Power': v * i}
+    return power
+
+
+def load_board(board: str):
+    path = os.path.join(ROOT, board, "docker", "monitor_impl.py")
+    spec = importlib.util.spec_from_file_location(f"{board.replace('-', '_')}_impl", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def fake_scraper(module, prefix: str):
+    """The board's power_scraper, with its /sys files created under prefix and opened there."""
+    real_open = os.open
+
+    def redirected_open(path, flags, *args):
+        fake = prefix + path
+        os.makedirs(os.path.dirname(fake), exist_ok=True)
+        if not os.path.exists(fake):
+            with open(fake, "w") as f:
+                f.write("5072\n" if "/in" in os.path.basename(fake) else "1234\n")
+        return real_open(fake, flags, *args)
+
+    os.open = redirected_open
+    try:
+        return module.power_scraper()
+    finally:
+        os.open = real_open
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--samples", type=int, default=20000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"best of {args.repeat} x {args.samples} samples")
+    print(f"{'board':<11} {'files':>5} {'legacy us':>10} {'pread us':>9} {'speedup':>8} {'max Hz':>8}")
+    with tempfile.TemporaryDirectory() as prefix:
+        for board in BOARDS:
+            scraper = fake_scraper(load_board(board), prefix)
+            paths = scraper.files.paths
+            legacy = legacy_get_power(scraper.name, prefix, paths)
+            current = scraper.get_power()
+            assert all(current[name] == legacy[name] for name in scraper.name), board
+
+            legacy_us = min(
+                timeit.repeat(
+                    lambda: legacy_get_power(scraper.name, prefix, paths),
+                    number=args.samples,
+                    repeat=args.repeat,
+                )
+            ) / args.samples * 1e6
+            pread_us = min(
+                timeit.repeat(scraper.get_power, number=args.samples, repeat=args.repeat)
+            ) / args.samples * 1e6
+            scraper.close()
+            print(
+                f"{board:<11} {len(paths):>5} {legacy_us:>10.1f} {pread_us:>9.1f} "
+                f"{legacy_us / pread_us:>7.1f}x {1e6 / pread_us:>8.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,503 @@
+# base-monitoring-client/bench/receiver.py
+"""
+Stand-in remote-write receiver, for the benchmarks and for exercising the
+pusher without a Prometheus.
+
+Accepts POSTs on /api/v1/write, snappy-decompresses and decodes them
+(Remote-Write 1.0 with remote_pb2 when it has been generated, see
+bench_encoder.py, otherwise with the minimal protobuf reader below; 2.0
+always with the reader) and checks what Prometheus would check:
+
+* label names sorted and unique, with a __name__ and no empty name;
+* per series, timestamps increasing within and across requests (the same
+  timestamp again is only fine with the same value);
+* every series at most once per request.
+
+Prometheus itself accepts a repeated series, but the pusher's encoders
+send each one once, so a repeat points at a bug in them. The exception is
+a WAL replay request built from several stored WriteRequests: it is their
+concatenation, so a series in more than one of them repeats. The pusher
+marks those with an X-Monitoring-Client-Replay-Merged header and they skip
+this check. allow_duplicate_series=True (--allow-duplicate-series) skips
+it for every request, for other clients.
+
+A request with violations is answered 400 and nothing in it is stored
+(reject_invalid=False takes it anyway); all violations are kept in
+.violations. Accepted samples are kept in memory for assertions:
+
+    rx = RemoteWriteReceiver(faults=parse_faults("503@3-5,reset@8"))
+    rx.start()
+    ... run the pusher with REMOTE_WRITE_URL=rx.url ...
+    assert rx.wait_for_samples(1000, timeout=10)
+    assert not rx.violations
+    rx.series(__name__="xavier_nx_power_watts", component="VDD_IN")
+    rx.stop()
+
+Faults are scheduled by request number (0-based, counting every POST):
+
+    503@3-5                 answer 503 to requests 3, 4 and 5 (any status code)
+    429:retry_after=2@10    answer 429 with Retry-After: 2 to request 10
+    reset@%7                reset the connection on every 7th request
+    latency=0.2@20-         answer 0.2 s late from request 20 on
+    latency=0.05            ... on every request
+
+A request failed by a fault is not decoded or stored. on_series, if given,
+is called once per accepted series and request with the label pairs, the
+(value, timestamp ms) samples and the time the request was decoded.
+
+Standalone, e.g. as the fake server for a load test, it prints what it
+receives once per second:
+
+    python bench/receiver.py --port 9090 [--faults 503@%10] [--store]
+"""
+import argparse
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+
+import snappy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+try:
+    from remote_pb2 import WriteRequest
+except ImportError:  # not generated (or no protobuf): the reader below does
+    WriteRequest = None
+
+_V2_CONTENT_TYPE = "io.prometheus.write.v2.Request"
+# set by the pusher on a WAL replay request that concatenates stored requests
+_REPLAY_MERGED_HEADER = "X-Monitoring-Client-Replay-Merged"
+
+# ---- minimal protobuf reader ----
+
+
+def _varint(buf, pos):
+    shift = n = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _fields(buf):
+    pos = 0
+    while pos < len(buf):
+        tag, pos = _varint(buf, pos)
+        wire = tag & 7
+        if wire == 0:
+            value, pos = _varint(buf, pos)
+        elif wire == 1:
+            value, pos = bytes(buf[pos : pos + 8]), pos + 8
+        elif wire == 2:
+            length, pos = _varint(buf, pos)
+            value, pos = bytes(buf[pos : pos + length]), pos + length
+        else:
+            raise ValueError(f"unexpected wire type {wire}")
+        yield tag >> 3, value
+
+
+def _signed(n):
+    return n - (1 << 64) if n >= 1 << 63 else n
+
+
+def _samples(body):
+    out = []
+    for field, value in _fields(body):
+        if field == 2:
+            sample = dict(_fields(value))
+            out.append(
+                (struct.unpack("<d", sample.get(1, b"\0" * 8))[0], _signed(sample.get(2, 0)))
+            )
+    return out
+
+
+def iter_series_v1(req):
+    """(label pairs, [(value, ts ms), ...]) per TimeSeries of a 1.0 request, in order."""
+    if WriteRequest is not None:
+        for ts in WriteRequest.FromString(bytes(req)).timeseries:
+            yield (
+                tuple((label.name, label.value) for label in ts.labels),
+                [(s.value, s.timestamp) for s in ts.samples],
+            )
+        return
+    for field, ts in _fields(req):
+        if field != 1:
+            raise ValueError(f"unexpected WriteRequest field {field}")
+        labels = []
+        for f, value in _fields(ts):
+            if f == 1:
+                label = dict(_fields(value))
+                labels.append((label.get(1, b"").decode(), label.get(2, b"").decode()))
+        yield tuple(labels), _samples(ts)
+
+
+def iter_series_v2(req):
+    """Same for a 2.0 request; label refs are resolved against its symbol table."""
+    symbols = []
+    bodies = []
+    for field, value in _fields(req):
+        if field == 4:
+            symbols.append(value.decode())
+        elif field == 5:
+            bodies.append(value)
+    if not symbols or symbols[0] != "":
+        raise ValueError("symbols[0] must be the empty string")
+    for body in bodies:
+        refs = []
+        for f, v in _fields(body):
+            if f == 1:
+                pos = 0
+                while pos < len(v):
+                    ref, pos = _varint(v, pos)
+                    refs.append(ref)
+        labels = tuple((symbols[refs[i]], symbols[refs[i + 1]]) for i in range(0, len(refs), 2))
+        yield labels, _samples(body)
+
+
+def decode_v1(req):
+    return dict(iter_series_v1(req))
+
+
+def decode_v2(req):
+    return dict(iter_series_v2(req))
+
+
+# ---- fault schedule ----
+
+
+class Fault(NamedTuple):
+    action: str  # "status", "reset" or "latency"
+    status: int = 0
+    delay_s: float = 0.0
+    retry_after: str = None
+    first: int = 0  # request numbers first..last (inclusive; None: open-ended)
+    last: int = None
+    every: int = 0  # or every n-th request
+
+    def applies(self, n: int) -> bool:
+        if self.every:
+            return (n + 1) % self.every == 0
+        return n >= self.first and (self.last is None or n <= self.last)
+
+
+def _parse_fault(entry: str) -> Fault:
+    action, _, when = entry.partition("@")
+    action, _, opts = action.partition(":")
+    kwargs = {}
+    when = when.strip()
+    if when.startswith("%"):
+        kwargs["every"] = int(when[1:])
+        if kwargs["every"] < 1:
+            raise ValueError
+    elif when:
+        first, dash, last = when.partition("-")
+        kwargs["first"] = int(first)
+        kwargs["last"] = (int(last) if last.strip() else None) if dash else int(first)
+    action = action.strip()
+    if action == "reset":
+        kwargs["action"] = "reset"
+    elif action.startswith("latency="):
+        kwargs["action"] = "latency"
+        kwargs["delay_s"] = float(action[len("latency=") :])
+    else:
+        kwargs["action"] = "status"
+        kwargs["status"] = int(action)
+        if not 400 <= kwargs["status"] <= 599:
+            raise ValueError
+    for opt in filter(None, (o.strip() for o in opts.split(":"))):
+        name, sep, value = opt.partition("=")
+        if name != "retry_after" or not sep:
+            raise ValueError
+        kwargs["retry_after"] = value
+    return Fault(**kwargs)
+
+
+def parse_faults(spec: str) -> list:
+    """'503@3-5,reset@%7,latency=0.2' -> [Fault, ...] (see the module docstring)."""
+    out = []
+    for entry in spec.replace(";", ",").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            out.append(_parse_fault(entry))
+        except ValueError:
+            raise ValueError(
+                f"bad fault {entry!r} (expected <status>[:retry_after=<s>], reset or "
+                f"latency=<s>, then optionally @<n>, @<n>-<m>, @<n>- or @%<k>)"
+            ) from None
+    return out
+
+
+# ---- HTTP side ----
+
+
+class RequestInfo(NamedTuple):
+    number: int
+    protocol: str  # "1.0" or "2.0"
+    status: int  # what was answered; 0 for a reset
+    series: int
+    samples: int
+    bytes: int
+    fault: str = ""
+
+
+def _check_labels(labels) -> str:
+    if not labels:
+        return "series without labels"
+    names = [name for name, _ in labels]
+    if "__name__" not in names:
+        return f"series without __name__: {labels}"
+    for a, b in zip(names, names[1:]):
+        if a >= b:
+            return f"labels not sorted or duplicated ({a!r} before {b!r}): {labels}"
+    if "" in names:
+        return f"empty label name: {labels}"
+    return ""
+
+
+class RemoteWriteReceiver:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        faults=(),
+        on_series=None,
+        store: bool = True,
+        reject_invalid: bool = True,
+        allow_duplicate_series: bool = False,
+    ):
+        self.faults = list(faults)
+        self.on_series = on_series
+        self.store = store
+        self.reject_invalid = reject_invalid
+        self.allow_duplicate_series = allow_duplicate_series
+        self._lock = threading.Lock()
+        self._received = threading.Condition(self._lock)
+        self.reset()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def reset(self):
+        """Forget everything received so far (the fault schedule starts over too)."""
+        with self._lock:
+            self.requests = 0  # every POST, faulted ones included
+            self.samples = 0  # accepted samples
+            self.bytes = 0
+            self.log = []  # RequestInfo per request
+            self.violations = []  # (request number, message)
+            self._series = {}  # label pairs -> [(ts ms, value), ...]
+            self._last = {}  # label pairs -> (ts ms, value) of the newest accepted sample
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v1/write"
+
+    # ---- assertions ----
+
+    def series(self, **match) -> dict:
+        """Stored samples of every series whose labels include match."""
+        want = set(match.items())
+        with self._lock:
+            return {
+                labels: list(samples)
+                for labels, samples in self._series.items()
+                if want <= set(labels)
+            }
+
+    def wait_for_samples(self, n: int, timeout: float) -> bool:
+        """Block until at least n samples were accepted; False on timeout."""
+        with self._received:
+            return self._received.wait_for(lambda: self.samples >= n, timeout)
+
+    # ---- request handling ----
+
+    def _schedule(self, n: int):
+        delay = sum(f.delay_s for f in self.faults if f.action == "latency" and f.applies(n))
+        fault = next((f for f in self.faults if f.action != "latency" and f.applies(n)), None)
+        return delay, fault
+
+    def _validate(self, series: list, merged: bool) -> list:
+        problems = []
+        allow_duplicates = self.allow_duplicate_series or merged
+        seen = set()
+        last = {}
+        for labels, samples in series:
+            problem = _check_labels(labels)
+            if problem:
+                problems.append(problem)
+            if not allow_duplicates and labels in seen:
+                problems.append(f"series sent twice in one request: {labels}")
+            seen.add(labels)
+            prev = last.get(labels, self._last.get(labels))
+            for value, ts in samples:
+                if prev is not None:
+                    if ts < prev[0]:
+                        problems.append(f"out of order sample ({ts} < {prev[0]}): {labels}")
+                    elif ts == prev[0] and value != prev[1] and value == value:
+                        problems.append(f"duplicate timestamp {ts} with a new value: {labels}")
+                prev = (ts, value)
+            if prev is not None:
+                last[labels] = prev
+        return problems
+
+    def _accept(self, number: int, protocol: str, series: list, size: int, merged: bool = False):
+        """Validate and store one decoded request; returns (status, first problem)."""
+        received_ms = time.time_ns() // 1_000_000
+        n = sum(len(samples) for _, samples in series)
+        with self._lock:
+            problems = self._validate(series, merged)
+            self.violations.extend((number, p) for p in problems)
+            if problems and self.reject_invalid:
+                self.log.append(RequestInfo(number, protocol, 400, len(series), n, size))
+                return 400, problems[0]
+            for labels, samples in series:
+                if samples:
+                    self._last[labels] = (samples[-1][1], samples[-1][0])
+                if self.store:
+                    self._series.setdefault(labels, []).extend((ts, v) for v, ts in samples)
+                if self.on_series is not None:
+                    self.on_series(labels, samples, received_ms)
+            self.samples += n
+            self.log.append(RequestInfo(number, protocol, 204, len(series), n, size))
+            self._received.notify_all()
+        return 204, n
+
+    def _handler(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _answer(self, status: int, text: str = "", headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(text.encode())))
+                self.end_headers()
+                self.wfile.write(text.encode())
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                protocol = "2.0" if _V2_CONTENT_TYPE in self.headers.get("Content-Type", "") else "1.0"
+                with receiver._lock:
+                    number = receiver.requests
+                    receiver.requests += 1
+                    receiver.bytes += len(body)
+                delay, fault = receiver._schedule(number)
+                if delay:
+                    time.sleep(delay)
+
+                if fault is not None:
+                    info = RequestInfo(number, protocol, fault.status, 0, 0, len(body), fault.action)
+                    with receiver._lock:
+                        receiver.log.append(info)
+                    if fault.action == "reset":
+                        # RST instead of FIN: the client sees a connection reset
+                        self.connection.setsockopt(
+                            socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+                        )
+                        self.connection.close()
+                        self.close_connection = True
+                        return
+                    headers = [("Retry-After", fault.retry_after)] if fault.retry_after else []
+                    self._answer(fault.status, f"injected fault for request {number}\n", headers)
+                    return
+
+                if self.path.split("?")[0] != "/api/v1/write":
+                    self._answer(404, "remote write is on /api/v1/write\n")
+                    return
+                try:
+                    req = snappy.uncompress(body)
+                    decode = iter_series_v2 if protocol == "2.0" else iter_series_v1
+                    series = list(decode(req))
+                except Exception as e:  # noqa: BLE001 - anything undecodable is a 400
+                    self._answer(400, f"cannot decode request: {e}\n")
+                    return
+
+                merged = _REPLAY_MERGED_HEADER in self.headers
+                status, detail = receiver._accept(number, protocol, series, len(body), merged)
+                if status != 204:
+                    self._answer(status, f"{detail}\n")
+                    return
+                headers = []
+                if protocol == "2.0":
+                    headers = [
+                        ("X-Prometheus-Remote-Write-Samples-Written", str(detail)),
+                        ("X-Prometheus-Remote-Write-Histograms-Written", "0"),
+                        ("X-Prometheus-Remote-Write-Exemplars-Written", "0"),
+                    ]
+                self._answer(204, "", headers)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True, name="bench_receiver"
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9090)
+    ap.add_argument("--faults", default="", help="fault schedule, e.g. 503@%%10,latency=0.1")
+    ap.add_argument(
+        "--accept-invalid", action="store_true", help="take requests that fail validation"
+    )
+    ap.add_argument("--store", action="store_true", help="keep the samples (memory grows)")
+    ap.add_argument(
+        "--allow-duplicate-series",
+        action="store_true",
+        help="take a series sent twice in one request (Prometheus does)",
+    )
+    args = ap.parse_args()
+
+    rx = RemoteWriteReceiver(
+        args.host,
+        args.port,
+        faults=parse_faults(args.faults),
+        store=args.store,
+        reject_invalid=not args.accept_invalid,
+        allow_duplicate_series=args.allow_duplicate_series,
+    )
+    rx.start()
+    print(f"listening on {rx.url}", file=sys.stderr)
+    last = (0, 0, 0, 0)
+    try:
+        while True:
+            time.sleep(1)
+            now = (rx.requests, rx.samples, rx.bytes, len(rx.violations))
+            print(
+                f"{now[0] - last[0]:>6} req/s {now[1] - last[1]:>9} samples/s "
+                f"{now[2] - last[2]:>10} bytes/s {now[3] - last[3]:>5} violations",
+                flush=True,
+            )
+            if now[3] > last[3]:
+                for number, problem in rx.violations[last[3] :][:5]:
+                    print(f"  request {number}: {problem}", flush=True)
+            last = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        rx.stop()
+
+
+if __name__ == "__main__":
+    main()
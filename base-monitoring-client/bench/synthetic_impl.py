@@ -0,0 +1,63 @@
+# base-monitoring-client/bench/synthetic_impl.py
+"""
+Synthetic collector for the end-to-end benchmark (COLLECTORS=synthetic_impl).
+
+Every tick produces one raw record for BENCH_SERIES series, the way a board
+collector produces one dict per scrape, and process_data turns it into a
+SampleBatch of bench_synthetic_value{series="<n>"} samples. The sampling
+rate is the collector's scrape interval (SCRAPE_INTERVAL_S, or
+COLLECTORS=synthetic_impl@<seconds>). Each value is the tick index, so a
+receiver can tell which tick a sample came from.
+
+GENERATED counts the samples produced, dropped ones included.
+"""
+import logging
+import os
+import queue
+import time
+
+from clock import now_ms
+from sample_batch import SampleBatch, series_id
+from scheduler import DeadlineScheduler
+from self_metrics import observe_scrape
+
+log = logging.getLogger("synthetic_impl")
+
+METRIC = os.getenv("BENCH_METRIC", "bench_synthetic_value")
+N_SERIES = int(os.getenv("BENCH_SERIES", "100"))
+SERVICE_LABEL = os.getenv("SERVICE_LABEL", "bench")
+
+GENERATED = 0
+
+
+def get_power(output_queue: queue.Queue, scrape_interval_s: float, stop_event):
+    """One raw record per tick: (tick index, timestamp)."""
+    global GENERATED
+    log.info("synthetic get_power: %d series every %ss", N_SERIES, scrape_interval_s)
+    for tick in DeadlineScheduler(scrape_interval_s, stop_event):
+        t0 = time.perf_counter()
+        GENERATED += N_SERIES
+        try:
+            output_queue.put({"tick": tick.index, "timestamp": now_ms()}, timeout=1)
+        except queue.Full:
+            pass  # counted in queue_dropped_total{queue="raw"}
+        observe_scrape(time.perf_counter() - t0, float(scrape_interval_s))
+
+
+def process_data(input_queue: queue.Queue, output_queue: queue.Queue, stop_event):
+    """Expand each raw record into N_SERIES samples."""
+    sids = [series_id(METRIC, {"series": str(n), "source": SERVICE_LABEL}) for n in range(N_SERIES)]
+    while not stop_event.is_set():
+        try:
+            raw = input_queue.get(timeout=1)
+        except queue.Empty:
+            continue
+        value = float(raw["tick"])
+        ts_ms = raw["timestamp"]
+        batch = SampleBatch()
+        for sid in sids:
+            batch.append(sid, value, ts_ms)
+        try:
+            output_queue.put(batch, timeout=1)
+        except queue.Full:
+            pass  # counted in queue_dropped_total{queue="proc"}
@@ -0,0 +1,332 @@
+# base-monitoring-client/capture.py
+"""
+Raw sample capture to local binary files (CAPTURE_DIR).
+
+For profiling a burst, sample fast (SCRAPE_INTERVAL_S=0.002, say, with
+downsampling for the pushes) and capture the raw samples on demand, next to
+the normal remote-write traffic. Each capture session is written to
+rotating, append-only segment files:
+
+    <CAPTURE_DIR>/20261017T120000Z-000.bcap
+    <CAPTURE_DIR>/20261017T120000Z-001.bcap   (after CAPTURE_SEGMENT_BYTES)
+
+A segment is a fixed-size header followed by fixed-width records:
+
+    header (HEADER_BYTES): magic "BMCCAP01", uint32 header bytes,
+                           uint32 record bytes, uint32 JSON length, uint32 0,
+                           JSON {"version", "dtype", "series", "session", "segment"}
+    records:               <u4 series> <u4 flags=0> <i8 t_ns> <f8 value>
+
+"series" lists the label sets in this segment; a record's series field is
+an index into it. t_ns is epoch nanoseconds: collectors that stamp samples
+with SampleBatch.append_ns() keep their full resolution, the others have
+millisecond ones. No parsing needed to read a segment:
+
+    hdr = open(path, "rb").read(capture.HEADER_BYTES)
+    meta = json.loads(hdr[24 : 24 + int.from_bytes(hdr[16:20], "little")])
+    rec = np.fromfile(path, dtype=np.dtype([tuple(f) for f in meta["dtype"]]),
+                      offset=capture.HEADER_BYTES)
+    vdd_in = rec[rec["series"] == meta["series"].index(...)]
+
+A session is started and stopped with SIGUSR1 / SIGUSR2, or through the
+control socket (CAPTURE_SOCKET):
+
+    python capture.py start [seconds]   # from inside the container
+    python capture.py stop
+    python capture.py status
+
+Only samples stamped at or after the start (and before the stop) are
+written. Capture stops by itself once CAPTURE_MAX_BYTES are on disk.
+"""
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+from clock import now_ns
+from sample_batch import SERIES, SampleBatch, SeriesTable
+from self_metrics import METRICS
+
+log = logging.getLogger("base-monitoring-client.capture")
+
+MAGIC = b"BMCCAP01"
+HEADER_BYTES = 65536
+_PREFIX = struct.Struct("<8sIIII")  # magic, header bytes, record bytes, JSON length, 0
+RECORD = struct.Struct("<IIqd")  # series index, flags, t_ns, value
+DTYPE = [["series", "<u4"], ["flags", "<u4"], ["t_ns", "<i8"], ["value", "<f8"]]
+SUFFIX = ".bcap"
+
+
+class _Segment:
+    """One open segment file and the series it has listed so far."""
+
+    def __init__(self, path: str, session: str, number: int):
+        self.path = path
+        self.session = session
+        self.number = number
+        self.index = {}  # series id -> index in this segment
+        self.series = []  # label dicts, by index
+        self.file = open(path, "w+b")
+        self.size = HEADER_BYTES
+        self.write_header()
+
+    def write_header(self) -> bool:
+        """(Re)write the header in place; False if the series list no longer fits."""
+        meta = json.dumps(
+            {
+                "version": 1,
+                "dtype": DTYPE,
+                "series": self.series,
+                "session": self.session,
+                "segment": self.number,
+            }
+        ).encode("utf-8")
+        if _PREFIX.size + len(meta) > HEADER_BYTES:
+            return False
+        header = _PREFIX.pack(MAGIC, HEADER_BYTES, RECORD.size, len(meta), 0) + meta
+        self.file.seek(0)
+        self.file.write(header.ljust(HEADER_BYTES, b"\0"))
+        self.file.seek(self.size)
+        return True
+
+    def close(self):
+        self.file.close()
+
+
+class CaptureSink:
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        max_bytes: int = 1024 * 1024 * 1024,
+        table: SeriesTable = SERIES,
+    ):
+        self.directory = directory
+        self.segment_bytes = max(HEADER_BYTES + RECORD.size, segment_bytes)
+        self.max_bytes = max_bytes
+        self._table = table
+        self._lock = threading.Lock()
+        self._segment = None
+        self._session = None
+        self._start_ns = 0
+        self._stop_ns = None  # samples from here on are not captured
+        self._session_samples = 0
+        self._full = False  # CAPTURE_MAX_BYTES reached
+        os.makedirs(directory, exist_ok=True)
+        self._disk_bytes = sum(
+            os.path.getsize(os.path.join(directory, name))
+            for name in os.listdir(directory)
+            if name.endswith(SUFFIX)
+        )
+        self._m_samples = METRICS.counter("capture_samples_total")
+        METRICS.gauge("capture_active", fn=lambda: 1 if self.active else 0)
+
+    @property
+    def active(self) -> bool:
+        return self._session is not None
+
+    # ---- control ----
+
+    def start(self, duration_s: float = None) -> dict:
+        with self._lock:
+            if self._session is None:
+                session = base = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+                n = 1
+                while os.path.exists(os.path.join(self.directory, f"{session}-000{SUFFIX}")):
+                    n += 1
+                    session = f"{base}.{n}"
+                self._session = session
+                self._start_ns = now_ns()
+                self._session_samples = 0
+                self._full = False
+                self._open_segment(0)
+                log.info("Capture %s started in %s", self._session, self.directory)
+            if duration_s:
+                self._stop_ns = now_ns() + int(float(duration_s) * 1e9)
+            else:
+                self._stop_ns = None
+            return self._status()
+
+    def stop(self) -> dict:
+        """Stop at now; samples stamped before now still arriving are written first."""
+        with self._lock:
+            if self._session is not None and self._stop_ns is None:
+                self._stop_ns = now_ns()
+            return self._status()
+
+    def status(self) -> dict:
+        with self._lock:
+            return self._status()
+
+    def _status(self) -> dict:
+        return {
+            "active": self._session is not None,
+            "session": self._session,
+            "samples": self._session_samples,
+            "segment": self._segment.path if self._segment else None,
+            "stop_ns": self._stop_ns,
+            "disk_bytes": self._disk_bytes,
+        }
+
+    # ---- writing ----
+
+    def _open_segment(self, number: int):
+        path = os.path.join(self.directory, f"{self._session}-{number:03d}{SUFFIX}")
+        self._segment = _Segment(path, self._session, number)
+        self._disk_bytes += HEADER_BYTES
+
+    def _close_session(self):
+        seg = self._segment
+        seg.close()
+        log.info(
+            "Capture %s finished: %d samples, last segment %s",
+            self._session,
+            self._session_samples,
+            seg.path,
+        )
+        self._segment = None
+        self._session = None
+        self._stop_ns = None
+
+    def write(self, batch: SampleBatch, start: int = 0):
+        """Append samples [start:] of batch stamped inside the session."""
+        if self._session is None:
+            return
+        with self._lock:
+            if self._session is None:
+                return
+            stop_ns = self._stop_ns
+            self._write(batch, start, self._start_ns, stop_ns)
+            if self._full or (stop_ns is not None and now_ns() >= stop_ns):
+                self._close_session()
+
+    def _write(self, batch: SampleBatch, start: int, start_ns: int, stop_ns):
+        if batch.timestamps_ns is not None:
+            times = batch.timestamps_ns[start:]
+        else:
+            times = [ts * 1_000_000 for ts in batch.timestamps[start:]]
+        seg = self._segment
+        pack = RECORD.pack
+        chunk = []
+        for sid, value, t_ns in zip(batch.series_ids[start:], batch.values[start:], times):
+            if t_ns < start_ns or (stop_ns is not None and t_ns >= stop_ns):
+                continue
+            if seg.size + (len(chunk) + 1) * RECORD.size > self.segment_bytes:
+                self._flush(seg, chunk)
+                if self._full:
+                    return
+                chunk = []
+                self._open_segment(seg.number + 1)
+                seg = self._segment
+            idx = seg.index.get(sid)
+            if idx is None:
+                idx = self._add_series(seg, sid, chunk)
+                if self._full:
+                    return
+                if idx is None:
+                    continue
+                seg = self._segment  # may have rotated
+            chunk.append(pack(idx, 0, t_ns, value))
+        self._flush(seg, chunk)
+
+    def _add_series(self, seg: _Segment, sid: int, chunk: list):
+        key = self._table.key(sid)
+        if key is None:
+            return None  # released meanwhile
+        seg.series.append(dict(key))
+        if not seg.write_header():
+            # series list outgrew the header: carry on in a new segment
+            seg.series.pop()
+            self._flush(seg, chunk)
+            if self._full:
+                return None
+            chunk.clear()
+            self._open_segment(seg.number + 1)
+            seg = self._segment
+            seg.series.append(dict(key))
+            seg.write_header()
+        seg.index[sid] = len(seg.series) - 1
+        return seg.index[sid]
+
+    def _flush(self, seg: _Segment, chunk: list):
+        if not chunk:
+            return
+        if self._disk_bytes + len(chunk) * RECORD.size > self.max_bytes:
+            log.warning(
+                "Capture directory reached CAPTURE_MAX_BYTES (%d); stopping capture %s",
+                self.max_bytes,
+                self._session,
+            )
+            self._full = True
+            return
+        data = b"".join(chunk)
+        seg.file.write(data)
+        seg.file.flush()
+        seg.size += len(data)
+        self._disk_bytes += len(data)
+        self._session_samples += len(chunk)
+        self._m_samples.inc(len(chunk))
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._close_session()
+
+    # ---- triggers ----
+
+    def install_signals(self):
+        """SIGUSR1 starts a session, SIGUSR2 stops it (main thread only)."""
+        # the handler must not take the lock the interrupted main thread may hold
+        signal.signal(
+            signal.SIGUSR1, lambda *_: threading.Thread(target=self.start, daemon=True).start()
+        )
+        signal.signal(
+            signal.SIGUSR2, lambda *_: threading.Thread(target=self.stop, daemon=True).start()
+        )
+
+    def serve(self, path: str):
+        """Accept 'start [seconds]' / 'stop' / 'status' lines on a unix socket."""
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                words = self.rfile.readline().decode("utf-8", "replace").split()
+                try:
+                    if words and words[0] == "start":
+                        reply = sink.start(float(words[1]) if len(words) > 1 else None)
+                    elif words and words[0] == "stop":
+                        reply = sink.stop()
+                    elif words and words[0] == "status":
+                        reply = sink.status()
+                    else:
+                        reply = {"error": "expected start [seconds], stop or status"}
+                except (ValueError, OSError) as e:
+                    reply = {"error": str(e)}
+                self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+        if os.path.exists(path):
+            os.unlink(path)  # left over from a previous run
+        server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True, name="capture_control").start()
+        log.info("Capture control socket at %s", path)
+        return server
+
+
+def main(argv):
+    """python capture.py start [seconds] | stop | status"""
+    path = os.getenv("CAPTURE_SOCKET", "/tmp/monitoring-client-capture.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall((" ".join(argv) + "\n").encode("utf-8"))
+        print(sock.makefile("r", encoding="utf-8").readline().strip())
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or ["status"])
@@ -0,0 +1,99 @@
+# base-monitoring-client/clock.py
+"""
+Integer epoch timestamps for samples, read off the monotonic clock.
+
+Collectors stamp every sample, so this is on the hot path: instead of
+formatting a datetime and parsing it back, a timestamp is
+time.monotonic_ns() plus an offset to wall time, as an int:
+
+    from clock import now_ms
+
+    power["timestamp"] = now_ms()   # epoch milliseconds, ready for SampleBatch
+
+The offset is measured at start-up and again every resync_interval_s
+(CLOCK_RESYNC_S, default 60), so the timestamps follow the wall clock (NTP)
+over a long run. They never go backwards within a run, however: when the
+wall clock turns out to be behind our timestamps, the clock does not step
+back but runs slower (max_slew_ppm, 5% by default) until it has caught up.
+A wall clock that is ahead is followed straight away.
+
+Each process has its own CLOCK; a collector process anchors its own.
+"""
+import os
+import threading
+import time
+
+RESYNC_INTERVAL_S = float(os.getenv("CLOCK_RESYNC_S", "60"))
+
+
+def _wall_offset_ns() -> int:
+    """time.time_ns() - time.monotonic_ns(), bracketed to halve the read error."""
+    m0 = time.monotonic_ns()
+    wall = time.time_ns()
+    m1 = time.monotonic_ns()
+    return wall - (m0 + m1) // 2
+
+
+class MonotonicClock:
+    def __init__(self, resync_interval_s: float = 60.0, max_slew_ppm: int = 50_000):
+        self.resync_interval_s = resync_interval_s
+        self.max_slew_ppm = max(1, min(max_slew_ppm, 999_999))
+        self._lock = threading.Lock()
+        mono = time.monotonic_ns()
+        offset = _wall_offset_ns()
+        # (anchor monotonic ns, offset at the anchor, target offset, next resync);
+        # replaced as a whole, so readers need no lock
+        self._state = (mono, offset, offset, mono + self._resync_ns())
+
+    def _resync_ns(self) -> int:
+        return int(self.resync_interval_s * 1e9) if self.resync_interval_s > 0 else 1 << 62
+
+    def _offset(self, state, mono: int) -> int:
+        anchor, offset, target, _ = state
+        if offset <= target:
+            return offset
+        # slewing back: lose max_slew_ppm of every elapsed ns until on target
+        return max(target, offset - (mono - anchor) * self.max_slew_ppm // 1_000_000)
+
+    def resync(self):
+        """Measure the offset to wall time again (done automatically)."""
+        with self._lock:
+            mono = time.monotonic_ns()
+            current = self._offset(self._state, mono)
+            target = _wall_offset_ns()
+            # ahead: step forward now; behind: slew from where we are
+            self._state = (mono, max(current, target), target, mono + self._resync_ns())
+
+    def now_ns(self) -> int:
+        mono = time.monotonic_ns()
+        state = self._state
+        if mono >= state[3]:
+            self.resync()
+            state = self._state
+        return mono + self._offset(state, mono)
+
+    def now_us(self) -> int:
+        return self.now_ns() // 1_000
+
+    def now_ms(self) -> int:
+        return self.now_ns() // 1_000_000
+
+    def offset_error_ms(self) -> float:
+        """How far our timestamps currently are from the wall clock (+: ahead)."""
+        mono = time.monotonic_ns()
+        return (self._offset(self._state, mono) - _wall_offset_ns()) / 1e6
+
+
+CLOCK = MonotonicClock(RESYNC_INTERVAL_S)
+
+
+def now_ns() -> int:
+    return CLOCK.now_ns()
+
+
+def now_us() -> int:
+    return CLOCK.now_us()
+
+
+def now_ms() -> int:
+    return CLOCK.now_ms()
@@ -0,0 +1,91 @@
+# base-monitoring-client/collectors.py
+"""
+Load the collector modules the client runs (COLLECTORS).
+
+A collector is anything with the monitor_impl API, a get_power() and a
+process_data() function. By default the client runs just monitor_impl, the
+file a board image copies over the stub. COLLECTORS lists several, so one
+client process (one pipeline, one set of batches, one connection) serves
+e.g. both the ina3221 rails and the jtop telemetry of a Jetson:
+
+    COLLECTORS=xavier_nx,xavier_nx_jtop@1
+
+Each entry is an importable module name or the name of an entry point in
+the "monitoring_client.collectors" group (a module or an object with the
+two functions, for collectors installed as packages). "@<seconds>"
+overrides SCRAPE_INTERVAL_S for that collector.
+"""
+import importlib
+from importlib.metadata import entry_points
+
+from self_metrics import set_collector
+
+ENTRY_POINT_GROUP = "monitoring_client.collectors"
+
+
+class Collector:
+    """One collector: its get_power/process_data pair and how often to scrape."""
+
+    def __init__(self, name: str, impl, scrape_interval_s: float = None):
+        for attr in ("get_power", "process_data"):
+            if not callable(getattr(impl, attr, None)):
+                raise TypeError(f"collector {name!r} has no {attr}() function")
+        self.name = name
+        self.impl = impl
+        self.get_power = impl.get_power
+        self.process_data = impl.process_data
+        self.scrape_interval_s = scrape_interval_s
+        self.service_label = getattr(impl, "SERVICE_LABEL", "")
+
+
+def run_collector(name: str, get_power, output_queue, scrape_interval_s: float, stop_event):
+    """
+    Worker body: get_power with the thread's scrape and scheduler metrics
+    labelled collector=<name>. Module-level, so functools.partial(run_collector,
+    name, get_power) can also be the target of a collector process.
+    """
+    set_collector(name)
+    return get_power(output_queue, scrape_interval_s, stop_event)
+
+
+def _load_impl(name: str):
+    try:
+        return importlib.import_module(name)
+    except ModuleNotFoundError as e:
+        if e.name != name:
+            raise  # the module exists but one of its imports is missing
+    matches = entry_points(group=ENTRY_POINT_GROUP, name=name)
+    if not matches:
+        raise ValueError(
+            f"collector {name!r} is neither an importable module "
+            f"nor a {ENTRY_POINT_GROUP} entry point"
+        )
+    return next(iter(matches)).load()
+
+
+def parse_collectors(spec: str) -> list:
+    """COLLECTORS as (name, scrape interval or None) pairs, in order."""
+    out = []
+    for entry in spec.replace(";", ",").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, interval = entry.partition("@")
+        name = name.strip()
+        try:
+            out.append((name, float(interval) if interval.strip() else None))
+        except ValueError:
+            raise ValueError(f"bad scrape interval in COLLECTORS entry {entry!r}") from None
+    if len({name for name, _ in out}) != len(out):
+        raise ValueError(f"COLLECTORS lists a collector twice: {spec!r}")
+    return out
+
+
+def load_collectors(spec: str) -> list:
+    """Import every collector listed in spec; at least one."""
+    collectors = [
+        Collector(name, _load_impl(name), interval) for name, interval in parse_collectors(spec)
+    ]
+    if not collectors:
+        raise ValueError("COLLECTORS is empty")
+    return collectors
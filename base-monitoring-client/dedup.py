@@ -0,0 +1,106 @@
+# base-monitoring-client/dedup.py
+"""
+Change-only emission for the push path (DEDUP=true).
+
+Rail voltages, CPU frequencies and offline cores hardly ever change, yet
+are sampled at the full rate. ChangeFilter drops a sample while its value
+stays within a tolerance of the last value actually sent for the series:
+
+    f = ChangeFilter(tolerance=0.0, tolerances={"xavier_nx_voltage_volts": 0.005},
+                     heartbeat_s=60)
+    out = f.process(batch)    # once per push window
+
+Tolerances are absolute, or relative to the last sent value when given as
+"<n>%" strings; per-metric ones override the default (exact equality).
+A series is sent again at least every heartbeat_s even when nothing
+changed, so Prometheus (5 minute lookback) never sees it as stale.
+
+When a value changes after a run of dropped samples, the last dropped one
+is sent too, right before the change, so graphs keep the step where it
+happened instead of a ramp across the whole flat stretch.
+"""
+from sample_batch import SERIES, SampleBatch, SeriesTable
+from self_metrics import METRICS
+
+
+def parse_tolerances(spec: str) -> dict:
+    """'metric=0.01,other=2%' -> {"metric": 0.01, "other": "2%"}."""
+    out = {}
+    for entry in spec.replace(";", ",").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        metric, sep, tol = entry.partition("=")
+        if not sep or not metric.strip():
+            raise ValueError(f"bad DEDUP_TOLERANCES entry {entry!r} (expected metric=tolerance)")
+        out[metric.strip()] = _check_tolerance(tol.strip())
+    return out
+
+
+def _check_tolerance(tol):
+    """A float (absolute) or an 'n%' string (relative); raises ValueError otherwise."""
+    if isinstance(tol, str) and tol.endswith("%"):
+        float(tol[:-1])
+        return tol
+    return float(tol)
+
+
+class ChangeFilter:
+    def __init__(
+        self,
+        tolerance=0.0,
+        tolerances: dict = None,
+        heartbeat_s: float = 60.0,
+        table: SeriesTable = SERIES,
+    ):
+        self.tolerance = _check_tolerance(tolerance)
+        self.tolerances = {m: _check_tolerance(t) for m, t in (tolerances or {}).items()}
+        self.heartbeat_ms = max(0, int(heartbeat_s * 1000))
+        self._table = table
+        self._sent = {}  # series id -> (value, timestamp) last sent
+        self._held = {}  # series id -> (value, timestamp) last dropped since then
+        self._tol = {}  # series id -> (absolute, relative) tolerance
+        self._m_dropped = METRICS.counter("dedup_suppressed_samples_total")
+
+    def _tolerance(self, sid: int):
+        tol = self._tol.get(sid)
+        if tol is None:
+            key = self._table.key(sid)
+            tol = self.tolerances.get(key[0][1], self.tolerance) if key else self.tolerance
+            if isinstance(tol, str):
+                tol = (0.0, float(tol[:-1]) / 100.0)
+            else:
+                tol = (tol, 0.0)
+            self._tol[sid] = tol
+        return tol
+
+    def process(self, batch: SampleBatch) -> SampleBatch:
+        """The samples of batch that changed, heartbeats, and the holds before changes."""
+        out = SampleBatch()
+        sent = self._sent
+        held = self._held
+        heartbeat_ms = self.heartbeat_ms
+        dropped = 0
+        for sid, value, ts in zip(batch.series_ids, batch.values, batch.timestamps):
+            last = sent.get(sid)
+            if last is not None:
+                absolute, relative = self._tolerance(sid)
+                # NaN compares false, so it always counts as a change
+                if abs(value - last[0]) <= max(absolute, relative * abs(last[0])):
+                    if heartbeat_ms and ts - last[1] >= heartbeat_ms:
+                        if held.pop(sid, None) is not None:
+                            dropped += 1
+                    else:
+                        if sid in held:
+                            dropped += 1  # the previous hold will never be sent
+                        held[sid] = (value, ts)
+                        continue
+                else:
+                    hold = held.pop(sid, None)
+                    if hold is not None:
+                        out.append(sid, hold[0], hold[1])
+            sent[sid] = (value, ts)
+            out.append(sid, value, ts)
+        if dropped:
+            self._m_dropped.inc(dropped)
+        return out
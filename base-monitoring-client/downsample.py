@@ -0,0 +1,127 @@
+# base-monitoring-client/downsample.py
+"""
+Client-side downsampling of the push path (DOWNSAMPLE_WINDOW_S).
+
+Collectors sample every 100 ms or so, dashboards look at hours. Instead of
+pushing every sample, the pusher can reduce each series to a few
+aggregates per window:
+
+    ds = Downsampler(window_s=10, aggregates=("min", "max", "mean", "last", "count"))
+    out = ds.process(batch, now_ms)    # once per push window
+
+For a series `xavier_nx_power_watts{component="VDD_IN"}` that gives
+`xavier_nx_power_watts_min`, `_max`, `_mean`, `_last` and `_count` with the
+same labels, one sample each per window. `_max` keeps power spikes that the
+mean would flatten. Each aggregate is stamped with the time of the window's
+last sample.
+
+Windows are aligned to multiples of window_s in epoch time. A window is
+closed when the series has a sample in a later window, or once it ended
+a full window ago (a series that stopped). process(..., final=True) closes
+the open windows too, for the last push at shutdown.
+
+raw_interval_s > 0 also passes raw samples through, at most one per series
+every raw_interval_s. Derived series are registered as transient series,
+so the pusher's series registry releases them once idle like any other.
+"""
+from sample_batch import SERIES, SampleBatch, SeriesTable
+from self_metrics import METRICS
+
+AGGREGATES = ("min", "max", "mean", "last", "count")
+
+# per-series window state
+_BUCKET, _MIN, _MAX, _SUM, _COUNT, _LAST, _LAST_TS = range(7)
+
+
+class Downsampler:
+    def __init__(
+        self,
+        window_s: float,
+        aggregates=AGGREGATES,
+        raw_interval_s: float = 0.0,
+        table: SeriesTable = SERIES,
+    ):
+        unknown = [a for a in aggregates if a not in AGGREGATES]
+        if unknown or not aggregates:
+            raise ValueError(
+                f"bad downsampling aggregates {list(aggregates)!r} "
+                f"(expected some of {', '.join(AGGREGATES)})"
+            )
+        self.window_ms = max(1, int(window_s * 1000))
+        self.aggregates = tuple(aggregates)
+        self.raw_interval_ms = int(raw_interval_s * 1000)
+        self._table = table
+        self._windows = {}  # series id -> window state
+        self._last_raw = {}  # series id -> timestamp of the last raw sample passed
+        self._derived = {}  # (series id, aggregate) -> derived series id
+        self._m_out = METRICS.counter("downsample_output_samples_total")
+
+    def _derived_sid(self, sid: int, agg: str):
+        new = self._derived.get((sid, agg))
+        # a released derived series has to be registered again
+        if new is not None and self._table.key(new) is not None:
+            return new
+        key = self._table.key(sid)
+        if key is None:
+            return None
+        labels = dict(key)
+        metric = labels.pop("__name__")
+        new = self._table.register(f"{metric}_{agg}", labels, pinned=False)
+        self._derived[(sid, agg)] = new
+        return new
+
+    def _emit(self, out: SampleBatch, sid: int, w):
+        ts = w[_LAST_TS]
+        for agg in self.aggregates:
+            dsid = self._derived_sid(sid, agg)
+            if dsid is None:
+                continue
+            if agg == "min":
+                value = w[_MIN]
+            elif agg == "max":
+                value = w[_MAX]
+            elif agg == "mean":
+                value = w[_SUM] / w[_COUNT]
+            elif agg == "last":
+                value = w[_LAST]
+            else:
+                value = float(w[_COUNT])
+            out.append(dsid, value, ts)
+
+    def process(self, batch: SampleBatch, now_ms: int, final: bool = False) -> SampleBatch:
+        """Aggregates of every window closed by batch (and by now_ms), plus raw pass-through."""
+        out = SampleBatch()
+        windows = self._windows
+        window_ms = self.window_ms
+        raw_ms = self.raw_interval_ms
+        for sid, value, ts in zip(batch.series_ids, batch.values, batch.timestamps):
+            if raw_ms > 0 and ts - self._last_raw.get(sid, ts - raw_ms) >= raw_ms:
+                self._last_raw[sid] = ts
+                out.append(sid, value, ts)
+            bucket = ts // window_ms
+            w = windows.get(sid)
+            if w is not None and bucket > w[_BUCKET]:
+                self._emit(out, sid, w)
+                w = None
+            if w is None:
+                windows[sid] = [bucket, value, value, value, 1, value, ts]
+                continue
+            # a late sample of an already closed window counts towards the open one
+            if value < w[_MIN]:
+                w[_MIN] = value
+            if value > w[_MAX]:
+                w[_MAX] = value
+            w[_SUM] += value
+            w[_COUNT] += 1
+            if ts >= w[_LAST_TS]:
+                w[_LAST] = value
+                w[_LAST_TS] = ts
+
+        # series that went quiet: close windows that ended a whole window ago
+        stale_bucket = now_ms // window_ms - 1
+        for sid, w in list(windows.items()):
+            if final or w[_BUCKET] < stale_bucket:
+                self._emit(out, sid, w)
+                del windows[sid]
+        self._m_out.inc(len(out))
+        return out
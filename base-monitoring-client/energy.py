@@ -0,0 +1,160 @@
+# base-monitoring-client/energy.py
+"""
+Integrate power series into energy counters on the device (ENERGY_INTEGRATION).
+
+Energy per run computed afterwards in Prometheus is only as good as the
+stored power samples. EnergyIntegrator sees every sample the collectors
+produce, before downsampling or dedup, and integrates each
+`*_power_watts` series (trapezoidal rule on the sample timestamps, in ns
+when the collector provides them, see SampleBatch.append_ns) into a
+counter with the same labels:
+
+    xavier_nx_power_watts{component="VDD_IN"}
+        -> xavier_nx_energy_joules_total{component="VDD_IN"}
+
+    energy = EnergyIntegrator(state_file="/var/lib/monitoring-client/energy.json")
+    counters = energy.process(batch)   # one sample per counter per push window
+
+Energy over a run is then increase(..._energy_joules_total[run]), exact to
+the collector's sampling rate however rarely it is pushed. Gaps longer than
+max_gap_s (a stalled collector, a restart) are not integrated: nothing is
+known about the power in between.
+
+With a state file the counters survive restarts: their totals are written
+there (atomically, at most every save_interval_s, and by save() at
+shutdown) and read back on start.
+"""
+import json
+import logging
+import os
+import time
+
+from sample_batch import SERIES, SampleBatch, SeriesTable
+from self_metrics import METRICS
+
+log = logging.getLogger("base-monitoring-client.energy")
+
+_STATE_VERSION = 1
+
+
+class _Series:
+    __slots__ = ("energy_sid", "joules", "value", "ts")
+
+    def __init__(self, energy_sid: int, joules: float):
+        self.energy_sid = energy_sid
+        self.joules = joules
+        self.value = None  # last power sample (W) and its timestamp (ns)
+        self.ts = None
+
+
+class EnergyIntegrator:
+    def __init__(
+        self,
+        power_suffix: str = "_power_watts",
+        energy_suffix: str = "_energy_joules_total",
+        max_gap_s: float = 5.0,
+        state_file: str = "",
+        save_interval_s: float = 10.0,
+        table: SeriesTable = SERIES,
+    ):
+        self.power_suffix = power_suffix
+        self.energy_suffix = energy_suffix
+        self.max_gap_ns = int(max_gap_s * 1e9)
+        self.state_file = state_file
+        self.save_interval_s = save_interval_s
+        self._table = table
+        self._series = {}  # power series id -> _Series (None: not a power series)
+        self._restored = self._load()  # energy label key -> joules from the state file
+        self._next_save = time.monotonic() + save_interval_s
+        self._m_gaps = METRICS.counter("energy_gaps_total")
+
+    def _track(self, sid: int):
+        try:
+            return self._series[sid]
+        except KeyError:
+            pass
+        key = self._table.key(sid)
+        state = None
+        if key is not None and key[0][1].endswith(self.power_suffix):
+            labels = dict(key)
+            metric = labels.pop("__name__")[: -len(self.power_suffix)] + self.energy_suffix
+            energy_sid = self._table.register(metric, labels)
+            energy_key = self._table.key(energy_sid)
+            state = _Series(energy_sid, self._restored.pop(energy_key, 0.0))
+        self._series[sid] = state
+        return state
+
+    def process(self, batch: SampleBatch) -> SampleBatch:
+        """Integrate the power samples in batch; the updated counters, one sample each."""
+        touched = {}
+        # at 1 kHz and above several samples share a millisecond
+        if batch.timestamps_ns is not None:
+            stamps = batch.timestamps_ns
+        else:
+            stamps = (ts_ms * 1_000_000 for ts_ms in batch.timestamps)
+        for sid, value, ts in zip(batch.series_ids, batch.values, stamps):
+            s = self._track(sid)
+            if s is None:
+                continue
+            if s.ts is not None:
+                dt_ns = ts - s.ts
+                if dt_ns <= 0:
+                    continue  # duplicate or out of order
+                if dt_ns <= self.max_gap_ns:
+                    s.joules += (s.value + value) * dt_ns / 2e9
+                else:
+                    self._m_gaps.inc()
+            s.value = value
+            s.ts = ts
+            touched[sid] = s
+
+        out = SampleBatch()
+        for s in touched.values():
+            out.append(s.energy_sid, s.joules, s.ts // 1_000_000)
+        if self.state_file and time.monotonic() >= self._next_save:
+            self.save()
+        return out
+
+    # ---- state file ----
+
+    def _load(self) -> dict:
+        if not self.state_file:
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") != _STATE_VERSION:
+                raise ValueError(f"unknown state version {state.get('version')!r}")
+            restored = {
+                tuple(tuple(pair) for pair in key): float(joules)
+                for key, joules in state["series"]
+            }
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning("Ignoring energy state file %s: %s", self.state_file, e)
+            return {}
+        log.info("Restored %d energy counters from %s", len(restored), self.state_file)
+        return restored
+
+    def save(self):
+        """Write every counter's total to the state file (atomically)."""
+        if not self.state_file:
+            return
+        self._next_save = time.monotonic() + self.save_interval_s
+        series = [
+            [self._table.key(s.energy_sid), s.joules]
+            for s in self._series.values()
+            if s is not None
+        ]
+        # counters not seen again since the restart are kept as they were
+        series += [[key, joules] for key, joules in self._restored.items()]
+        tmp = self.state_file + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": _STATE_VERSION, "series": series}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.state_file)
+        except OSError as e:
+            log.warning("Could not save energy state to %s: %s", self.state_file, e)
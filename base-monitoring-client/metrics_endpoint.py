@@ -0,0 +1,168 @@
+# base-monitoring-client/metrics_endpoint.py
+"""
+Pull mode: serve the latest value of every series as OpenMetrics text.
+
+The batching loop feeds every SampleBatch it drains into LatestValueStore,
+which keeps one (value, timestamp_ms) per series id. MetricsEndpoint serves
+that store on GET /metrics:
+
+    # TYPE jetson_power_watts unknown
+    jetson_power_watts{rail="VDD_IN",source="agx-orin"} 7.416
+    ...
+    # EOF
+
+The store takes no lock on the write path (one dict.update per batch under
+the GIL). The endpoint renders the text only when the store has changed
+since the last scrape, so back-to-back scrapes reuse the cached bytes, and
+each series' name/label prefix is rendered once and cached.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sample_batch import SERIES, SampleBatch, SeriesTable
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+class LatestValueStore:
+    """Latest (value, timestamp_ms) per series id, written by one thread."""
+
+    def __init__(self):
+        self._latest = {}  # series id -> (value, timestamp_ms)
+        self.version = 0  # bumped on every update; readers compare it
+
+    def update(self, batch: SampleBatch, start: int = 0):
+        """Record samples batch[start:]; later samples of a series win."""
+        if start >= len(batch):
+            return
+        if start:
+            batch = batch.slice(start, len(batch))
+        self._latest.update(
+            zip(batch.series_ids, zip(batch.values, batch.timestamps))
+        )
+        self.version += 1
+
+    def forget(self, sids):
+        for sid in sids:
+            self._latest.pop(sid, None)
+
+    def snapshot(self) -> dict:
+        return dict(self._latest)  # one C-level copy, consistent under the GIL
+
+    def __len__(self):
+        return len(self._latest)
+
+
+class ExpositionCache:
+    """Renders a LatestValueStore as OpenMetrics text, once per store version."""
+
+    def __init__(self, store: LatestValueStore, table: SeriesTable = SERIES, timestamps=False):
+        self._store = store
+        self._table = table
+        self._timestamps = timestamps
+        self._lock = threading.Lock()  # one render at a time; scrapes queue behind it
+        self._version = -1
+        self._body = b"# EOF\n"
+        self._prefixes = {}  # series id -> (metric name, 'name{labels} ')
+
+    def _prefix(self, sid: int):
+        prefix = self._prefixes.get(sid)
+        if prefix is None:
+            key = self._table.key(sid)
+            if key is None:
+                return None  # released series
+            name = key[0][1]
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in key[1:])
+            prefix = (name, f"{name}{{{labels}}} " if labels else f"{name} ")
+            self._prefixes[sid] = prefix
+        return prefix
+
+    def render(self) -> bytes:
+        version = self._store.version
+        if version == self._version:
+            return self._body
+        with self._lock:
+            version = self._store.version
+            if version == self._version:
+                return self._body
+            families = {}
+            released = []
+            for sid, (value, ts_ms) in self._store.snapshot().items():
+                prefix = self._prefix(sid)
+                if prefix is None:
+                    released.append(sid)
+                    continue
+                name, head = prefix
+                line = head + _format_value(value)
+                if self._timestamps:
+                    line += f" {ts_ms / 1000:.3f}"
+                families.setdefault(name, []).append(line)
+            if released:
+                self._store.forget(released)
+                for sid in released:
+                    self._prefixes.pop(sid, None)
+
+            # OpenMetrics wants every family's samples in one contiguous block
+            out = []
+            for name in sorted(families):
+                out.append(f"# TYPE {name} unknown")
+                out.extend(sorted(families[name]))
+            out.append("# EOF\n")
+            self._body = "\n".join(out).encode("utf-8")
+            self._version = version
+            return self._body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    cache: ExpositionCache = None  # set per server class in MetricsEndpoint
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.cache.render()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes are frequent; the pusher logs what matters
+
+
+class MetricsEndpoint:
+    """HTTP server for /metrics on its own daemon threads."""
+
+    def __init__(self, store: LatestValueStore, port: int, host: str = "", timestamps=False):
+        self.cache = ExpositionCache(store, timestamps=timestamps)
+        handler = type("MetricsHandler", (_Handler,), {"cache": self.cache})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True, name="metrics_endpoint"
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,311 @@
+# base-monitoring-client/process_collector.py
+"""
+Run monitor_impl.get_power in its own process (COLLECTOR_MODE=process).
+
+In thread mode the collector shares the GIL with encoding, snappy and
+requests, so its sampling jitter goes up during every push. In process mode
+get_power runs in a spawned child with its own interpreter, and hands its
+records over through a single-producer/single-consumer ring buffer in
+multiprocessing.shared_memory:
+
+    header (64 bytes): write index, read index, dropped records  (uint64 each)
+    slots:             slot_count x slot_bytes, each [uint32 length][pickled record]
+
+The child writes a slot and then moves the write index; the parent copies
+the slots out and then moves the read index. Both indices are only read and
+written under a multiprocessing lock shared by the two processes. Taking it
+is what orders the slot bytes before the index on weakly ordered CPUs
+(the Jetsons are aarch64): whoever sees an index also sees the data it
+covers. A write holds the lock for the whole slot, which also serialises
+the child's two writers, get_power and the self-metrics relay thread; the
+parent holds it only for the index updates. A pusher-side thread
+drains everything the ring holds every drain_interval_s and hands it to the
+raw BatchQueue in one put_many(), where process_data picks it up as before.
+
+monitor_impl authors see no difference: get_power still gets an object with
+put(item, timeout=...) that raises queue.Full, and a stop event with
+is_set()/wait(). The collector's self-metrics (scrape durations, drops) are
+shipped to the parent through the ring once a second.
+"""
+import logging
+import multiprocessing
+import pickle
+import queue
+import signal
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+import self_metrics
+from self_metrics import METRICS
+
+log = logging.getLogger("base-monitoring-client.collector")
+
+_HEADER = struct.Struct("<QQQ")  # write index, read index, dropped
+_HEADER_BYTES = 64
+_LEN = struct.Struct("<I")
+_METRICS_TAG = "__collector_self_metrics__"
+# longest the pusher waits for the ring lock; only a child that died while
+# holding it keeps it longer
+_LOCK_TIMEOUT_S = 1.0
+
+
+class ShmRing:
+    """
+    Ring of fixed-size slots in a shared memory block; lock is a
+    multiprocessing lock shared by the producer and consumer processes.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, slot_count: int, slot_bytes: int, lock):
+        self.shm = shm
+        self.slot_count = slot_count
+        self.slot_bytes = slot_bytes
+        self.lock = lock
+        self._buf = shm.buf
+
+    @classmethod
+    def create(cls, slot_count: int, slot_bytes: int, lock) -> "ShmRing":
+        shm = shared_memory.SharedMemory(
+            create=True, size=_HEADER_BYTES + slot_count * slot_bytes
+        )
+        _HEADER.pack_into(shm.buf, 0, 0, 0, 0)
+        return cls(shm, slot_count, slot_bytes, lock)
+
+    @classmethod
+    def attach(cls, name: str, slot_count: int, slot_bytes: int, lock) -> "ShmRing":
+        # a spawned child shares the parent's resource tracker, which unlinks
+        # the block only if the parent never does
+        return cls(shared_memory.SharedMemory(name=name), slot_count, slot_bytes, lock)
+
+    def _index(self, offset: int) -> int:
+        return struct.unpack_from("<Q", self._buf, offset)[0]
+
+    @property
+    def dropped(self) -> int:
+        return self._index(16)
+
+    def __len__(self):
+        return self._index(0) - self._index(8)
+
+    # ---- producer side (collector process) ----
+
+    def try_write(self, payload: bytes) -> bool:
+        """Copy payload into the next free slot; False if the ring is full."""
+        with self.lock:
+            w = self._index(0)
+            if w - self._index(8) >= self.slot_count:
+                return False
+            off = _HEADER_BYTES + (w % self.slot_count) * self.slot_bytes
+            _LEN.pack_into(self._buf, off, len(payload))
+            self._buf[off + 4 : off + 4 + len(payload)] = payload
+            struct.pack_into("<Q", self._buf, 0, w + 1)
+        return True
+
+    def count_dropped(self):
+        with self.lock:
+            struct.pack_into("<Q", self._buf, 16, self._index(16) + 1)
+
+    # ---- consumer side (pusher process) ----
+
+    def _acquire(self):
+        if not self.lock.acquire(timeout=_LOCK_TIMEOUT_S):
+            raise RuntimeError("collector ring lock held too long (did the collector process die?)")
+
+    def drain(self) -> list:
+        """Every payload written since the last drain, oldest first."""
+        self._acquire()
+        try:
+            r = self._index(8)
+            w = self._index(0)
+        finally:
+            self.lock.release()
+        # slots r..w-1 are the producer's no more until the read index moves
+        out = []
+        for i in range(r, w):
+            off = _HEADER_BYTES + (i % self.slot_count) * self.slot_bytes
+            (n,) = _LEN.unpack_from(self._buf, off)
+            out.append(bytes(self._buf[off + 4 : off + 4 + n]))
+        if w != r:
+            self._acquire()
+            try:
+                struct.pack_into("<Q", self._buf, 8, w)
+            finally:
+                self.lock.release()
+        return out
+
+    def close(self):
+        self._buf = None
+        self.shm.close()
+
+
+class RingQueue:
+    """
+    The output_queue get_power sees in process mode. Thread-safe, as the
+    ring's writes are serialised by its lock.
+    """
+
+    def __init__(self, ring: ShmRing, poll_s: float = 0.001):
+        self._ring = ring
+        self._poll_s = poll_s
+        self._limit = ring.slot_bytes - _LEN.size
+
+    def put(self, item, block: bool = True, timeout: float = None):
+        payload = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self._limit:
+            self._ring.count_dropped()
+            log.warning(
+                "Collector record of %d bytes exceeds COLLECTOR_RING_SLOT_BYTES; dropping it",
+                len(payload),
+            )
+            return
+        if self._ring.try_write(payload):
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while block and (deadline is None or time.monotonic() < deadline):
+            time.sleep(self._poll_s)
+            if self._ring.try_write(payload):
+                return
+        self._ring.count_dropped()
+        raise queue.Full
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    def qsize(self) -> int:
+        return len(self._ring)
+
+
+def _relay_self_metrics(writer: RingQueue, stop_event, interval_s: float = 1.0):
+    """Child side: send what the collector's self-metrics did since the last relay."""
+    last = {}
+    while True:
+        stopping = stop_event.wait(interval_s)
+        state = METRICS.state()
+        delta = self_metrics.state_delta(state, last)
+        if delta:
+            try:
+                writer.put((_METRICS_TAG, delta), timeout=interval_s)
+                last = state
+            except queue.Full:
+                pass  # carried over into the next relay
+        if stopping:
+            return
+
+
+def _child_main(
+    shm_name, slot_count, slot_bytes, ring_lock, scrape_interval_s, stop_event, log_level, target
+):
+    logging.basicConfig(
+        level=log_level,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+    # Ctrl-C (and a SIGTERM sent to the group) reaches us too; the parent
+    # decides when to stop us, after its final flush
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    if target is None:
+        import monitor_impl  # provided/overridden by derived image
+
+        target = monitor_impl.get_power
+
+    ring = ShmRing.attach(shm_name, slot_count, slot_bytes, ring_lock)
+    writer = RingQueue(ring)
+    relay = threading.Thread(
+        target=_relay_self_metrics, args=(writer, stop_event), daemon=True
+    )
+    relay.start()
+    try:
+        target(writer, scrape_interval_s, stop_event)
+    finally:
+        stop_event.set()
+        relay.join(2.0)
+        ring.close()
+
+
+class ProcessCollector:
+    """
+    Worker body for the supervisor: starts the collector process and moves
+    its records from the ring into output_queue (a BatchQueue) until
+    stop_event is set.
+    Raises when the child dies, so the supervisor restarts both.
+
+    target replaces monitor_impl.get_power; it must be a module-level
+    function (or a functools.partial of one), as the child is spawned and
+    has to import it.
+    """
+
+    def __init__(
+        self,
+        slot_count: int = 4096,
+        slot_bytes: int = 4096,
+        drain_interval_s: float = 0.05,
+        log_level: str = "INFO",
+        target=None,
+    ):
+        self.slot_count = slot_count
+        self.slot_bytes = slot_bytes
+        self.drain_interval_s = drain_interval_s
+        self.log_level = log_level
+        self.target = target
+        self._ctx = multiprocessing.get_context("spawn")  # no fork with threads running
+        self._ring_dropped = 0
+        self._m_dropped = METRICS.counter("collector_ring_dropped_total")
+
+    def __call__(self, output_queue, scrape_interval_s: float, stop_event):
+        ring = ShmRing.create(self.slot_count, self.slot_bytes, self._ctx.Lock())
+        self._ring_dropped = 0
+        child_stop = self._ctx.Event()
+        child = self._ctx.Process(
+            target=_child_main,
+            args=(
+                ring.shm.name,
+                self.slot_count,
+                self.slot_bytes,
+                ring.lock,
+                scrape_interval_s,
+                child_stop,
+                self.log_level,
+                self.target,
+            ),
+            daemon=True,
+            name="get_power_process",
+        )
+        child.start()
+        log.info(
+            "Started collector process pid=%s (ring: %d x %d bytes)",
+            child.pid,
+            self.slot_count,
+            self.slot_bytes,
+        )
+        try:
+            while not stop_event.is_set() and child.is_alive():
+                self._drain(ring, output_queue)
+                stop_event.wait(self.drain_interval_s)
+            child_stop.set()
+            child.join(5.0)
+            self._drain(ring, output_queue)  # whatever it wrote before exiting
+            if child.is_alive():
+                child.terminate()
+                child.join(1.0)
+            if not stop_event.is_set():
+                raise RuntimeError(f"collector process exited with code {child.exitcode}")
+        finally:
+            ring.close()
+            ring.shm.unlink()
+
+    def _drain(self, ring: ShmRing, output_queue):
+        dropped = ring.dropped
+        if dropped > self._ring_dropped:
+            self._m_dropped.inc(dropped - self._ring_dropped)
+        self._ring_dropped = dropped
+        records = []
+        for payload in ring.drain():
+            item = pickle.loads(payload)
+            if isinstance(item, tuple) and len(item) == 2 and item[0] == _METRICS_TAG:
+                METRICS.merge(item[1])
+            else:
+                records.append(item)
+        if records:
+            output_queue.put_many(records)  # the queue counts what it refuses
+
@@ -0,0 +1,154 @@
+# base-monitoring-client/relabel.py
+"""
+Per-endpoint write relabelling, following Prometheus' write_relabel_configs.
+
+Rules are plain dicts (e.g. from REMOTE_WRITE_ENDPOINTS):
+
+    {"action": "keep", "source_labels": ["__name__"], "regex": ".*_power_watts"}
+    {"action": "replace", "source_labels": ["source"], "regex": "(.*)",
+     "target_label": "instance", "replacement": "bench-$1"}
+    {"action": "labeldrop", "regex": "board"}
+
+Supported actions: replace (default), keep, drop, labelkeep, labeldrop.
+Regexes are fully anchored; source label values are joined with
+`separator` (default ";"), and `$1` / `${1}` in the replacement refer to
+capture groups.
+
+Relabelling works on series, not samples: SeriesRelabeler maps a series id
+to the id of its relabelled series (or None when it is dropped) once and
+caches the answer.
+"""
+import re
+import threading
+
+from sample_batch import SERIES, SampleBatch, SeriesTable
+
+_ACTIONS = {"replace", "keep", "drop", "labelkeep", "labeldrop"}
+_GROUP_REF = re.compile(r"\$(?:\{(\w+)\}|(\w+))")
+
+
+class RelabelRule:
+    def __init__(
+        self,
+        action: str = "replace",
+        source_labels=(),
+        regex: str = "(.*)",
+        separator: str = ";",
+        target_label: str = "",
+        replacement: str = "$1",
+    ):
+        if action not in _ACTIONS:
+            raise ValueError(f"unknown relabel action {action!r}")
+        if action == "replace" and not target_label:
+            raise ValueError("relabel action 'replace' needs a target_label")
+        self.action = action
+        self.source_labels = tuple(source_labels)
+        self.regex = re.compile(f"^(?:{regex})$")
+        self.separator = separator
+        self.target_label = target_label
+        # Prometheus-style $1 / ${name} -> Python \g<1> / \g<name>
+        self.replacement = _GROUP_REF.sub(
+            lambda m: f"\\g<{m.group(1) or m.group(2)}>", replacement.replace("\\", "\\\\")
+        )
+
+    def apply(self, labels: dict):
+        """Relabel labels in place; returns False when the series is dropped."""
+        if self.action in ("labelkeep", "labeldrop"):
+            keep = self.action == "labelkeep"
+            for name in list(labels):
+                if bool(self.regex.match(name)) != keep:
+                    del labels[name]
+            return True
+
+        value = self.separator.join(labels.get(name, "") for name in self.source_labels)
+        match = self.regex.match(value)
+        if self.action == "keep":
+            return match is not None
+        if self.action == "drop":
+            return match is None
+        if match is not None:
+            try:
+                result = match.expand(self.replacement)
+            except (IndexError, re.error):
+                result = ""  # reference to a missing group, as in Prometheus
+            if result:
+                labels[self.target_label] = result
+            else:
+                labels.pop(self.target_label, None)
+        return True
+
+
+def parse_rules(configs) -> list:
+    """Build RelabelRules from a list of dicts; raises ValueError on bad input."""
+    rules = []
+    for config in configs or ():
+        if not isinstance(config, dict):
+            raise ValueError(f"relabel rule must be an object, got {config!r}")
+        try:
+            rules.append(RelabelRule(**config))
+        except TypeError as e:
+            raise ValueError(f"bad relabel rule {config!r}: {e}") from None
+    return rules
+
+
+def relabel(labels: dict, rules):
+    """Apply rules in order to a copy of labels; None when the series is dropped."""
+    labels = dict(labels)
+    for rule in rules:
+        if not rule.apply(labels):
+            return None
+    if not labels.get("__name__"):
+        return None
+    return labels
+
+
+class SeriesRelabeler:
+    """
+    Maps series ids through a rule list, caching the result per id.
+
+    Relabelled series are registered in the table as transient series, so the
+    pusher's series registry releases them once idle like any other.
+    """
+
+    def __init__(self, rules, table: SeriesTable = SERIES):
+        self.rules = list(rules)
+        self._table = table
+        self._lock = threading.Lock()
+        self._mapped = {}  # source series id -> relabelled series id (None: dropped)
+
+    def map(self, sid: int):
+        try:
+            new = self._mapped[sid]
+        except KeyError:
+            pass
+        else:
+            # a released relabelled series has to be registered again
+            if new is None or new == sid or self._table.key(new) is not None:
+                return new
+
+        key = self._table.key(sid)
+        if key is None:
+            return None
+        labels = relabel(dict(key), self.rules)
+        if labels is None:
+            new = None
+        elif tuple(sorted(labels.items())) == tuple(sorted(key)):
+            new = sid
+        else:
+            metric = labels.pop("__name__")
+            new = self._table.register(metric, labels, pinned=False)
+        with self._lock:
+            self._mapped[sid] = new
+        return new
+
+    def apply(self, batch: SampleBatch) -> SampleBatch:
+        """New batch with every sample relabelled (dropped series removed)."""
+        out = SampleBatch()
+        mapped = self._mapped
+        for sid, value, ts_ms in zip(batch.series_ids, batch.values, batch.timestamps):
+            new = mapped.get(sid, -1)
+            if new == -1 or (new is not None and new != sid):
+                new = self.map(sid)
+            if new is not None:
+                out.append(new, value, ts_ms)
+        return out
@@ -0,0 +1,229 @@
+# base-monitoring-client/remote_write_encoder.py
+"""
+Streaming encoder for the prometheus.WriteRequest subset in remote.proto
+(and for the Remote-Write 2.0 equivalent, see WriteRequestV2Encoder).
+
+Writes protobuf wire format straight into a reusable bytearray, without
+building a message object graph (and without a protobuf runtime):
+
+    WriteRequest.timeseries = 1  (TimeSeries, length-delimited)
+    TimeSeries.labels       = 1  (Label, length-delimited)
+    TimeSeries.samples      = 2  (Sample, length-delimited)
+    Label.name / value      = 1 / 2  (string)
+    Sample.value            = 1  (double, fixed64)
+    Sample.timestamp        = 2  (int64, varint)
+
+Proto3 default values (empty strings, +0.0, 0) are omitted, so the output is
+byte-identical to remote_pb2's SerializeToString().
+"""
+import struct
+
+_DOUBLE = struct.Struct("<d")
+# Sample entry prefix: TimeSeries.samples tag, Sample length, Sample.value tag, value
+_SAMPLE_HEAD = struct.Struct("<BBBd")
+_ZERO_DOUBLE = b"\x00" * 8
+
+
+def encode_varint(buf: bytearray, n: int):
+    """Append n as a protobuf varint (negative int64 as 10-byte two's complement)."""
+    if n < 0:
+        n += 1 << 64
+    while n > 0x7F:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def _encode_string_field(buf: bytearray, tag: int, text: str):
+    if not text:
+        return
+    data = text.encode("utf-8")
+    buf.append(tag)
+    encode_varint(buf, len(data))
+    buf += data
+
+
+def encode_labels(key) -> bytes:
+    """Encode (name, value) pairs as repeated TimeSeries.labels entries."""
+    out = bytearray()
+    label = bytearray()
+    for name, value in key:
+        del label[:]
+        _encode_string_field(label, 0x0A, name)
+        _encode_string_field(label, 0x12, value)
+        out.append(0x0A)
+        encode_varint(out, len(label))
+        out += label
+    return bytes(out)
+
+
+def _encode_sample(buf: bytearray, value: float, ts_ms: int):
+    """Generic Sample encoding, used for the default-value corner cases."""
+    body = bytearray()
+    packed = _DOUBLE.pack(value)
+    if packed != _ZERO_DOUBLE:
+        body.append(0x09)
+        body += packed
+    if ts_ms:
+        body.append(0x10)
+        encode_varint(body, ts_ms)
+    buf.append(0x12)
+    encode_varint(buf, len(body))
+    buf += body
+
+
+class WriteRequestEncoder:
+    """
+    Encodes columnar samples into a serialized prometheus.WriteRequest (1.0).
+
+    The returned bytearray is reused by the next encode() call, so hand it to
+    snappy (or copy it) before encoding again. Not thread-safe; use one encoder
+    per thread.
+    """
+
+    protocol = "1.0"
+
+    def __init__(self):
+        self._out = bytearray()
+        self.dropped = 0  # samples dropped by the last encode()
+
+    def _encode_bodies(self, series_ids, values, timestamps, prefix) -> dict:
+        """
+        Group samples into TimeSeries bodies keyed by series id. prefix(sid)
+        returns the bytes that open the body (the series' labels), or None to
+        drop that series' samples.
+        """
+        pack_head = _SAMPLE_HEAD.pack
+        ts_cache = {}  # timestamp -> (Sample.timestamp field bytes, Sample length)
+        bodies = {}  # series id -> TimeSeries body
+        skipped = set()
+        self.dropped = 0
+
+        for sid, value, ts_ms in zip(series_ids, values, timestamps):
+            body = bodies.get(sid)
+            if body is None:
+                head = None if sid in skipped else prefix(sid)
+                if head is None:
+                    skipped.add(sid)
+                    self.dropped += 1
+                    continue
+                body = bodies[sid] = bytearray(head)
+
+            cached = ts_cache.get(ts_ms)
+            if cached is None:
+                if ts_ms <= 0:
+                    _encode_sample(body, value, ts_ms)
+                    continue
+                field = bytearray(b"\x10")
+                encode_varint(field, ts_ms)
+                cached = ts_cache[ts_ms] = (bytes(field), 9 + len(field))
+
+            if value == 0.0:
+                _encode_sample(body, value, ts_ms)
+                continue
+            body += pack_head(0x12, cached[1], 0x09, value)
+            body += cached[0]
+        return bodies
+
+    def encode(self, series_ids, values, timestamps, label_bytes) -> bytearray:
+        """
+        series_ids/values/timestamps: parallel sequences (e.g. SampleBatch arrays).
+        label_bytes: callable sid -> encoded labels (encode_labels), or None to
+        drop that series' samples.
+        """
+        bodies = self._encode_bodies(series_ids, values, timestamps, label_bytes)
+
+        out = self._out
+        del out[:]
+        for body in bodies.values():
+            out.append(0x0A)
+            encode_varint(out, len(body))
+            out += body
+        return out
+
+
+class WriteRequestV2Encoder(WriteRequestEncoder):
+    """
+    Encodes columnar samples into a serialized io.prometheus.write.v2.Request
+    (Remote-Write 2.0):
+
+        Request.symbols          = 4  (string; symbols[0] is always "")
+        Request.timeseries       = 5  (TimeSeries, length-delimited)
+        TimeSeries.labels_refs   = 1  (packed uint32 name/value pairs)
+        TimeSeries.samples       = 2  (Sample, same layout as 1.0)
+
+    The symbol table persists across requests: each label string is interned
+    once, and every series keeps its labels_refs field pre-encoded. Every
+    request carries the whole table, which for our small, stable label sets is
+    far smaller than repeating the strings per series. When released series
+    have left too many unused symbols behind, the table is rebuilt.
+    """
+
+    protocol = "2.0"
+
+    def __init__(self):
+        super().__init__()
+        self._reset_symbols()
+
+    def _reset_symbols(self):
+        self._symbols = {"": 0}
+        self._symbol_fields = bytearray(b"\x22\x00")  # symbols[0] = ""
+        self._refs = {}  # label key -> (encoded labels_refs field, symbol refs)
+
+    def _symbol(self, text: str) -> int:
+        ref = self._symbols.get(text)
+        if ref is None:
+            ref = self._symbols[text] = len(self._symbols)
+            data = text.encode("utf-8")
+            self._symbol_fields.append(0x22)
+            encode_varint(self._symbol_fields, len(data))
+            self._symbol_fields += data
+        return ref
+
+    def _series_refs(self, key):
+        cached = self._refs.get(key)
+        if cached is None:
+            refs = []
+            for name, value in key:
+                refs.append(self._symbol(name))
+                refs.append(self._symbol(value))
+            packed = bytearray()
+            for ref in refs:
+                encode_varint(packed, ref)
+            field = bytearray(b"\x0a")
+            encode_varint(field, len(packed))
+            field += packed
+            cached = self._refs[key] = (bytes(field), refs)
+        return cached
+
+    def encode(self, series_ids, values, timestamps, label_key) -> bytearray:
+        """
+        label_key: callable sid -> label tuple ((name, value), ...) as kept in
+        the SeriesTable, or None to drop that series' samples.
+        """
+        keys = {}  # series id -> label key, for the series in this request
+
+        def prefix(sid):
+            key = keys[sid] = label_key(sid)
+            return None if key is None else self._series_refs(key)[0]
+
+        bodies = self._encode_bodies(series_ids, values, timestamps, prefix)
+
+        used = set()
+        for sid in bodies:
+            used.update(self._refs[keys[sid]][1])
+
+        out = self._out
+        del out[:]
+        out += self._symbol_fields
+        for body in bodies.values():
+            out.append(0x2A)
+            encode_varint(out, len(body))
+            out += body
+
+        # rebuild the table on the next request once it is mostly dead weight
+        stale_symbols = len(self._symbols) > 2 * len(used) + 64
+        stale_series = len(self._refs) > 2 * len(bodies) + 64
+        if stale_symbols or stale_series:
+            self._reset_symbols()
+        return out
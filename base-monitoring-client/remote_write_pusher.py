@@ -1,24 +1,129 @@
 # base-monitoring-client/remote_write_pusher.py
+import json
 import os
+import random
+import signal
 import time
 import threading
 import logging
 import queue
-from collections import deque, defaultdict
+from collections import deque
+from functools import partial
 
 import requests
 import snappy
 
-from remote_pb2 import WriteRequest, Sample
-import monitor_impl  # provided/overridden by derived image
+from batch_queue import BatchQueue
+from capture import CaptureSink
+from clock import now_ms
+from collectors import load_collectors, run_collector
+from dedup import ChangeFilter, parse_tolerances
+from downsample import Downsampler
+from energy import EnergyIntegrator
+from metrics_endpoint import LatestValueStore, MetricsEndpoint
+from process_collector import ProcessCollector
+from relabel import SeriesRelabeler, parse_rules
+from remote_write_encoder import WriteRequestEncoder, WriteRequestV2Encoder, encode_labels
+from sample_batch import SERIES, SampleBatch, SeriesTable
+from self_metrics import METRICS, count_drop
+from supervisor import WorkerSupervisor
+from wal import SegmentWAL
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() in {"1", "true", "yes", "y", "on"}
+
 
 REMOTE_WRITE_URL = os.getenv("REMOTE_WRITE_URL", "http://prometheus:9090/api/v1/write")
+# "1.0" (0.1.0 wire protocol), "2.0" (symbol table; falls back to 1.0 on HTTP 415)
+# or "auto" (2.0, falling back when the receiver does not confirm it)
+REMOTE_WRITE_PROTOCOL = os.getenv("REMOTE_WRITE_PROTOCOL", "1.0").strip().lower()
+# several targets: comma-separated URLs or a JSON list (see _load_endpoints)
+REMOTE_WRITE_ENDPOINTS = os.getenv("REMOTE_WRITE_ENDPOINTS", "").strip()
 PUSH_INTERVAL_S = float(os.getenv("PUSH_INTERVAL_S", "4"))
-MAX_RETRY_BATCHES = int(os.getenv("MAX_RETRY_BATCHES", "5"))
+MAX_RETRY_SAMPLES = int(os.getenv("MAX_RETRY_SAMPLES", "100000"))
+SEND_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", "4"))
+WAL_DIR = os.getenv("WAL_DIR", "")
+WAL_SEGMENT_BYTES = int(os.getenv("WAL_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+WAL_MAX_BYTES = int(os.getenv("WAL_MAX_BYTES", str(64 * 1024 * 1024)))
+WAL_REPLAY_BYTES_PER_S = float(os.getenv("WAL_REPLAY_BYTES_PER_S", str(1024 * 1024)))
+# senders per endpoint, one request in flight each; MAX_IN_FLIGHT_REQUESTS is the old name
+REMOTE_WRITE_SHARDS = int(
+    os.getenv("REMOTE_WRITE_SHARDS", os.getenv("MAX_IN_FLIGHT_REQUESTS", "1"))
+)
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(1024 * 1024)))
+RETRY_BACKOFF_MIN_S = float(os.getenv("RETRY_BACKOFF_MIN_S", "0.5"))
+RETRY_BACKOFF_MAX_S = float(os.getenv("RETRY_BACKOFF_MAX_S", "30"))
 RAW_QUEUE_SIZE = int(os.getenv("RAW_QUEUE_SIZE", "1000"))
 PROC_QUEUE_SIZE = int(os.getenv("PROC_QUEUE_SIZE", "1000"))
+# what a full raw/proc queue does: drop_newest, drop_oldest or block (see batch_queue.py)
+RAW_QUEUE_POLICY = os.getenv("RAW_QUEUE_POLICY", "drop_newest").strip().lower()
+PROC_QUEUE_POLICY = os.getenv("PROC_QUEUE_POLICY", "drop_newest").strip().lower()
+QUEUE_BLOCK_TIMEOUT_S = float(os.getenv("QUEUE_BLOCK_TIMEOUT_S", "1"))
+SERIES_IDLE_TIMEOUT_S = float(os.getenv("SERIES_IDLE_TIMEOUT_S", "600"))
+# collector modules to run, default the monitor_impl the board image provides
+# (comma-separated, "name@interval_s" to override SCRAPE_INTERVAL_S; see collectors.py)
+COLLECTORS = os.getenv("COLLECTORS", "monitor_impl")
+# "thread" or "process" (get_power in its own process, see process_collector.py)
+COLLECTOR_MODE = os.getenv("COLLECTOR_MODE", "thread").strip().lower()
+COLLECTOR_RING_SLOTS = int(os.getenv("COLLECTOR_RING_SLOTS", "4096"))
+COLLECTOR_RING_SLOT_BYTES = int(os.getenv("COLLECTOR_RING_SLOT_BYTES", "4096"))
+COLLECTOR_DRAIN_INTERVAL_S = float(os.getenv("COLLECTOR_DRAIN_INTERVAL_S", "0.05"))
+# crashed workers are restarted; more than WORKER_MAX_RESTARTS restarts of one
+# worker within WORKER_RESTART_WINDOW_S stops the client
+WORKER_MAX_RESTARTS = int(os.getenv("WORKER_MAX_RESTARTS", "5"))
+WORKER_RESTART_WINDOW_S = float(os.getenv("WORKER_RESTART_WINDOW_S", "300"))
+WORKER_RESTART_BACKOFF_MIN_S = float(os.getenv("WORKER_RESTART_BACKOFF_MIN_S", "1"))
+WORKER_RESTART_BACKOFF_MAX_S = float(os.getenv("WORKER_RESTART_BACKOFF_MAX_S", "30"))
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
+# flush triggers next to PUSH_INTERVAL_S (0 disables a trigger)
+MAX_BATCH_SAMPLES = int(os.getenv("MAX_BATCH_SAMPLES", "20000"))
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", str(MAX_REQUEST_BYTES)))
+PUSH_INTERVAL_ADAPTIVE = _env_bool("PUSH_INTERVAL_ADAPTIVE", False)
+PUSH_INTERVAL_MIN_S = float(os.getenv("PUSH_INTERVAL_MIN_S", "0.5"))
+PUSH_INTERVAL_MAX_S = float(os.getenv("PUSH_INTERVAL_MAX_S", "30"))
+ADAPTIVE_TARGET_BYTES = int(os.getenv("ADAPTIVE_TARGET_BYTES", str(256 * 1024)))
+# ship the client's own counters/histograms with the data (see self_metrics.py)
+SELF_METRICS = _env_bool("SELF_METRICS", True)
+# "push" (remote write), "pull" (serve /metrics) or "both"
+OUTPUT_MODE = os.getenv("OUTPUT_MODE", "push").strip().lower()
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9101"))
+# expose sample timestamps instead of letting Prometheus stamp the scrape
+METRICS_TIMESTAMPS = _env_bool("METRICS_TIMESTAMPS", False)
+# budget for the final flush on SIGTERM/SIGINT (docker stops with SIGKILL after 10s)
+SHUTDOWN_TIMEOUT_S = float(os.getenv("SHUTDOWN_TIMEOUT_S", "8"))
+# in pull mode, the latest-value store lags the collectors by at most this
+PULL_REFRESH_S = float(os.getenv("PULL_REFRESH_S", "1"))
+# push per-window aggregates instead of every sample (0 disables; see downsample.py)
+DOWNSAMPLE_WINDOW_S = float(os.getenv("DOWNSAMPLE_WINDOW_S", "0"))
+DOWNSAMPLE_AGGREGATES = [
+    a.strip().lower()
+    for a in os.getenv("DOWNSAMPLE_AGGREGATES", "min,max,mean,last,count").split(",")
+    if a.strip()
+]
+# with downsampling, also push raw samples at most this often per series (0: none)
+DOWNSAMPLE_RAW_INTERVAL_S = float(os.getenv("DOWNSAMPLE_RAW_INTERVAL_S", "0"))
+# push a sample only when it moved past a tolerance, plus a heartbeat (see dedup.py)
+DEDUP = _env_bool("DEDUP", False)
+DEDUP_TOLERANCE = os.getenv("DEDUP_TOLERANCE", "0").strip()
+DEDUP_TOLERANCES = os.getenv("DEDUP_TOLERANCES", "")
+DEDUP_HEARTBEAT_S = float(os.getenv("DEDUP_HEARTBEAT_S", "60"))
+# integrate *_power_watts series into *_energy_joules_total counters (see energy.py)
+ENERGY_INTEGRATION = _env_bool("ENERGY_INTEGRATION", False)
+ENERGY_POWER_SUFFIX = os.getenv("ENERGY_POWER_SUFFIX", "_power_watts")
+ENERGY_MAX_GAP_S = float(os.getenv("ENERGY_MAX_GAP_S", "5"))
+ENERGY_STATE_FILE = os.getenv("ENERGY_STATE_FILE", "")
+ENERGY_STATE_SAVE_S = float(os.getenv("ENERGY_STATE_SAVE_S", "10"))
+# raw sample capture to local files, started/stopped on demand (see capture.py)
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "")
+CAPTURE_SEGMENT_BYTES = int(os.getenv("CAPTURE_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+CAPTURE_MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", str(1024 * 1024 * 1024)))
+CAPTURE_SOCKET = os.getenv("CAPTURE_SOCKET", "/tmp/monitoring-client-capture.sock")
+
 logging.basicConfig(
     level=LOG_LEVEL,
     format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
@@ -26,55 +131,228 @@ logging.basicConfig(
 log = logging.getLogger("base-monitoring-client")
 
 
-def build_write_request(records):
+class PushStats:
+    """
+    Smoothed figures the batching loop sizes its windows by: encoded bytes
+    per sample and push latency (fed by the senders), and the incoming
+    sample rate and samples per queued item (fed by the batching loop itself).
+    """
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.bytes_per_sample = 32.0  # until the first encode tells us better
+        self.latency_s = 0.0
+        self.samples_per_s = 0.0
+        self.samples_per_item = 0.0
+        self.pushes = 0
+
+    def _ewma(self, old: float, new: float) -> float:
+        return new if old == 0.0 else old + self.alpha * (new - old)
+
+    def record_encoded(self, samples: int, nbytes: int):
+        if samples:
+            self.bytes_per_sample = self._ewma(self.bytes_per_sample, nbytes / samples)
+
+    def record_push(self, latency_s: float):
+        self.latency_s = self._ewma(self.latency_s, latency_s)
+        self.pushes += 1
+
+    def record_window(self, samples: int, elapsed_s: float):
+        if elapsed_s > 0:
+            self.samples_per_s = self._ewma(self.samples_per_s, samples / elapsed_s)
+
+    def record_drain(self, items: int, samples: int):
+        if items:
+            self.samples_per_item = self._ewma(self.samples_per_item, samples / items)
+
+
+PUSH_STATS = PushStats()
+
+
+def _append_records(batch: SampleBatch, records):
+    """Legacy path: append normalized dict records, logging and dropping bad ones."""
+    for rec in records:
+        try:
+            batch.append_record(rec)
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            log.warning(
+                "build_write_request: bad normalized record %r (%s) - dropping", rec, e
+            )
+
+
+class SeriesRegistry:
+    """
+    Push-side cache on top of the shared SeriesTable.
+
+    Keeps every series' labels pre-sorted and pre-encoded as TimeSeries.labels
+    wire bytes, so a push only has to encode samples. Series that have not been
+    pushed for SERIES_IDLE_TIMEOUT_S are evicted (and released from the table
+    when they came in through the legacy dict path).
     """
-    records: iterable of normalized records:
+
+    def __init__(self, table: SeriesTable, idle_timeout_s: float):
+        self._table = table
+        self._idle_timeout_s = idle_timeout_s
+        self._lock = threading.Lock()  # sender threads share the registry
+        self._label_bytes = {}  # series id -> encoded labels
+        self._last_used = {}  # series id -> monotonic time of last push
+        self._next_sweep = time.monotonic() + idle_timeout_s
+
+    def label_key(self, sid: int, now: float):
+        """Label tuple for sid (Remote-Write 2.0 encoder), or None if released."""
+        key = self._table.key(sid)
+        if key is not None:
+            self._last_used[sid] = now
+        return key
+
+    def label_bytes(self, sid: int, now: float):
+        """Encoded labels for sid, or None if the series was released."""
+        encoded = self._label_bytes.get(sid)
+        if encoded is None:
+            key = self._table.key(sid)
+            if key is None:
+                return None
+            encoded = encode_labels(key)
+            with self._lock:
+                self._label_bytes[sid] = encoded
+        self._last_used[sid] = now
+        return encoded
+
+    def evict_idle(self, now: float) -> int:
+        if now < self._next_sweep:
+            return 0
+        with self._lock:
+            self._next_sweep = now + self._idle_timeout_s
+            idle = [
+                sid
+                for sid, last in list(self._last_used.items())
+                if now - last > self._idle_timeout_s
+            ]
+            for sid in idle:
+                self._label_bytes.pop(sid, None)
+                self._last_used.pop(sid, None)
+                self._table.release(sid)
+        if idle:
+            log.info("Evicted %d idle series from the series registry", len(idle))
+        return len(idle)
+
+    def __len__(self):
+        # _label_bytes stays empty under Remote-Write 2.0; every pushed series is in _last_used
+        return len(self._last_used)
+
+
+REGISTRY = SeriesRegistry(SERIES, SERIES_IDLE_TIMEOUT_S)
+ENCODER = WriteRequestEncoder()
+
+_ENCODE_SECONDS = METRICS.histogram("encode_duration_seconds")
+_RELEASED_DROPS = METRICS.counter("dropped_samples_total", reason="released_series")
+
+# window stages, set up by _setup_stages() from main(): a spawned collector
+# process re-imports this module (as __mp_main__) and must not load the
+# energy state file or register their metrics
+DOWNSAMPLER = None
+ENERGY = None
+CHANGE_FILTER = None
+
+
+def _setup_stages():
+    global DOWNSAMPLER, ENERGY, CHANGE_FILTER
+    if DOWNSAMPLE_WINDOW_S > 0:
+        DOWNSAMPLER = Downsampler(
+            DOWNSAMPLE_WINDOW_S, DOWNSAMPLE_AGGREGATES, DOWNSAMPLE_RAW_INTERVAL_S
+        )
+    if ENERGY_INTEGRATION:
+        ENERGY = EnergyIntegrator(
+            power_suffix=ENERGY_POWER_SUFFIX,
+            max_gap_s=ENERGY_MAX_GAP_S,
+            state_file=ENERGY_STATE_FILE,
+            save_interval_s=ENERGY_STATE_SAVE_S,
+        )
+    if DEDUP:
+        CHANGE_FILTER = ChangeFilter(
+            DEDUP_TOLERANCE, parse_tolerances(DEDUP_TOLERANCES), DEDUP_HEARTBEAT_S
+        )
+    METRICS.gauge("series", fn=REGISTRY.__len__)
+
+
+def build_write_request(records, encoder: WriteRequestEncoder = None) -> bytearray:
+    """
+    Encode a serialized prometheus.WriteRequest (or a Remote-Write 2.0
+    io.prometheus.write.v2.Request when given a WriteRequestV2Encoder).
+
+    records: a SampleBatch, or (compatibility) an iterable of normalized records:
        {
          "metric": str,
          "labels": dict[str,str],
          "value": float,
          "timestamp_ms": int
        }
+
+    Returns the encoder's reusable buffer: it is only valid until the next call.
+    Threads other than the caller of the module-level ENCODER pass their own encoder.
     """
-    series_map = defaultdict(list)
+    if isinstance(records, SampleBatch):
+        batch = records
+    else:
+        batch = SampleBatch()
+        _append_records(batch, records)
+
+    encoder = encoder or ENCODER
+    now = time.monotonic()
+    lookup = REGISTRY.label_key if encoder.protocol == "2.0" else REGISTRY.label_bytes
+    out = encoder.encode(
+        batch.series_ids,
+        batch.values,
+        batch.timestamps,
+        lambda sid: lookup(sid, now),
+    )
+    if encoder.dropped:
+        _RELEASED_DROPS.inc(encoder.dropped)
+        log.warning(
+            "build_write_request: %d samples for released series - dropping",
+            encoder.dropped,
+        )
+
+    REGISTRY.evict_idle(now)
+    return out
 
-    for rec in records:
-        try:
-            metric = rec["metric"]
-            labels = rec.get("labels", {})
-            ts_ms = int(rec["timestamp_ms"])
-            value = float(rec["value"])
-        except (KeyError, ValueError, TypeError) as e:
-            log.warning(
-                "build_write_request: bad normalized record %r (%s) - dropping", rec, e
-            )
-            continue
 
-        label_items = [("__name__", metric)] + sorted(labels.items())
-        key = tuple(label_items)
-        series_map[key].append(Sample(value=value, timestamp=ts_ms))
+# protocol -> (Content-Type, X-Prometheus-Remote-Write-Version)
+_PROTOCOL_HEADERS = {
+    "1.0": ("application/x-protobuf", "0.1.0"),
+    "2.0": ("application/x-protobuf;proto=io.prometheus.write.v2.Request", "2.0.0"),
+}
+# a 2.0 receiver reports what it stored; a 1.0-only one does not
+_SAMPLES_WRITTEN_HEADER = "X-Prometheus-Remote-Write-Samples-Written"
+# on a WAL replay request made of several stored WriteRequests: how many.
+# Their series may repeat, so bench/receiver.py lets such requests through.
+_REPLAY_MERGED_HEADER = "X-Monitoring-Client-Replay-Merged"
 
-    req = WriteRequest()
-    for key, samples in series_map.items():
-        ts = req.timeseries.add()
-        for name, value in key:
-            lab = ts.labels.add()
-            lab.name = name
-            lab.value = value
-        ts.samples.extend(samples)
 
-    return req
+def push_write_request(
+    session: requests.Session, req, url: str = REMOTE_WRITE_URL, protocol: str = "1.0"
+):
+    """Send the serialized protobuf to Prometheus and log response text on errors."""
+    return post_payload(session, snappy.compress(req), url, protocol)
 
 
-def push_write_request(session: requests.Session, req: WriteRequest):
-    """Send the protobuf to Prometheus and log response text on errors."""
-    payload = snappy.compress(req.SerializeToString())
+def post_payload(
+    session: requests.Session,
+    payload: bytes,
+    url: str = REMOTE_WRITE_URL,
+    protocol: str = "1.0",
+    merged: int = 0,
+):
+    """POST an already snappy-compressed WriteRequest (e.g. replayed from the WAL)."""
+    content_type, version = _PROTOCOL_HEADERS[protocol]
     headers = {
         "Content-Encoding": "snappy",
-        "Content-Type": "application/x-protobuf",
-        "X-Prometheus-Remote-Write-Version": "0.1.0",
+        "Content-Type": content_type,
+        "X-Prometheus-Remote-Write-Version": version,
     }
-    resp = session.post(REMOTE_WRITE_URL, data=payload, headers=headers, timeout=5)
+    if merged:
+        headers[_REPLAY_MERGED_HEADER] = str(merged)
+    resp = session.post(url, data=payload, headers=headers, timeout=5)
     try:
         resp.raise_for_status()
     except requests.HTTPError:
@@ -87,121 +365,924 @@ def push_write_request(session: requests.Session, req: WriteRequest):
     return resp
 
 
-def start_pipeline(scrape_interval_s: float):
-    """Start collector + processor threads and return the queues + stop event + threads."""
-    raw_queue = queue.Queue(maxsize=RAW_QUEUE_SIZE)
-    proc_queue = queue.Queue(maxsize=PROC_QUEUE_SIZE)
-    stop_event = threading.Event()
+class _TokenBucket:
+    """Byte-rate limiter; a request may overdraw once the bucket is full."""
 
-    collector_thread = threading.Thread(
-        target=monitor_impl.get_power,
-        args=(raw_queue, scrape_interval_s, stop_event),
-        daemon=True,
-        name="get_power_thread",
-    )
-    processor_thread = threading.Thread(
-        target=monitor_impl.process_data,
-        args=(raw_queue, proc_queue, stop_event),
-        daemon=True,
-        name="process_data_thread",
-    )
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = rate
+        self._last = time.monotonic()
 
-    collector_thread.start()
-    processor_thread.start()
+    def take(self, n: int) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        if self._tokens < min(n, self.rate):
+            return False
+        self._tokens -= n
+        return True
 
-    log.info("Started get_power and process_data threads")
-    # return the threads so the main loop can watch them
-    return proc_queue, stop_event, [collector_thread, processor_thread]
 
+class _Backoff:
+    """Exponential backoff with jitter, shared by a sender's worker threads."""
 
-def main():
-    # collector interval
-    scrape_interval_s = float(os.getenv("SCRAPE_INTERVAL_S", "0.1"))
-    proc_queue, stop_event, worker_threads = start_pipeline(scrape_interval_s)
+    def __init__(self, min_s: float, max_s: float):
+        self.min_s = min_s
+        self.max_s = max_s
+        self.failures = 0
+        self._ready_at = 0.0
+
+    def ready(self) -> bool:
+        return time.monotonic() >= self._ready_at
+
+    def wait_s(self) -> float:
+        return max(0.0, self._ready_at - time.monotonic())
 
-    retry_batches = deque()
-    session = requests.Session()
+    def failed(self, at_least_s: float = 0.0) -> float:
+        delay = min(self.max_s, self.min_s * (2 ** self.failures))
+        delay = max(at_least_s, delay * random.uniform(0.5, 1.0))
+        self.failures += 1
+        self._ready_at = time.monotonic() + delay
+        return delay
 
-    log.info("Remote write loop started: push every %ss", PUSH_INTERVAL_S)
+    def succeeded(self):
+        self.failures = 0
+        self._ready_at = 0.0
 
+
+# outcomes of RemoteWriteSender._post (_FALLBACK: resend as Remote-Write 1.0)
+_SENT, _REJECTED, _RETRY, _FALLBACK = "sent", "rejected", "retry", "fallback"
+
+
+def _is_retryable(exc: Exception) -> bool:
+    """5xx, 429, timeouts and connection errors are retried; other 4xx are permanent."""
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(exc, requests.RequestException)
+
+
+def _retry_after_s(exc: Exception) -> float:
+    response = getattr(exc, "response", None)
+    if response is None:
+        return 0.0
     try:
-        # run until we're told to stop (or a worker dies)
-        while not stop_event.is_set():
-            # ---- worker health guard ----
-            for t in worker_threads:
-                if not t.is_alive():
-                    log.error("Worker thread %s died; stopping pipeline", t.name)
-                    stop_event.set()
-                    break
-            if stop_event.is_set():
-                break
+        return float(response.headers.get("Retry-After", 0))
+    except ValueError:
+        return 0.0
 
-            # ---- collect records until next push ----
-            deadline = time.time() + PUSH_INTERVAL_S
-            current_items = []
 
-            while True:
-                remaining = deadline - time.time()
-                if remaining <= 0:
-                    break
+def _encode_chunks(
+    batch: SampleBatch, encoder: WriteRequestEncoder, max_bytes: int, start=0, stop=None
+):
+    """
+    Yield (start, stop, compressed payload) for batch[start:stop], halving the
+    range until every encoded request fits in max_bytes. Chunks come out in
+    sample order, so each series' samples stay in timestamp order across requests.
+    """
+    if stop is None:
+        stop = len(batch)
+    part = batch if (start, stop) == (0, len(batch)) else batch.slice(start, stop)
+    t0 = time.perf_counter()
+    req = build_write_request(part, encoder)
+    _ENCODE_SECONDS.observe(time.perf_counter() - t0)
+    PUSH_STATS.record_encoded(stop - start, len(req))
+    if len(req) <= max_bytes or stop - start <= 1:
+        yield start, stop, snappy.compress(req)
+        return
+    mid = (start + stop) // 2
+    yield from _encode_chunks(batch, encoder, max_bytes, start, mid)
+    yield from _encode_chunks(batch, encoder, max_bytes, mid, stop)
+
+
+class RemoteWriteSender:
+    """
+    Network stage of the pipeline.
+
+    The batching loop hands finished SampleBatches over through a bounded
+    queue; one worker thread encodes and POSTs them and owns the retry
+    backlog. A slow or unreachable endpoint therefore only backs up this
+    stage, never the collectors or the batching cadence. There is never more
+    than one request in flight, so the samples of a series cannot overtake
+    each other; RemoteWriteEndpoint gets concurrency from shards instead.
+
+    Unsent batches are coalesced: everything pending is merged and re-split
+    into as few requests as MAX_REQUEST_BYTES allows. While the endpoint
+    fails with a retryable error the sender backs off exponentially (with
+    jitter); permanent rejections (4xx other than 429) are dropped.
+
+    With a WAL, unsent payloads go to disk instead of the in-memory backlog.
+    While the WAL holds anything, fresh payloads are appended behind it so the
+    endpoint still sees samples in order, and the WAL is replayed oldest-first
+    at no more than WAL_REPLAY_BYTES_PER_S.
+
+    protocol selects the wire format (see REMOTE_WRITE_PROTOCOL). In "2.0" and
+    "auto" mode the sender drops back to 1.0 for good once the receiver answers
+    HTTP 415; "auto" also does so when a 2xx response lacks the
+    X-Prometheus-Remote-Write-Samples-Written header, i.e. the receiver
+    ignored the 2.0 fields. The affected request is resent as 1.0. WAL
+    payloads are always 1.0, so they can be replayed to any receiver.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        queue_size: int,
+        wal: SegmentWAL = None,
+        protocol: str = "1.0",
+        name: str = "",
+    ):
+        if protocol not in ("1.0", "2.0", "auto"):
+            raise ValueError(
+                f"unknown remote write protocol {protocol!r} (expected 1.0, 2.0 or auto)"
+            )
+        self.url = url
+        self.name = name
+        self._log = log.getChild(name) if name else log
+        self.protocol = "1.0" if protocol == "1.0" else "2.0"
+        self._confirm_v2 = protocol == "auto"
+        self._handoff = queue.Queue(maxsize=max(1, queue_size))
+        self._pending = deque()  # unsent batches, oldest first
+        self._pending_lock = threading.Lock()
+        self._backoff = _Backoff(RETRY_BACKOFF_MIN_S, RETRY_BACKOFF_MAX_S)
+        self._wal = wal
+        self._replay_bucket = _TokenBucket(WAL_REPLAY_BYTES_PER_S)
+        self._stop = threading.Event()
+        self._draining = threading.Event()  # send what is queued, then stop
+        self._thread = None
+
+        labels = {"endpoint": name or "default"}
+        self._m_push_seconds = METRICS.histogram("push_duration_seconds", **labels)
+        self._m_requests = {
+            outcome: METRICS.counter("push_requests_total", outcome=outcome, **labels)
+            for outcome in (_SENT, _REJECTED, _RETRY, _FALLBACK)
+        }
+        self._m_bytes = METRICS.counter("sent_bytes_total", **labels)
+        self._m_dropped = {
+            reason: METRICS.counter("dropped_samples_total", reason=reason, **labels)
+            for reason in ("send_queue", "retry_backlog", "rejected", "shutdown")
+        }
+        METRICS.gauge("queue_depth", fn=self._handoff.qsize, queue="send", **labels)
+        METRICS.gauge("retry_backlog_samples", fn=self._backlog_samples, **labels)
+        if wal is not None:
+            METRICS.gauge("wal_pending_bytes", fn=lambda: wal.pending_bytes, **labels)
+            METRICS.counter(
+                "wal_evicted_payloads_total", fn=lambda: wal.evicted_records, **labels
+            )
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run,
+            daemon=True,
+            name=f"remote_write_sender_{self.name}" if self.name else "remote_write_sender",
+        )
+        self._thread.start()
+        self._log.info(
+            "Started remote write sender for %s (remote write %s%s)%s",
+            self.url,
+            self.protocol,
+            ", confirmed by response headers" if self._confirm_v2 else "",
+            f" (WAL: {self._wal.directory})" if self._wal is not None else "",
+        )
+
+    def drain(self):
+        """Let the worker threads finish once everything queued has been sent."""
+        self._draining.set()
+
+    def stop(self, timeout: float = None):
+        """
+        Drain (see drain()) for at most timeout seconds, then stop. Batches
+        still unsent go to the WAL when there is one; otherwise they are lost
+        and counted as dropped_samples_total{reason="shutdown"}.
+        """
+        self._draining.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(0.5)  # a request may still be in flight
+            if self._thread.is_alive():
+                # it finds the WAL closed and stops; an unacked payload is resent next start
+                self._log.warning("Shutdown: a request was still in flight")
+
+        leftover = self._take_unsent()
+        if leftover:
+            if self._wal is not None:
+                encoder = WriteRequestEncoder()  # the worker may still hold its own
+                for _, _, payload in _encode_chunks(leftover, encoder, MAX_REQUEST_BYTES):
+                    self._wal.append(payload)
+                self._log.info("Shutdown: wrote %d unsent samples to the WAL", len(leftover))
+            else:
+                self._m_dropped["shutdown"].inc(len(leftover))
+                self._log.warning("Shutdown: %d samples could not be sent in time", len(leftover))
+        if self._wal is not None:
+            self._wal.close()
+
+    def _take_unsent(self) -> SampleBatch:
+        """Everything still in the send queue and the retry backlog, oldest first."""
+        merged = SampleBatch()
+        with self._pending_lock:
+            while self._pending:
+                merged.extend(self._pending.popleft())
+        while True:
+            try:
+                merged.extend(self._handoff.get_nowait())
+            except queue.Empty:
+                return merged
+
+    def _drained(self) -> bool:
+        if not self._handoff.empty():
+            return False
+        if self._wal is not None:
+            return True  # the WAL backlog stays on disk for the next start
+        with self._pending_lock:
+            return not self._pending
+
+    def submit(self, batch: SampleBatch):
+        """Hand a batch to the sender without blocking; drops the oldest when full."""
+        while True:
+            try:
+                self._handoff.put_nowait(batch)
+                return
+            except queue.Full:
                 try:
-                    item = proc_queue.get(timeout=remaining)
-                    current_items.append(item)
+                    dropped = self._handoff.get_nowait()
+                    self._m_dropped["send_queue"].inc(len(dropped))
+                    count_drop("send")
+                    self._log.warning(
+                        "Send queue full (%d batches); dropping oldest unsent batch",
+                        self._handoff.maxsize,
+                    )
                 except queue.Empty:
-                    continue
+                    pass
 
-            # ---- normalize (flatten) what processor gave us ----
-            normalized_records = []
-            for item in current_items:
-                if isinstance(item, dict):
-                    normalized_records.append(item)
-                elif isinstance(item, (list, tuple)):
-                    for sub in item:
-                        if isinstance(sub, dict):
-                            normalized_records.append(sub)
-                        else:
-                            log.warning(
-                                "processor emitted non-dict inside list: %r", sub
-                            )
-                else:
-                    log.warning("processor emitted non-dict: %r", item)
+    def _backlog_samples(self) -> int:
+        with self._pending_lock:
+            return sum(len(batch) for batch in self._pending)
+
+    def _post(self, session, payload, protocol: str = "1.0", merged: int = 0) -> str:
+        """POST one payload; returns _SENT, _REJECTED (dropped), _RETRY or _FALLBACK."""
+        outcome = self._post_once(session, payload, protocol, merged)
+        self._m_requests[outcome].inc()
+        if outcome == _SENT:
+            self._m_bytes.inc(len(payload))
+        return outcome
+
+    def _post_once(self, session, payload, protocol: str, merged: int) -> str:
+        t0 = time.monotonic()
+        try:
+            resp = post_payload(session, payload, self.url, protocol, merged)
+        except Exception as e:
+            elapsed = time.monotonic() - t0
+            PUSH_STATS.record_push(elapsed)
+            self._m_push_seconds.observe(elapsed)
+            response = getattr(e, "response", None)
+            if protocol == "2.0" and response is not None and response.status_code == 415:
+                return self._fall_back("receiver answered HTTP 415")
+            if not _is_retryable(e):
+                self._log.error("Push rejected permanently (%s); dropping request", e)
+                return _REJECTED
+            delay = self._backoff.failed(_retry_after_s(e))
+            self._log.error(
+                "Push failed (%s); retry #%d in %.1fs",
+                e,
+                self._backoff.failures,
+                delay,
+            )
+            return _RETRY
+        elapsed = time.monotonic() - t0
+        PUSH_STATS.record_push(elapsed)
+        self._m_push_seconds.observe(elapsed)
+        self._backoff.succeeded()
+        if protocol == "2.0" and self._confirm_v2:
+            if _SAMPLES_WRITTEN_HEADER not in resp.headers:
+                return self._fall_back(f"response had no {_SAMPLES_WRITTEN_HEADER} header")
+            self._confirm_v2 = False
+        return _SENT
+
+    def _fall_back(self, reason: str) -> str:
+        if self.protocol != "1.0":
+            self.protocol = "1.0"
+            self._log.warning(
+                "Remote write 2.0 not supported by %s (%s); using 1.0", self.url, reason
+            )
+        return _FALLBACK
 
-            # start with old retry batches
-            batches_to_try = []
-            while retry_batches:
-                batches_to_try.append(retry_batches.popleft())
+    def _run(self):
+        session = requests.Session()
+        encoders = {"1.0": WriteRequestEncoder(), "2.0": WriteRequestV2Encoder()}
 
-            # and add the fresh one
-            if normalized_records:
-                batches_to_try.append(normalized_records)
+        while not self._stop.is_set():
+            if self._draining.is_set() and self._drained():
+                return
+            wait_s = min(1.0, self._backoff.wait_s() or 1.0)
+            if self._draining.is_set():
+                wait_s = min(wait_s, 0.05)
+            try:
+                fresh = self._handoff.get(timeout=wait_s)
+            except queue.Empty:
+                fresh = None
 
-            if not batches_to_try:
+            if self._wal is not None:
+                self._send_via_wal(session, encoders, fresh)
                 continue
 
-            # ---- push batches ----
-            for batch in batches_to_try:
-                if not batch:
+            with self._pending_lock:
+                if fresh:
+                    self._pending.append(fresh)
+                    self._trim_backlog()
+                if not self._pending or not self._backoff.ready():
                     continue
-                req = build_write_request(batch)
-                try:
-                    resp = push_write_request(session, req)
-                    log.info(
-                        "Pushed batch with %d time series (HTTP %s)",
-                        len(req.timeseries),
-                        resp.status_code,
+                # coalesce everything pending into one batch
+                coalesced = len(self._pending)
+                merged = self._pending.popleft()
+                while self._pending:
+                    merged.extend(self._pending.popleft())
+
+            self._send_batch(session, encoders[self.protocol], merged, coalesced)
+
+    def _trim_backlog(self):
+        """
+        Drop the oldest pending samples beyond MAX_RETRY_SAMPLES. The backlog
+        is merged into one batch on every attempt, so the budget is per sample,
+        not per batch. Call with _pending_lock held.
+        """
+        excess = sum(len(batch) for batch in self._pending) - MAX_RETRY_SAMPLES
+        if excess <= 0:
+            return
+        self._m_dropped["retry_backlog"].inc(excess)
+        self._log.warning(
+            "Retry backlog over MAX_RETRY_SAMPLES (%d); dropping %d oldest samples",
+            MAX_RETRY_SAMPLES,
+            excess,
+        )
+        while excess > 0:
+            oldest = self._pending[0]
+            if len(oldest) <= excess:
+                self._pending.popleft()
+                excess -= len(oldest)
+            else:
+                self._pending[0] = oldest.slice(excess, len(oldest))
+                excess = 0
+
+    def _send_batch(self, session, encoder, batch: SampleBatch, coalesced: int):
+        outcomes = {_SENT: 0, _REJECTED: 0}
+        for start, stop, payload in _encode_chunks(batch, encoder, MAX_REQUEST_BYTES):
+            outcome = self._post(session, payload, encoder.protocol)
+            if outcome == _REJECTED:
+                self._m_dropped["rejected"].inc(stop - start)
+            if outcome in (_RETRY, _FALLBACK):
+                # keep this chunk and everything after it, ahead of newer batches
+                with self._pending_lock:
+                    self._pending.appendleft(batch.slice(start, len(batch)))
+                    self._trim_backlog()
+                return
+            outcomes[outcome] += 1
+        self._log.info(
+            "Pushed %d samples in %d request(s)%s%s",
+            len(batch),
+            outcomes[_SENT],
+            f" ({coalesced} batches coalesced)" if coalesced > 1 else "",
+            f", {outcomes[_REJECTED]} rejected" if outcomes[_REJECTED] else "",
+        )
+
+    # ---- WAL mode ----
+
+    def _send_via_wal(self, session, encoders, fresh):
+        wal = self._wal
+        if fresh:
+            v1 = encoders["1.0"]
+            encoder = encoders[self.protocol]
+            if len(wal) or not self._backoff.ready():
+                encoder = v1  # straight to the WAL, which only holds 1.0 payloads
+            for start, stop, payload in _encode_chunks(fresh, encoder, MAX_REQUEST_BYTES):
+                if len(wal) or not self._backoff.ready():
+                    outcome = _RETRY
+                else:
+                    outcome = self._post(session, payload, encoder.protocol)
+                if outcome == _SENT:
+                    self._log.info(
+                        "Pushed batch with %d samples, %d bytes", stop - start, len(payload)
                     )
-                except Exception as e:
-                    log.error("Push failed: %s", e)
-                    retry_batches.append(batch)
-                    while len(retry_batches) > MAX_RETRY_BATCHES:
-                        _ = retry_batches.popleft()
-                        log.warning(
-                            "Dropping oldest retry batch due to MAX_RETRY_BATCHES"
-                        )
+                elif outcome == _REJECTED:
+                    self._m_dropped["rejected"].inc(stop - start)
+                    continue
+                elif encoder is v1:
+                    wal.append(payload)
+                else:
+                    part = fresh.slice(start, stop)
+                    for _, _, v1_payload in _encode_chunks(part, v1, MAX_REQUEST_BYTES):
+                        wal.append(v1_payload)
+        self._replay_wal(session)
+
+    def _replay_wal(self, session):
+        wal = self._wal
+        if not len(wal) or not self._backoff.ready():
+            return
+        replayed = 0
+        while len(wal) and self._backoff.ready() and not self._stop.is_set():
+            # coalesce consecutive WAL payloads: concatenated WriteRequests
+            # decode as one WriteRequest holding all their series
+            parts = []
+            size = 0
+            for payload in wal.peek_many(MAX_REQUEST_BYTES):
+                raw = snappy.decompress(payload)
+                if parts and size + len(raw) > MAX_REQUEST_BYTES:
+                    break
+                parts.append((payload, raw))
+                size += len(raw)
+            if len(parts) == 1:
+                payload, count = parts[0][0], 0
+            else:
+                payload = snappy.compress(b"".join(raw for _, raw in parts))
+                count = len(parts)
+            if not self._replay_bucket.take(len(payload)):
+                break
+            if self._post(session, payload, merged=count) == _RETRY:
+                break
+            wal.ack(len(parts))
+            replayed += len(parts)
+        if replayed:
+            self._log.info(
+                "Replayed %d payloads from WAL (%d pending, %d bytes)",
+                replayed,
+                len(wal),
+                wal.pending_bytes,
+            )
+
+
+class RemoteWriteEndpoint:
+    """
+    One remote-write target, in the style of Prometheus' queue manager.
+
+    Batches are relabelled/filtered for this endpoint, then split over
+    `shards` independent RemoteWriteSenders by series id, so every series
+    always goes through the same shard and its samples stay in order. Each
+    shard keeps at most one request in flight, so shards are also how an
+    endpoint sends several requests concurrently. Each
+    shard has its own bounded queue, retry backlog, backoff and (optionally)
+    WAL, and endpoints share nothing: a slow endpoint only backs up itself.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        shards: int = REMOTE_WRITE_SHARDS,
+        queue_size: int = SEND_QUEUE_SIZE,
+        protocol: str = REMOTE_WRITE_PROTOCOL,
+        relabel_configs=None,
+        wal_dir: str = "",
+    ):
+        self.name = name
+        self.url = url
+        rules = parse_rules(relabel_configs)
+        self._relabeler = SeriesRelabeler(rules) if rules else None
+        self.senders = []
+        shards = max(1, shards)
+        for n in range(shards):
+            wal = None
+            if wal_dir:
+                shard_dir = wal_dir if shards == 1 else os.path.join(wal_dir, f"shard{n}")
+                wal = SegmentWAL(shard_dir, WAL_SEGMENT_BYTES, WAL_MAX_BYTES)
+            self.senders.append(
+                RemoteWriteSender(
+                    url,
+                    queue_size,
+                    wal,
+                    protocol=protocol,
+                    name=name if shards == 1 else f"{name or 'default'}/{n}",
+                )
+            )
+
+    def start(self):
+        for sender in self.senders:
+            sender.start()
+
+    def drain(self):
+        for sender in self.senders:
+            sender.drain()
+
+    def stop(self, timeout: float = None):
+        """Drain all shards for at most timeout seconds in total, then stop them."""
+        self.drain()
+        end = None if timeout is None else time.monotonic() + timeout
+        for sender in self.senders:
+            sender.stop(None if end is None else max(0.0, end - time.monotonic()))
+
+    def submit(self, batch: SampleBatch):
+        """Relabel and shard batch; the caller's batch is never modified."""
+        if self._relabeler is not None:
+            batch = self._relabeler.apply(batch)
+        else:
+            batch = batch.slice(0, len(batch))  # senders merge batches in place
+        if not batch:
+            return
+        if len(self.senders) == 1:
+            self.senders[0].submit(batch)
+            return
+
+        shards = [SampleBatch() for _ in self.senders]
+        n = len(shards)
+        for sid, value, ts_ms in zip(batch.series_ids, batch.values, batch.timestamps):
+            shards[sid % n].append(sid, value, ts_ms)
+        for sender, part in zip(self.senders, shards):
+            if part:
+                sender.submit(part)
+
+
+def _load_endpoints():
+    """
+    Endpoints from REMOTE_WRITE_ENDPOINTS, or just REMOTE_WRITE_URL.
+
+    REMOTE_WRITE_ENDPOINTS is either comma-separated URLs or a JSON list whose
+    entries are URLs or objects:
+
+        {"name": "central", "url": "...", "shards": 2, "queue_size": 8,
+         "protocol": "2.0", "write_relabel_configs": [...]}
+
+    Only "url" is required; "shards" defaults to REMOTE_WRITE_SHARDS, and the
+    old "max_in_flight" key is read as "shards". With WAL_DIR set, each
+    endpoint keeps its WAL in WAL_DIR/<name> (plus /shard<n> with several
+    shards); a lone REMOTE_WRITE_URL keeps using WAL_DIR itself.
+    """
+    if "MAX_IN_FLIGHT_REQUESTS" in os.environ and "REMOTE_WRITE_SHARDS" not in os.environ:
+        log.warning(
+            "MAX_IN_FLIGHT_REQUESTS is deprecated; using it as REMOTE_WRITE_SHARDS=%d "
+            "(one request in flight per shard keeps each series in order)",
+            REMOTE_WRITE_SHARDS,
+        )
+    if not REMOTE_WRITE_ENDPOINTS:
+        return [RemoteWriteEndpoint("", REMOTE_WRITE_URL, wal_dir=WAL_DIR)]
+
+    if REMOTE_WRITE_ENDPOINTS.startswith("["):
+        configs = json.loads(REMOTE_WRITE_ENDPOINTS)
+    else:
+        configs = [url.strip() for url in REMOTE_WRITE_ENDPOINTS.split(",") if url.strip()]
+
+    endpoints = []
+    for n, config in enumerate(configs):
+        if isinstance(config, str):
+            config = {"url": config}
+        if not isinstance(config, dict) or not config.get("url"):
+            raise ValueError(f"REMOTE_WRITE_ENDPOINTS entry {n} needs a url: {config!r}")
+        name = str(config.get("name") or f"endpoint{n}")
+        if any(ep.name == name for ep in endpoints):
+            raise ValueError(f"REMOTE_WRITE_ENDPOINTS: duplicate endpoint name {name!r}")
+        endpoints.append(
+            RemoteWriteEndpoint(
+                name,
+                config["url"],
+                shards=int(config.get("shards", config.get("max_in_flight", REMOTE_WRITE_SHARDS))),
+                queue_size=int(config.get("queue_size", SEND_QUEUE_SIZE)),
+                protocol=str(config.get("protocol", REMOTE_WRITE_PROTOCOL)).lower(),
+                relabel_configs=config.get("write_relabel_configs"),
+                wal_dir=os.path.join(WAL_DIR, name) if WAL_DIR else "",
+            )
+        )
+    return endpoints
+
+
+class Pipeline:
+    """
+    Collector and processor half of the client: per collector a raw queue
+    and supervised get_power/process_data workers, and the processed queue
+    they all feed.
+
+    stop_event stops the batching loop and the supervisor. The workers get
+    their own stop events, so a shutdown can stop collecting first and still
+    let process_data work through what is already queued (drain()).
+    """
+
+    def __init__(self, collectors, scrape_interval_s: float):
+        self.collectors = collectors
+        self.proc_queue = BatchQueue(PROC_QUEUE_SIZE, PROC_QUEUE_POLICY, "proc", QUEUE_BLOCK_TIMEOUT_S)
+        self.stop_event = threading.Event()
+        self.collect_stop = threading.Event()
+        self.process_stop = threading.Event()
+        METRICS.gauge("queue_depth", fn=self.proc_queue.qsize, queue="proc")
+        if COLLECTOR_MODE not in ("thread", "process"):
+            raise ValueError(f"unknown COLLECTOR_MODE {COLLECTOR_MODE!r} (expected thread or process)")
+
+        self.supervisor = WorkerSupervisor(
+            self.stop_event,
+            max_restarts=WORKER_MAX_RESTARTS,
+            restart_window_s=WORKER_RESTART_WINDOW_S,
+            backoff_min_s=WORKER_RESTART_BACKOFF_MIN_S,
+            backoff_max_s=WORKER_RESTART_BACKOFF_MAX_S,
+        )
+        # (raw queue, get_power worker, process_data worker) per collector;
+        # a single collector keeps the plain names
+        self.stages = []
+        single = len(collectors) == 1
+        for c in collectors:
+            suffix = "" if single else f"[{c.name}]"
+            raw_queue = BatchQueue(RAW_QUEUE_SIZE, RAW_QUEUE_POLICY, "raw" + suffix, QUEUE_BLOCK_TIMEOUT_S)
+            METRICS.gauge("queue_depth", fn=raw_queue.qsize, queue="raw" + suffix)
+            collector = partial(run_collector, c.name, c.get_power)
+            if COLLECTOR_MODE == "process":
+                collector = ProcessCollector(
+                    COLLECTOR_RING_SLOTS,
+                    COLLECTOR_RING_SLOT_BYTES,
+                    COLLECTOR_DRAIN_INTERVAL_S,
+                    LOG_LEVEL,
+                    target=collector,
+                )
+            interval = scrape_interval_s if c.scrape_interval_s is None else c.scrape_interval_s
+            self.supervisor.add(
+                "get_power" + suffix, collector, (raw_queue, interval, self.collect_stop)
+            )
+            self.supervisor.add(
+                "process_data" + suffix,
+                c.process_data,
+                (raw_queue, self.proc_queue, self.process_stop),
+            )
+            self.stages.append((raw_queue, "get_power" + suffix, "process_data" + suffix))
+
+    def start(self):
+        self.supervisor.start()
+        log.info(
+            "Started get_power (%s) and process_data for %s",
+            COLLECTOR_MODE,
+            ", ".join(c.name for c in self.collectors),
+        )
+
+    def drain(self, deadline: float):
+        """
+        Stop collecting, then let process_data empty the raw queues into the
+        processed queue, giving up at deadline (time.monotonic()).
+        """
+        self.stop_event.set()  # no restarts from here on
+        self.collect_stop.set()
+        for _, collector, _ in self.stages:
+            self.supervisor.join(collector, deadline - time.monotonic())
+        for raw_queue, _, processor in self.stages:
+            while raw_queue.qsize() and time.monotonic() < deadline:
+                if not self.supervisor.is_alive(processor):
+                    break
+                time.sleep(0.02)
+        self.process_stop.set()
+        for _, _, processor in self.stages:
+            self.supervisor.join(processor, deadline - time.monotonic())
+        left = sum(raw_queue.qsize() for raw_queue, _, _ in self.stages)
+        if left:
+            log.warning("Shutdown: %d raw records were not processed in time", left)
+
+
+def start_pipeline(collectors, scrape_interval_s: float) -> Pipeline:
+    """
+    Start the supervised collector + processor threads. A crashed worker is
+    restarted on the same queues, so nothing already queued or batched is lost.
+    """
+    pipeline = Pipeline(collectors, scrape_interval_s)
+    pipeline.start()
+    return pipeline
+
+
+def _merge_item(batch: SampleBatch, item):
+    """Flatten whatever process_data emitted into the columnar batch."""
+    if isinstance(item, SampleBatch):
+        batch.extend(item)
+    elif isinstance(item, dict):
+        _append_records(batch, (item,))
+    elif isinstance(item, (list, tuple)):
+        for sub in item:
+            if isinstance(sub, SampleBatch):
+                batch.extend(sub)
+            elif isinstance(sub, dict):
+                _append_records(batch, (sub,))
+            else:
+                log.warning("processor emitted non-dict inside list: %r", sub)
+    else:
+        log.warning("processor emitted non-dict: %r", item)
+
+
+def _batch_full(batch: SampleBatch):
+    """Name of the size trigger that fired, or None."""
+    if MAX_BATCH_SAMPLES and len(batch) >= MAX_BATCH_SAMPLES:
+        return "samples"
+    if MAX_BATCH_BYTES and len(batch) * PUSH_STATS.bytes_per_sample >= MAX_BATCH_BYTES:
+        return "bytes"
+    return None
+
+
+def _wake_threshold(batch: SampleBatch, proc_queue: BatchQueue) -> int:
+    """
+    Queued items worth waking up for: about what fills the batch up to the
+    first size trigger, and never more than 3/4 of the queue, so producers
+    are not refused while the loop sleeps.
+    """
+    limit = max(1, proc_queue.maxsize * 3 // 4)
+    room = []
+    if MAX_BATCH_SAMPLES:
+        room.append(MAX_BATCH_SAMPLES - len(batch))
+    if MAX_BATCH_BYTES:
+        room.append(MAX_BATCH_BYTES / PUSH_STATS.bytes_per_sample - len(batch))
+    if not room:
+        return limit
+    if PUSH_STATS.samples_per_item <= 0:
+        return 1  # nothing to estimate from yet
+    items = int(min(room) / PUSH_STATS.samples_per_item) + 1
+    return max(1, min(limit, items))
+
+
+def _adapt_interval(interval_s: float) -> float:
+    """
+    Adaptive PUSH_INTERVAL: aim for ADAPTIVE_TARGET_BYTES per push at the
+    observed sample rate, but never push more often than about four times
+    the observed push latency.
+    """
+    stats = PUSH_STATS
+    if not stats.pushes or stats.samples_per_s <= 0:
+        return interval_s
+    bytes_per_s = stats.samples_per_s * stats.bytes_per_sample
+    target_s = max(ADAPTIVE_TARGET_BYTES / bytes_per_s, 4.0 * stats.latency_s)
+    # move at most 2x per window so one odd push can't swing the interval
+    target_s = min(interval_s * 2.0, max(interval_s * 0.5, target_s))
+    new_s = min(PUSH_INTERVAL_MAX_S, max(PUSH_INTERVAL_MIN_S, target_s))
+    if abs(new_s - interval_s) > 0.1 * interval_s:
+        log.info(
+            "Adaptive push interval %.2fs -> %.2fs (%.0f samples/s, %.1f B/sample, latency %.3fs)",
+            interval_s,
+            new_s,
+            stats.samples_per_s,
+            stats.bytes_per_sample,
+            stats.latency_s,
+        )
+    return new_s
+
+
+_TERMINATE = threading.Event()  # set on SIGTERM; the batching loop stops and flushes
+
+
+def _on_sigterm(signum, frame, wake: BatchQueue = None):
+    """
+    Ask the batching loop to stop. Nothing is raised: the loop notices at its
+    next step, so a window being merged or shipped is never cut in half.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)  # one graceful shutdown is enough
+    _TERMINATE.set()
+    if wake is not None:
+        # from another thread: the interrupted main thread may hold the queue's lock
+        threading.Thread(target=wake.interrupt, daemon=True).start()
+
+
+def _ship(batch: SampleBatch, endpoints, latest, collected_samples, final: bool = False):
+    """
+    End of a push window: integrate energy (ENERGY_INTEGRATION), downsample
+    (DOWNSAMPLE_WINDOW_S), drop unchanged samples (DEDUP), add energy counters
+    and self-metrics and hand the batch to every endpoint.
+    final closes open downsampling windows.
+    """
+    collected_samples.inc(len(batch))
+    energy = ENERGY.process(batch) if ENERGY is not None else None
+    if DOWNSAMPLER is not None and endpoints:
+        batch = DOWNSAMPLER.process(batch, now_ms(), final)
+    if CHANGE_FILTER is not None and endpoints:
+        batch = CHANGE_FILTER.process(batch)
+    extra_from = len(batch)
+    if energy:
+        batch.extend(energy)
+    if SELF_METRICS:
+        METRICS.collect(batch, now_ms())
+    if latest is not None and len(batch) > extra_from:
+        latest.update(batch, extra_from)
+    # never blocks on the network
+    if batch:
+        for endpoint in endpoints:
+            endpoint.submit(batch)
+
+
+def _shutdown(pipeline: Pipeline, batch: SampleBatch, endpoints, latest, capture, collected_samples):
+    """
+    Final flush within SHUTDOWN_TIMEOUT_S: stop the collector, let process_data
+    work through the raw queue (up to half the budget), push what is left in the
+    processed queue together with the unfinished window, then give the senders
+    the rest of the budget to deliver it (or write it to the WAL).
+    """
+    t0 = time.monotonic()
+    deadline = t0 + SHUTDOWN_TIMEOUT_S
+    log.info("Shutting down: final flush within %.1fs", SHUTDOWN_TIMEOUT_S)
+    pipeline.drain(t0 + SHUTDOWN_TIMEOUT_S / 2)
+
+    merged_from = len(batch)
+    for item in pipeline.proc_queue.drain_all(timeout=0):
+        _merge_item(batch, item)
+    if latest is not None:
+        latest.update(batch, merged_from)
+    if capture is not None:
+        capture.write(batch, merged_from)
+        capture.close()
+    _ship(batch, endpoints, latest, collected_samples, final=True)
+    if ENERGY is not None:
+        ENERGY.save()
+
+    for endpoint in endpoints:
+        endpoint.drain()  # all endpoints flush in parallel
+    for endpoint in endpoints:
+        endpoint.stop(timeout=max(0.0, deadline - time.monotonic()))
+    log.info("Shutdown complete in %.1fs", time.monotonic() - t0)
+
+
+def main():
+    # collector interval
+    scrape_interval_s = float(os.getenv("SCRAPE_INTERVAL_S", "0.1"))
+    collectors = load_collectors(COLLECTORS)
+    if not METRICS.source:
+        METRICS.source = collectors[0].service_label
+    collected_samples = METRICS.counter("collected_samples_total")
+    if OUTPUT_MODE not in ("push", "pull", "both"):
+        raise ValueError(f"unknown OUTPUT_MODE {OUTPUT_MODE!r} (expected push, pull or both)")
+    _setup_stages()
+    signal.signal(signal.SIGTERM, _on_sigterm)
+
+    latest = None
+    metrics_server = None
+    if OUTPUT_MODE != "push":
+        latest = LatestValueStore()
+        METRICS.gauge("exposed_series", fn=latest.__len__)
+        metrics_server = MetricsEndpoint(latest, METRICS_PORT, timestamps=METRICS_TIMESTAMPS)
+        metrics_server.start()
+        log.info("Serving OpenMetrics on :%d/metrics", metrics_server.port)
+
+    capture = None
+    if CAPTURE_DIR:
+        capture = CaptureSink(CAPTURE_DIR, CAPTURE_SEGMENT_BYTES, CAPTURE_MAX_BYTES)
+        capture.install_signals()
+        if CAPTURE_SOCKET:
+            capture.serve(CAPTURE_SOCKET)
+
+    pipeline = start_pipeline(collectors, scrape_interval_s)
+    proc_queue = pipeline.proc_queue
+    if not _TERMINATE.is_set():
+        # from here on SIGTERM also cuts short the wait for the next records
+        signal.signal(signal.SIGTERM, partial(_on_sigterm, wake=proc_queue))
+
+    endpoints = _load_endpoints() if OUTPUT_MODE != "pull" else []
+    for endpoint in endpoints:
+        endpoint.start()
+
+    push_interval_s = PUSH_INTERVAL_S
+    log.info(
+        "Remote write loop started: push every %ss%s, or at %s samples / ~%s bytes",
+        push_interval_s,
+        " (adaptive)" if PUSH_INTERVAL_ADAPTIVE else "",
+        MAX_BATCH_SAMPLES or "unlimited",
+        MAX_BATCH_BYTES or "unlimited",
+    )
+
+    batch = SampleBatch()
+    try:
+        # run until we're told to stop (or the supervisor gives up on a worker)
+        while not pipeline.stop_event.is_set() and not _TERMINATE.is_set():
+            # ---- collect records until next push (or the batch is full) ----
+            window_start = time.time()
+            deadline = window_start + push_interval_s
+
+            while not _TERMINATE.is_set():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                if latest is not None:
+                    remaining = min(remaining, PULL_REFRESH_S)  # keep /metrics fresh
+                # one wake-up per window, unless the batch is about to fill up
+                items = proc_queue.drain_all(
+                    timeout=remaining, min_items=_wake_threshold(batch, proc_queue)
+                )
+                if not items:
+                    continue
+                merged_from = len(batch)
+                for item in items:
+                    _merge_item(batch, item)
+                PUSH_STATS.record_drain(len(items), len(batch) - merged_from)
+                if latest is not None:
+                    latest.update(batch, merged_from)
+                if capture is not None:
+                    capture.write(batch, merged_from)
+                trigger = _batch_full(batch)
+                if trigger:
+                    log.debug("Flushing early on %s trigger (%d samples)", trigger, len(batch))
+                    break
+
+            if _TERMINATE.is_set():
+                break  # _shutdown ships the unfinished window
+            PUSH_STATS.record_window(len(batch), time.time() - window_start)
+            window, batch = batch, SampleBatch()
+            _ship(window, endpoints, latest, collected_samples)
+
+            if PUSH_INTERVAL_ADAPTIVE:
+                push_interval_s = _adapt_interval(push_interval_s)
 
     except KeyboardInterrupt:
-        log.info("Shutting down ...")
-        stop_event.set()
+        pass
+    finally:
+        _shutdown(pipeline, batch, endpoints, latest, capture, collected_samples)
+        if metrics_server is not None:
+            metrics_server.stop()
+
+    if pipeline.supervisor.failed.is_set():
+        # crash loop: exit non-zero and leave it to the container restart policy
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,166 @@
+# base-monitoring-client/sample_batch.py
+"""
+Columnar sample batches for the remote-write pipeline.
+
+Instead of one {"metric", "labels", "value", "timestamp_ms"} dict per sample,
+a series is registered once in SERIES and referenced by an integer id, and
+samples are appended to flat array buffers:
+
+    sid = sample_batch.series_id("my_metric", {"source": "foo"})
+    batch = sample_batch.SampleBatch()
+    batch.append(sid, 123.4, 1731080000000)
+    output_queue.put(batch)
+
+The old dict records are still accepted by the pusher (see append_record).
+"""
+import threading
+from array import array
+
+
+class SeriesTable:
+    """
+    Interns label sets and hands out stable integer series ids.
+
+    Series registered explicitly (series_id()) are pinned for the lifetime of
+    the process. Series interned on the legacy dict path are transient: the
+    pusher may release() them once idle, which tombstones the id.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}  # label key -> series id
+        self._keys = []  # series id -> label key (None once released)
+        self._transient = set()
+
+    @staticmethod
+    def make_key(metric, labels=None):
+        """Label tuple as sent on the wire: __name__ first, then sorted labels."""
+        items = [("__name__", str(metric))]
+        if labels:
+            items += sorted((str(k), str(v)) for k, v in labels.items())
+        return tuple(items)
+
+    def register(self, metric, labels=None, pinned: bool = True) -> int:
+        key = self.make_key(metric, labels)
+        sid = self._ids.get(key)
+        if sid is not None and (not pinned or sid not in self._transient):
+            return sid
+        with self._lock:
+            sid = self._ids.get(key)
+            if sid is None:
+                sid = len(self._keys)
+                self._keys.append(key)
+                self._ids[key] = sid
+                if not pinned:
+                    self._transient.add(sid)
+            elif pinned:
+                self._transient.discard(sid)
+        return sid
+
+    def release(self, sid: int) -> bool:
+        """Forget a transient series; pinned series are kept."""
+        with self._lock:
+            if sid not in self._transient:
+                return False
+            self._transient.discard(sid)
+            key = self._keys[sid]
+            self._keys[sid] = None
+            if self._ids.get(key) == sid:
+                del self._ids[key]
+        return True
+
+    def key(self, sid: int):
+        return self._keys[sid]
+
+    def __len__(self):
+        return len(self._ids)
+
+
+# process-wide table shared by monitor_impl and the pusher
+SERIES = SeriesTable()
+
+
+def series_id(metric, labels=None) -> int:
+    """Register (or look up) a series in the shared table and return its id."""
+    return SERIES.register(metric, labels)
+
+
+class SampleBatch:
+    """
+    Samples as three parallel arrays: series id, value, timestamp (ms).
+
+    Collectors with sub-millisecond timing use append_ns(); the batch then
+    also keeps timestamps_ns (for the capture sink and the energy
+    integrator), while remote write keeps using the millisecond timestamps.
+    """
+
+    __slots__ = ("series_ids", "values", "timestamps", "timestamps_ns")
+
+    def __init__(self):
+        self.series_ids = array("I")
+        self.values = array("d")
+        self.timestamps = array("q")
+        self.timestamps_ns = None  # only once a sample came with ns precision
+
+    def append(self, sid: int, value: float, timestamp_ms: int):
+        self.series_ids.append(sid)
+        self.values.append(value)
+        self.timestamps.append(timestamp_ms)
+        if self.timestamps_ns is not None:
+            self.timestamps_ns.append(timestamp_ms * 1_000_000)
+
+    def append_ns(self, sid: int, value: float, timestamp_ns: int):
+        if self.timestamps_ns is None:
+            self._fill_ns()
+        self.series_ids.append(sid)
+        self.values.append(value)
+        self.timestamps.append(timestamp_ns // 1_000_000)
+        self.timestamps_ns.append(timestamp_ns)
+
+    def _fill_ns(self):
+        self.timestamps_ns = array("q", (ts * 1_000_000 for ts in self.timestamps))
+
+    def extend(self, other: "SampleBatch"):
+        if other.timestamps_ns is not None or self.timestamps_ns is not None:
+            if self.timestamps_ns is None:
+                self._fill_ns()
+            if other.timestamps_ns is not None:
+                self.timestamps_ns.extend(other.timestamps_ns)
+            else:
+                self.timestamps_ns.extend(ts * 1_000_000 for ts in other.timestamps)
+        self.series_ids.extend(other.series_ids)
+        self.values.extend(other.values)
+        self.timestamps.extend(other.timestamps)
+
+    def append_record(self, rec: dict):
+        """
+        Append one legacy normalized record (compatibility path).
+        Raises KeyError/ValueError/TypeError on malformed records.
+        """
+        metric = rec["metric"]
+        labels = rec.get("labels", {})
+        ts_ms = int(rec["timestamp_ms"])
+        value = float(rec["value"])
+        self.append(SERIES.register(metric, labels, pinned=False), value, ts_ms)
+
+    def slice(self, start: int, stop: int) -> "SampleBatch":
+        """New batch holding samples [start:stop] (order preserved)."""
+        part = SampleBatch()
+        part.series_ids = self.series_ids[start:stop]
+        part.values = self.values[start:stop]
+        part.timestamps = self.timestamps[start:stop]
+        if self.timestamps_ns is not None:
+            part.timestamps_ns = self.timestamps_ns[start:stop]
+        return part
+
+    def clear(self):
+        del self.series_ids[:]
+        del self.values[:]
+        del self.timestamps[:]
+        self.timestamps_ns = None
+
+    def __len__(self):
+        return len(self.series_ids)
+
+    def __bool__(self):
+        return len(self.series_ids) > 0
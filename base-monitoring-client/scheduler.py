@@ -0,0 +1,125 @@
+# base-monitoring-client/scheduler.py
+"""
+Sampling loop timing shared by the collectors.
+
+Sleeping for `interval - elapsed` after each scrape drifts: every wake-up
+is a little late, and the error adds up. DeadlineScheduler instead ticks on
+absolute deadlines start + k * interval, on the shared clock (clock.py):
+
+    sched = DeadlineScheduler(scrape_interval_s, stop_event)
+    for tick in sched:              # ends once stop_event is set
+        data = scraper.get_power()
+        ...
+
+With align=True (SCHEDULE_ALIGN, default on) the grid starts at a multiple
+of the interval in epoch time, so collectors with the same interval, on
+one device or on several NTP-synced ones, sample at the same instants.
+
+A tick whose deadline has already passed by a whole interval or more was
+missed (a slow scrape, a stalled process). The policy (SCHEDULE_MISSED_TICKS)
+decides what happens then:
+
+* skip     - fire once now and continue with the next deadline on the grid;
+             the ticks in between are counted, not run (default);
+* catch_up - run every missed tick, back to back, until on time again.
+
+How late every tick fires is observed in the
+scheduler_lateness_seconds{collector=<name>} histogram, skipped ticks in
+scheduler_ticks_skipped_total{collector=<name>}. The name defaults to the
+collector running in the calling thread (self_metrics.current_collector()),
+so a get_power started by the pipeline does not have to pass it.
+"""
+import os
+from typing import NamedTuple
+
+from clock import CLOCK
+from self_metrics import METRICS, current_collector
+
+MISSED_POLICIES = ("skip", "catch_up")
+
+MISSED_TICKS = os.getenv("SCHEDULE_MISSED_TICKS", "skip").strip().lower()
+ALIGN = os.getenv("SCHEDULE_ALIGN", "true").strip().lower() in {"1", "true", "yes", "y", "on"}
+
+# lateness is normally well under a millisecond
+LATENESS_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1
+)
+
+
+class Tick(NamedTuple):
+    index: int  # deadlines since the start, skipped ones included
+    deadline_ns: int  # epoch ns on the shared clock
+    lateness_s: float  # how long after its deadline the tick fired
+    skipped: int  # missed ticks dropped right before this one
+
+    @property
+    def deadline_ms(self) -> int:
+        return self.deadline_ns // 1_000_000
+
+
+class DeadlineScheduler:
+    def __init__(
+        self,
+        interval_s: float,
+        stop_event,
+        missed: str = None,
+        align: bool = None,
+        name: str = None,
+        clock=CLOCK,
+    ):
+        missed = MISSED_TICKS if missed is None else missed
+        if missed not in MISSED_POLICIES:
+            raise ValueError(
+                f"unknown missed-tick policy {missed!r} "
+                f"(expected one of {', '.join(MISSED_POLICIES)})"
+            )
+        self.interval_ns = max(0, int(float(interval_s) * 1e9))
+        self.stop_event = stop_event
+        self.missed = missed
+        self.align = ALIGN if align is None else align
+        self.clock = clock
+        name = name or current_collector()
+        self._index = -1
+        self._next = None  # deadline of the next tick, epoch ns
+        self._m_lateness = METRICS.histogram(
+            "scheduler_lateness_seconds", buckets=LATENESS_BUCKETS, collector=name
+        )
+        self._m_skipped = METRICS.counter("scheduler_ticks_skipped_total", collector=name)
+
+    def _first_deadline(self, now: int) -> int:
+        if not self.align or not self.interval_ns:
+            return now
+        return -(-now // self.interval_ns) * self.interval_ns  # next multiple of the interval
+
+    def wait(self):
+        """Sleep until the next deadline; the Tick, or None once stop_event is set."""
+        if self._next is None:
+            self._next = self._first_deadline(self.clock.now_ns())
+        while True:
+            delay_ns = self._next - self.clock.now_ns()
+            if delay_ns <= 0:
+                break
+            if self.stop_event.wait(delay_ns / 1e9):
+                return None
+        if self.stop_event.is_set():
+            return None
+
+        now = self.clock.now_ns()
+        deadline = self._next
+        skipped = 0
+        if self.missed == "skip" and self.interval_ns and now - deadline >= self.interval_ns:
+            skipped = (now - deadline) // self.interval_ns
+            deadline += skipped * self.interval_ns
+            self._m_skipped.inc(skipped)
+        self._index += skipped + 1
+        self._next = deadline + self.interval_ns if self.interval_ns else now
+        lateness_s = (now - deadline) / 1e9
+        self._m_lateness.observe(lateness_s)
+        return Tick(self._index, deadline, lateness_s, skipped)
+
+    def __iter__(self):
+        while True:
+            tick = self.wait()
+            if tick is None:
+                return
+            yield tick
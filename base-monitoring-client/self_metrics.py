@@ -0,0 +1,247 @@
+# base-monitoring-client/self_metrics.py
+"""
+Self-instrumentation of the client pipeline.
+
+Counters, gauges and histograms live in one process-wide registry (METRICS)
+and are shipped with the normal remote-write traffic: every push window the
+pusher appends their current values to the outgoing SampleBatch as
+
+    <SELF_METRICS_PREFIX><name>{source="<SERVICE_LABEL>", ...labels}
+
+(prefix "monitoring_client_" by default; histograms as _bucket/_sum/_count
+like the Prometheus client libraries), so client overhead and data loss can
+be graphed next to the power data.
+
+Updating a metric is a lock and an add. Look metrics up once and keep them:
+
+    DROPS = self_metrics.METRICS.counter("queue_dropped_total", queue="raw")
+    ...
+    DROPS.inc()
+"""
+import os
+import threading
+from bisect import bisect_left
+
+from sample_batch import SERIES, SampleBatch
+
+# seconds; covers a sysfs read up to a slow HTTP push
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+
+
+def _format_le(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class Counter:
+    __slots__ = ("value", "_lock", "_fn")
+
+    def __init__(self, fn=None):
+        self.value = 0.0
+        self._lock = threading.Lock()
+        self._fn = fn  # read the value from fn() instead
+
+    def inc(self, n: float = 1.0):
+        with self._lock:
+            self.value += n
+
+    def get(self) -> float:
+        return float(self._fn()) if self._fn is not None else self.value
+
+
+class Gauge:
+    __slots__ = ("value", "_fn")
+
+    def __init__(self, fn=None):
+        self.value = 0.0
+        self._fn = fn  # read the value from fn() instead
+
+    def set(self, value: float):
+        self.value = value
+
+    def get(self) -> float:
+        return float(self._fn()) if self._fn is not None else self.value
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets)) + (float("inf"),)
+        self.counts = [0] * len(self.bounds)  # per bucket, not cumulative
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """(cumulative bucket counts, sum, count), read consistently."""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = []
+        running = 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+class MetricsRegistry:
+    """Get-or-create metrics by (name, labels) and export them as samples."""
+
+    def __init__(self, prefix: str, source: str = ""):
+        self.prefix = prefix
+        self.source = source
+        self._lock = threading.Lock()
+        self._metrics = {}  # (name, sorted labels) -> metric
+        self._sids = {}  # (metric key, suffix, extra labels) -> series id
+
+    def _get(self, cls, name: str, labels: dict, **kwargs):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls(**kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(
+                f"self metric {name} already registered as {type(metric).__name__}"
+            )
+        return metric
+
+    def counter(self, name: str, fn=None, **labels) -> Counter:
+        return self._get(Counter, name, labels, fn=fn)
+
+    def gauge(self, name: str, fn=None, **labels) -> Gauge:
+        return self._get(Gauge, name, labels, fn=fn)
+
+    def histogram(self, name: str, buckets=DEFAULT_BUCKETS, **labels) -> Histogram:
+        return self._get(Histogram, name, labels, buckets=buckets)
+
+    def _series(self, key, suffix="", extra=()):
+        sid_key = (key, suffix, extra)
+        sid = self._sids.get(sid_key)
+        if sid is None:
+            name, labels = key
+            labels = dict(labels)
+            labels.update(extra)
+            if self.source:
+                labels.setdefault("source", self.source)
+            sid = self._sids[sid_key] = SERIES.register(self.prefix + name + suffix, labels)
+        return sid
+
+    def state(self) -> dict:
+        """
+        Plain-data copy of the counters and histograms (callback metrics are
+        left out), for handing metrics from another process to merge().
+        """
+        with self._lock:
+            items = list(self._metrics.items())
+        out = {}
+        for key, metric in items:
+            if isinstance(metric, Histogram):
+                with metric._lock:
+                    out[key] = (list(metric.counts), metric.sum, metric.count, metric.bounds[:-1])
+            elif isinstance(metric, Counter) and metric._fn is None:
+                out[key] = metric.value
+        return out
+
+    def merge(self, delta: dict):
+        """Add a delta of two state() copies (see state_delta) into this registry."""
+        for (name, labels), value in delta.items():
+            labels = dict(labels)
+            if isinstance(value, tuple):
+                counts, total, count, buckets = value
+                hist = self.histogram(name, buckets=buckets, **labels)
+                with hist._lock:
+                    for i, n in enumerate(counts):
+                        hist.counts[i] += n
+                    hist.sum += total
+                    hist.count += count
+            else:
+                self.counter(name, **labels).inc(value)
+
+    def collect(self, batch: SampleBatch, ts_ms: int) -> int:
+        """Append the current value of every metric to batch; returns samples added."""
+        before = len(batch)
+        with self._lock:
+            items = list(self._metrics.items())
+        for key, metric in items:
+            try:
+                if isinstance(metric, Histogram):
+                    cumulative, total, count = metric.snapshot()
+                    for bound, n in zip(metric.bounds, cumulative):
+                        sid = self._series(key, "_bucket", (("le", _format_le(bound)),))
+                        batch.append(sid, float(n), ts_ms)
+                    batch.append(self._series(key, "_sum"), total, ts_ms)
+                    batch.append(self._series(key, "_count"), float(count), ts_ms)
+                else:
+                    batch.append(self._series(key), metric.get(), ts_ms)
+            except Exception:
+                # a failing callback must never break the push loop
+                continue
+        return len(batch) - before
+
+
+METRICS = MetricsRegistry(
+    os.getenv("SELF_METRICS_PREFIX", "monitoring_client_"),
+    os.getenv("SERVICE_LABEL", ""),
+)
+
+
+def state_delta(new: dict, old: dict) -> dict:
+    """What changed between two MetricsRegistry.state() copies (zero entries left out)."""
+    delta = {}
+    for key, value in new.items():
+        prev = old.get(key)
+        if isinstance(value, tuple):
+            counts, total, count, buckets = value
+            if prev is not None:
+                counts = [a - b for a, b in zip(counts, prev[0])]
+                total -= prev[1]
+                count -= prev[2]
+            if count:
+                delta[key] = (counts, total, count, buckets)
+        else:
+            value -= prev or 0.0
+            if value:
+                delta[key] = value
+    return delta
+
+
+_collector = threading.local()
+
+
+def set_collector(name: str):
+    """Name the collector that runs in the calling thread (see current_collector)."""
+    _collector.name = name
+
+
+def current_collector() -> str:
+    """
+    The collector label for scrape and scheduler metrics recorded in this
+    thread: the name the pipeline gave its get_power worker, "get_power"
+    outside of one.
+    """
+    return getattr(_collector, "name", "get_power")
+
+
+def observe_scrape(elapsed_s: float, interval_s: float, collector: str = None):
+    """Record one collector scrape; it missed its deadline if it overran the interval."""
+    collector = collector or current_collector()
+    METRICS.histogram("scrape_duration_seconds", collector=collector).observe(elapsed_s)
+    if interval_s > 0 and elapsed_s > interval_s:
+        METRICS.counter("scrape_deadline_missed_total", collector=collector).inc()
+
+
+def count_drop(queue_name: str, n: int = 1):
+    """Count items dropped because queue_name was full."""
+    METRICS.counter("queue_dropped_total", queue=queue_name).inc(n)
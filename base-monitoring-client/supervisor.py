@@ -0,0 +1,152 @@
+# base-monitoring-client/supervisor.py
+"""
+Restart crashed pipeline workers instead of tearing the pipeline down.
+
+Each worker runs in its own thread. When one dies (an exception, or its
+function returned while the pipeline is still running), the supervisor
+restarts it with the same arguments, so the queues it shares with the
+other stages, and everything the pusher has buffered, are kept:
+
+    sup = WorkerSupervisor(stop_event)
+    sup.add("get_power", monitor_impl.get_power, (raw_queue, 0.1, stop_event))
+    sup.start()
+
+Restarts back off exponentially (backoff_min_s ... backoff_max_s). A worker
+that ran for restart_window_s without dying starts again from the shortest
+delay. A worker that needs more than max_restarts restarts within
+restart_window_s is crash-looping: the supervisor gives up and sets `failed`
+and stop_event; stopping the other workers and exiting is left to the caller.
+Once stop_event is set, workers that end are no longer restarted.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from self_metrics import METRICS
+
+log = logging.getLogger("base-monitoring-client.supervisor")
+
+
+class _Worker:
+    def __init__(self, name: str, target, args):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.thread = None
+        self.started_at = 0.0
+        self.restart_at = None  # monotonic time of the scheduled restart
+        self.failures = 0  # consecutive short-lived runs, for the backoff
+        self.restarts = deque()  # monotonic times of recent restarts
+        self.m_restarts = METRICS.counter("worker_restarts_total", worker=name)
+        self.m_up = METRICS.gauge("worker_up", worker=name)
+
+
+class WorkerSupervisor:
+    def __init__(
+        self,
+        stop_event: threading.Event,
+        max_restarts: int = 5,
+        restart_window_s: float = 300.0,
+        backoff_min_s: float = 1.0,
+        backoff_max_s: float = 30.0,
+        poll_s: float = 0.2,
+    ):
+        self.stop_event = stop_event
+        self.max_restarts = max_restarts
+        self.restart_window_s = restart_window_s
+        self.backoff_min_s = backoff_min_s
+        self.backoff_max_s = backoff_max_s
+        self.poll_s = poll_s
+        self.failed = threading.Event()  # set once the supervisor gave up
+        self._workers = []
+        self._thread = None
+
+    def add(self, name: str, target, args=()):
+        self._workers.append(_Worker(name, target, tuple(args)))
+
+    def _worker(self, name: str) -> _Worker:
+        for worker in self._workers:
+            if worker.name == name:
+                return worker
+        raise KeyError(name)
+
+    def is_alive(self, name: str) -> bool:
+        thread = self._worker(name).thread
+        return thread is not None and thread.is_alive()
+
+    def join(self, name: str, timeout: float = None) -> bool:
+        """Wait for a worker's current thread to end; True if it did."""
+        thread = self._worker(name).thread
+        if thread is not None:
+            thread.join(None if timeout is None else max(0.0, timeout))
+        return not self.is_alive(name)
+
+    def start(self):
+        for worker in self._workers:
+            self._launch(worker)
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name="worker_supervisor"
+        )
+        self._thread.start()
+
+    def _launch(self, worker: _Worker):
+        def run():
+            try:
+                worker.target(*worker.args)
+            except Exception:
+                log.exception("Worker %s crashed", worker.name)
+            else:
+                if not self.stop_event.is_set():
+                    log.error("Worker %s returned while the pipeline was running", worker.name)
+            finally:
+                worker.m_up.set(0)
+
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+        worker.m_up.set(1)
+        worker.thread = threading.Thread(
+            target=run, daemon=True, name=f"{worker.name}_thread"
+        )
+        worker.thread.start()
+
+    def _run(self):
+        while not self.stop_event.wait(self.poll_s):
+            now = time.monotonic()
+            for worker in self._workers:
+                if worker.thread.is_alive():
+                    continue
+                if worker.restart_at is None:
+                    self._schedule(worker, now)
+                    if self.failed.is_set():
+                        return
+                elif now >= worker.restart_at:
+                    worker.restarts.append(now)
+                    worker.m_restarts.inc()
+                    log.warning(
+                        "Restarting worker %s (restart #%d)",
+                        worker.name,
+                        len(worker.restarts),
+                    )
+                    self._launch(worker)
+
+    def _schedule(self, worker: _Worker, now: float):
+        while worker.restarts and now - worker.restarts[0] > self.restart_window_s:
+            worker.restarts.popleft()
+        if len(worker.restarts) >= self.max_restarts:
+            log.error(
+                "Worker %s died %d times within %.0fs; giving up and stopping the pipeline",
+                worker.name,
+                len(worker.restarts) + 1,
+                self.restart_window_s,
+            )
+            self.failed.set()
+            self.stop_event.set()
+            return
+
+        if now - worker.started_at >= self.restart_window_s:
+            worker.failures = 0  # it had been healthy for a while
+        delay = min(self.backoff_max_s, self.backoff_min_s * (2 ** worker.failures))
+        worker.failures += 1
+        worker.restart_at = now + delay
+        log.warning("Worker %s died; restarting in %.1fs", worker.name, delay)
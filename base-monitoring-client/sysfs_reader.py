@@ -0,0 +1,70 @@
+# base-monitoring-client/sysfs_reader.py
+"""
+Integer sysfs attributes kept open and re-read in place.
+
+Reading a hwmon attribute the naive way (open, read, close, and the path
+f-string built each time) costs several syscalls per file and sample. A
+sysfs attribute is regenerated on every read at offset 0, so the board
+collectors open their files once and pread them:
+
+    rails = SysfsReader(["/sys/.../in1_input", "/sys/.../curr1_input"])
+    mv, ma = rails.read_all()    # one pread per file
+    rails.close()
+
+A file that fails to read (the driver was rebound, the device went away)
+is closed and opened again once, right away; if that fails too, the error
+propagates to the collector, as a failed open() did before, and the next
+read tries again.
+"""
+import os
+
+_READ_BYTES = 32  # an integer attribute is a few digits and a newline
+
+
+class SysfsReader:
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self._fds = [os.open(path, os.O_RDONLY) for path in self.paths]
+
+    def _reopen(self, i: int) -> int:
+        fd, self._fds[i] = self._fds[i], -1  # never close a reused fd number later
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+        self._fds[i] = os.open(self.paths[i], os.O_RDONLY)
+        return self._fds[i]
+
+    def read(self, i: int) -> int:
+        """Current value of the i-th file."""
+        try:
+            return int(os.pread(self._fds[i], _READ_BYTES, 0))
+        except (OSError, ValueError):
+            return int(os.pread(self._reopen(i), _READ_BYTES, 0))
+
+    def read_all(self) -> list:
+        """Current values of all files, in the order they were given."""
+        pread = os.pread
+        out = []
+        for i, fd in enumerate(self._fds):
+            try:
+                out.append(int(pread(fd, _READ_BYTES, 0)))
+            except (OSError, ValueError):
+                out.append(int(pread(self._reopen(i), _READ_BYTES, 0)))
+        return out
+
+    def close(self):
+        for fd in self._fds:
+            if fd < 0:
+                continue
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fds = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,38 @@
+# base-monitoring-client/tests/conftest.py
+import importlib
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def pb2(tmp_path_factory):
+    """
+    remote_pb2 (1.0) and remote_v2_pb2 (2.0), generated from the .proto files
+    with protoc or grpc_tools; the tests that need them skip without protobuf.
+    """
+    pytest.importorskip("google.protobuf")
+    out = str(tmp_path_factory.mktemp("pb2"))
+    protos = [
+        ("-I" + ROOT, os.path.join(ROOT, "remote.proto")),
+        ("-I" + HERE, os.path.join(HERE, "remote_v2.proto")),
+    ]
+    if shutil.which("protoc"):
+        protoc = ["protoc"]
+    else:
+        pytest.importorskip("grpc_tools")
+        protoc = [sys.executable, "-m", "grpc_tools.protoc"]
+    for include, proto in protos:
+        subprocess.run(protoc + [include, "--python_out=" + out, proto], check=True)
+    sys.path.insert(0, out)
+    try:
+        return importlib.import_module("remote_pb2"), importlib.import_module("remote_v2_pb2")
+    finally:
+        sys.path.remove(out)
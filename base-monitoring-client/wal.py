@@ -0,0 +1,263 @@
+# base-monitoring-client/wal.py
+"""
+Durable on-disk write-ahead buffer for unsent remote-write payloads.
+
+Payloads (already snappy-compressed) are appended to fixed-size, memory-mapped
+segment files in one directory:
+
+    <dir>/0000000000000001.seg
+    <dir>/0000000000000002.seg
+    ...
+
+Each record is a 12-byte header (payload length, crc32, acked flag) followed
+by the payload. A zero length marks the end of the written part of a segment.
+Acknowledged records are flagged in place; fully acknowledged segments are
+deleted. When the directory would exceed max_bytes, the oldest segment is
+evicted, pending records and all.
+
+After a restart the segments are scanned and every record that was not
+acknowledged is replayed again, oldest first.
+
+Once closed, the WAL ignores further calls (append stores nothing, peek
+finds nothing, ack does nothing): a sender thread still finishing a request
+at shutdown must not crash on it. What it sent but could not ack is on disk
+and replayed after the restart.
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import deque
+
+log = logging.getLogger("wal")
+
+_HEADER = struct.Struct("<IIB3x")  # length, crc32, acked
+_ACKED_OFFSET = 8
+_SUFFIX = ".seg"
+
+
+class _Segment:
+    def __init__(self, path: str, number: int, size: int, create: bool):
+        self.path = path
+        self.number = number
+        self.size = size
+        self.pending = 0
+        mode = "w+b" if create else "r+b"
+        with open(path, mode) as f:
+            if create:
+                f.truncate(size)
+            self.mm = mmap.mmap(f.fileno(), size)
+
+    def close(self):
+        self.mm.close()
+
+
+class SegmentWAL:
+    """Append / peek / ack queue of payloads backed by mmap'd segment files."""
+
+    def __init__(self, directory: str, segment_bytes: int, max_bytes: int):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max(2, max_bytes // segment_bytes)
+        self._lock = threading.Lock()
+        self._segments = {}  # number -> _Segment
+        self._records = deque()  # pending (segment number, offset, length), oldest first
+        self._pending_bytes = 0
+        self._write_segment = None
+        self._write_offset = 0
+        self._closed = False
+        self.evicted_records = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    # ---- recovery ----
+
+    def _recover(self):
+        numbers = sorted(
+            int(name[: -len(_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(_SUFFIX) and name[: -len(_SUFFIX)].isdigit()
+        )
+        for number in numbers:
+            path = self._path(number)
+            size = os.path.getsize(path)
+            if size < _HEADER.size:
+                os.unlink(path)
+                continue
+            seg = _Segment(path, number, size, create=False)
+            offset = self._scan(seg)
+            if seg.pending == 0 and number != numbers[-1]:
+                seg.close()
+                os.unlink(path)
+                continue
+            self._segments[number] = seg
+            self._write_segment = seg
+            self._write_offset = offset
+
+        if self._records:
+            log.info(
+                "WAL %s: recovered %d pending payloads (%d bytes)",
+                self.directory,
+                len(self._records),
+                self._pending_bytes,
+            )
+
+    def _scan(self, seg: _Segment) -> int:
+        """Index the unacknowledged records of seg; returns the end of written data."""
+        mm = seg.mm
+        offset = 0
+        while offset + _HEADER.size <= seg.size:
+            length, crc, acked = _HEADER.unpack_from(mm, offset)
+            end = offset + _HEADER.size + length
+            if length == 0 or end > seg.size:
+                break
+            if zlib.crc32(mm[offset + _HEADER.size : end]) != crc:
+                log.warning(
+                    "WAL %s: torn record at offset %d; ignoring the rest",
+                    seg.path,
+                    offset,
+                )
+                break
+            if not acked:
+                self._records.append((seg.number, offset, length))
+                self._pending_bytes += length
+                seg.pending += 1
+            offset = end
+        return offset
+
+    # ---- public API ----
+
+    def append(self, payload: bytes) -> bool:
+        length = len(payload)
+        if _HEADER.size + length > self.segment_bytes:
+            log.warning(
+                "WAL: payload of %d bytes exceeds WAL_SEGMENT_BYTES=%d; not stored",
+                length,
+                self.segment_bytes,
+            )
+            return False
+
+        with self._lock:
+            if self._closed:
+                return False
+            seg = self._write_segment
+            if seg is None or self._write_offset + _HEADER.size + length > seg.size:
+                seg = self._roll()
+            offset = self._write_offset
+            mm = seg.mm
+            # payload first, header last: a torn write leaves a zero length
+            mm[offset + _HEADER.size : offset + _HEADER.size + length] = payload
+            _HEADER.pack_into(mm, offset, length, zlib.crc32(payload), 0)
+            mm.flush()
+            self._write_offset = offset + _HEADER.size + length
+            self._records.append((seg.number, offset, length))
+            self._pending_bytes += length
+            seg.pending += 1
+        return True
+
+    def peek(self):
+        """Oldest pending payload as bytes, or None."""
+        with self._lock:
+            if self._closed or not self._records:
+                return None
+            number, offset, length = self._records[0]
+            start = offset + _HEADER.size
+            return self._segments[number].mm[start : start + length]
+
+    def peek_many(self, max_bytes: int):
+        """
+        Oldest pending payloads, in order, totalling at most max_bytes
+        (always at least one if anything is pending).
+        """
+        out = []
+        total = 0
+        with self._lock:
+            if self._closed:
+                return out
+            for number, offset, length in self._records:
+                if out and total + length > max_bytes:
+                    break
+                start = offset + _HEADER.size
+                out.append(self._segments[number].mm[start : start + length])
+                total += length
+        return out
+
+    def ack(self, count: int = 1):
+        """Mark the oldest `count` pending payloads (as returned by peek) as sent."""
+        with self._lock:
+            if self._closed:
+                return
+            for _ in range(min(count, len(self._records))):
+                number, offset, length = self._records.popleft()
+                self._pending_bytes -= length
+                seg = self._segments[number]
+                seg.mm[offset + _ACKED_OFFSET] = 1
+                seg.pending -= 1
+                if seg.pending == 0 and seg is not self._write_segment:
+                    self._drop_segment(seg)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for seg in self._segments.values():
+                seg.mm.flush()
+                seg.close()
+            self._segments.clear()
+            self._records.clear()  # still pending on disk
+            self._pending_bytes = 0
+            self._write_segment = None
+
+    def __len__(self):
+        return len(self._records)
+
+    @property
+    def pending_bytes(self) -> int:
+        return self._pending_bytes
+
+    # ---- internals (lock held) ----
+
+    def _path(self, number: int) -> str:
+        return os.path.join(self.directory, f"{number:016d}{_SUFFIX}")
+
+    def _roll(self) -> _Segment:
+        old = self._write_segment
+        if old is not None:
+            old.mm.flush()
+            if old.pending == 0:
+                self._drop_segment(old)
+
+        while len(self._segments) >= self.max_segments:
+            self._evict_oldest()
+
+        number = (old.number + 1) if old is not None else 1
+        seg = _Segment(self._path(number), number, self.segment_bytes, create=True)
+        self._segments[number] = seg
+        self._write_segment = seg
+        self._write_offset = 0
+        return seg
+
+    def _evict_oldest(self):
+        seg = self._segments[min(self._segments)]
+        lost = 0
+        while self._records and self._records[0][0] == seg.number:
+            _, _, length = self._records.popleft()
+            self._pending_bytes -= length
+            lost += 1
+        self.evicted_records += lost
+        log.warning(
+            "WAL size cap reached; evicting oldest segment %s (%d unsent payloads lost)",
+            os.path.basename(seg.path),
+            lost,
+        )
+        self._drop_segment(seg)
+
+    def _drop_segment(self, seg: _Segment):
+        del self._segments[seg.number]
+        seg.close()
+        try:
+            os.unlink(seg.path)
+        except FileNotFoundError:
+            pass
@@ -1,13 +1,17 @@
 # cpu-pyjoules/monitor_impl.py
 import os
 import time
-import datetime
 import logging
 import queue
 
 from pyJoules.energy_meter import measure_energy
 from pyJoules.handler import EnergyHandler
 
+from sample_batch import SampleBatch, series_id
+from clock import now_ms
+from scheduler import DeadlineScheduler
+from self_metrics import observe_scrape
+
 log = logging.getLogger("cpu-pyjoules")
 
 METRIC_DEFAULT = os.getenv("METRIC_DEFAULT", "pyjoules_remote_write_energy_uj")
@@ -47,28 +51,39 @@ class DictHandler(EnergyHandler):
 class power_scraper:
     def __init__(self):
         self.handler = DictHandler()
+        self.tick_perf = None  # perf_counter() at the tick ending the last measurement
 
-    def get_power(self, interval: float = 0.1):
-        @measure_energy(handler=self.handler)
-        def _sleep(interval: float = 0.1):
-            time.sleep(interval)
+    def get_power(self, scheduler):
+        """Energy used from now until the scheduler's next tick, or None once stopped."""
+        ticked = []
 
-        _sleep(interval)
+        @measure_energy(handler=self.handler)
+        def _until_next_tick():
+            ticked.append(scheduler.wait())
+            # the scrape starts here: pyJoules reads the counters on return
+            self.tick_perf = time.perf_counter()
+
+        _until_next_tick()
+        if ticked[0] is None:
+            self.handler.reset()
+            return None
         data = self.handler.get_single_dictionary()
         self.handler.reset()
-        # normalize timestamp to ISO UTC
-        data["timestamp"] = datetime.datetime.utcnow().isoformat()
+        # epoch ms on the shared clock
+        data["timestamp"] = now_ms()
         return data
 
 
-def _iso_to_ms(iso_str: str) -> int:
-    # allow "2025-11-09T08:47:30.123456" kind of strings
-    dt = datetime.datetime.fromisoformat(iso_str)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=datetime.timezone.utc)
-    else:
-        dt = dt.astimezone(datetime.timezone.utc)
-    return int(dt.timestamp() * 1000)
+# series ids are interned once per energy domain
+_SERIES_IDS: dict[str, int] = {}
+
+
+def _series(component: str) -> int:
+    sid = _SERIES_IDS.get(component)
+    if sid is None:
+        sid = series_id(METRIC_DEFAULT, {"component": component, "source": SERVICE_LABEL})
+        _SERIES_IDS[component] = sid
+    return sid
 
 
 # ─────────────────────────────
@@ -80,14 +95,20 @@ def get_power(output_queue: queue.Queue, scrape_interval_s: float, stop_event):
     to the first queue.
     """
     scraper = power_scraper()
+    scheduler = DeadlineScheduler(scrape_interval_s, stop_event)
     log.info("cpu-pyjoules get_power thread started (interval=%s)", scrape_interval_s)
-    while not stop_event.is_set():
-        data = scraper.get_power(interval=scrape_interval_s)
+    while True:
+        # each measurement ends on a tick, so samples stay scrape_interval_s
+        # apart however long reading and queueing take
+        data = scraper.get_power(scheduler)
+        if data is None:
+            return
+        t0 = scraper.tick_perf  # the wait for the tick is not part of the scrape
         try:
             output_queue.put(data, timeout=1)
         except queue.Full:
             log.warning("get_power: raw queue full; dropping measurement")
-        # scraper.get_power already slept for interval, so no extra sleep
+        observe_scrape(time.perf_counter() - t0, float(scrape_interval_s))
 
 
 # ─────────────────────────────
@@ -95,7 +116,7 @@ def get_power(output_queue: queue.Queue, scrape_interval_s: float, stop_event):
 # ─────────────────────────────
 def process_data(input_queue: queue.Queue, output_queue: queue.Queue, stop_event):
     """
-    Convert pyJoules-shaped dicts to *normalized* Prometheus records.
+    Convert pyJoules-shaped dicts to columnar SampleBatches for the pusher.
     """
     log.info("cpu-pyjoules process_data thread started (normalizing)")
     while not stop_event.is_set():
@@ -108,12 +129,12 @@ def process_data(input_queue: queue.Queue, output_queue: queue.Queue, stop_event
             log.warning("process_data: unexpected raw record %r", raw)
             continue
 
-        ts_ms = _iso_to_ms(raw["timestamp"])
+        ts_ms = int(raw["timestamp"])
         raw.pop("tag", None)
         duration = raw.pop("duration", None)
         raw.pop("timestamp", None)
 
-        normalized_batch = []
+        batch = SampleBatch()
 
         for component, uj_val in raw.items():
             try:
@@ -121,28 +142,18 @@ def process_data(input_queue: queue.Queue, output_queue: queue.Queue, stop_event
             except (TypeError, ValueError):
                 continue
 
-            normalized_batch.append(
-                {
-                    "metric": METRIC_DEFAULT,
-                    "labels": {
-                        "component": str(component),
-                        "source": SERVICE_LABEL,
-                    },
-                    "value": v,
-                    "timestamp_ms": ts_ms,
-                }
-            )
+            batch.append(_series(str(component)), v, ts_ms)
 
         # you could also emit duration as a separate metric here if you want
         # e.g. pyjoules_remote_write_duration_s
         # if duration is not None:
-        #     normalized_batch.append(...)
+        #     batch.append(...)
 
-        if not normalized_batch:
+        if not batch:
             continue
 
         try:
-            # we push the whole list and let the pusher flatten it
-            output_queue.put(normalized_batch, timeout=1)
+            # we push the whole batch; the pusher merges batches per push window
+            output_queue.put(batch, timeout=1)
         except queue.Full:
             log.warning("process_data: processed queue full; dropping batch")
@@ -1,10 +1,15 @@
 import os
 import time
 import glob
-import datetime
 import logging
 import queue
 
+from sample_batch import SampleBatch, series_id
+from clock import now_ns
+from scheduler import DeadlineScheduler
+from self_metrics import observe_scrape
+from sysfs_reader import SysfsReader
+
 log = logging.getLogger("orin-nx")
 
 # Metric names (override via env if you want)
@@ -15,16 +20,6 @@ METRIC_CURRENT_A = os.getenv("METRIC_CURRENT_A", "orin_nx_current_amps")
 SERVICE_LABEL = os.getenv("SERVICE_LABEL", "orin-nx")
 
 
-import datetime
-
-def get_value_from_read(path):
-    try: 
-        with open(path, 'r') as device_file:
-            return device_file.read()
-    except Exception as e:
-        print(f"Error in get_value_from_read: {e}")
-        return None
-
 class power_scraper:
     # https://docs.nvidia.com/jetson/archives/r36.4.3/DeveloperGuide/SD/PlatformPowerAndPerformance/JetsonOrinNanoSeriesJetsonOrinNxSeriesAndJetsonAgxOrinSeries.html#jetson-orin-nx-series-and-jetson-orin-nano-series
     def __init__(self) -> None:
@@ -37,27 +32,44 @@ class power_scraper:
         self.description = ['Total Module Power.', 
                             'Total power consumed by CPU, CPU and CV cores i.e. DLA and PVA',
                             'Power consumed by SOC core which supplies to memory subsystem and various engines like nvdec, nvenc, vi, vic, isp etc.',]
-        
+
+        # every rail's voltage and current file, opened once and re-read with pread
+        self.files = SysfsReader(
+            path
+            for address, channel in zip(self.address, self.channel)
+            for path in (
+                f'/sys/bus/i2c/drivers/ina3221/1-004{address}/hwmon/hwmon{address+1}/in{channel}_input',
+                f'/sys/bus/i2c/drivers/ina3221/1-004{address}/hwmon/hwmon{address+1}/curr{channel}_input',
+            )
+        )
+
     def get_power(self):
         power = {}
-        for (address, channel, name) in zip(self.address, self.channel, self.name):
+        values = self.files.read_all()
+        for k, name in enumerate(self.name):
             # Values from files are milli
-            v = int(get_value_from_read(f'/sys/bus/i2c/drivers/ina3221/1-004{address}/hwmon/hwmon{address+1}/in{channel}_input'))/1000
-            i = int(get_value_from_read(f'/sys/bus/i2c/drivers/ina3221/1-004{address}/hwmon/hwmon{address+1}/curr{channel}_input'))/1000
+            v = values[2 * k] / 1000
+            i = values[2 * k + 1] / 1000
             p = v * i
             temp_dir = {'Voltage': v, 'Current': i, 'Power': p}
             power[name] = temp_dir
-        power['timestamp'] = datetime.datetime.utcnow().isoformat()
+        power['timestamp'] = now_ns()
         return power
 
-def _iso_to_ms(iso_str: str) -> int:
-    # allow "2025-11-09T08:47:30.123456" kind of strings
-    dt = datetime.datetime.fromisoformat(iso_str)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=datetime.timezone.utc)
-    else:
-        dt = dt.astimezone(datetime.timezone.utc)
-    return int(dt.timestamp() * 1000)
+    def close(self):
+        self.files.close()
+
+# series ids are interned once per (metric, component)
+_SERIES_IDS: dict[tuple[str, str], int] = {}
+
+
+def _series(metric: str, component: str) -> int:
+    key = (metric, component)
+    sid = _SERIES_IDS.get(key)
+    if sid is None:
+        sid = series_id(metric, {"component": component, "source": SERVICE_LABEL})
+        _SERIES_IDS[key] = sid
+    return sid
 
 # ─────────────────────────────
 # API expected by base image
@@ -67,24 +79,24 @@ def get_power(output_queue: queue.Queue, scrape_interval_s: float, stop_event):
     scraper = power_scraper()
     log.info("orin-nx get_power thread started (interval=%s)", scrape_interval_s)
 
-    while not stop_event.is_set():
-        t0 = time.perf_counter()
-        data = scraper.get_power()
+    try:
+        # ticks on absolute deadlines, so the interval does not drift
+        for _tick in DeadlineScheduler(scrape_interval_s, stop_event):
+            t0 = time.perf_counter()
+            data = scraper.get_power()
 
-        try:
-            output_queue.put(data, timeout=1)
-        except queue.Full:
-            log.warning("get_power: raw queue full; dropping measurement")
+            try:
+                output_queue.put(data, timeout=1)
+            except queue.Full:
+                log.warning("get_power: raw queue full; dropping measurement")
 
-        # keep a roughly stable interval (scrape itself takes some time)
-        elapsed = time.perf_counter() - t0
-        sleep_s = max(0.0, float(scrape_interval_s) - elapsed)
-        if sleep_s:
-            time.sleep(sleep_s)
+            observe_scrape(time.perf_counter() - t0, float(scrape_interval_s))
+    finally:
+        scraper.close()
 
 
 def process_data(input_queue: queue.Queue, output_queue: queue.Queue, stop_event):
-    """Convert raw scraper dicts to normalized Prometheus remote-write records."""
+    """Convert raw scraper dicts to columnar SampleBatches for the pusher."""
     log.info("orin-nx process_data thread started (normalizing)")
 
     while not stop_event.is_set():
@@ -98,12 +110,12 @@ def process_data(input_queue: queue.Queue, output_queue: queue.Queue, stop_event
             continue
 
         try:
-            ts_ms = _iso_to_ms(str(raw["timestamp"]))
-        except Exception as e:
+            ts_ns = int(raw["timestamp"])
+        except (TypeError, ValueError) as e:
             log.warning("process_data: bad timestamp %r (%s)", raw.get("timestamp"), e)
             continue
 
-        normalized_batch: list[dict] = []
+        batch = SampleBatch()
 
         for component, payload in raw.items():
             if component == "timestamp":
@@ -119,40 +131,19 @@ def process_data(input_queue: queue.Queue, output_queue: queue.Queue, stop_event
 
             try:
                 if v is not None:
-                    normalized_batch.append(
-                        {
-                            "metric": METRIC_VOLTAGE_V,
-                            "labels": {"component": str(component), "source": SERVICE_LABEL},
-                            "value": float(v),
-                            "timestamp_ms": ts_ms,
-                        }
-                    )
+                    batch.append_ns(_series(METRIC_VOLTAGE_V, str(component)), float(v), ts_ns)
                 if i is not None:
-                    normalized_batch.append(
-                        {
-                            "metric": METRIC_CURRENT_A,
-                            "labels": {"component": str(component), "source": SERVICE_LABEL},
-                            "value": float(i),
-                            "timestamp_ms": ts_ms,
-                        }
-                    )
+                    batch.append_ns(_series(METRIC_CURRENT_A, str(component)), float(i), ts_ns)
                 if p is not None:
-                    normalized_batch.append(
-                        {
-                            "metric": METRIC_POWER_W,
-                            "labels": {"component": str(component), "source": SERVICE_LABEL},
-                            "value": float(p),
-                            "timestamp_ms": ts_ms,
-                        }
-                    )
+                    batch.append_ns(_series(METRIC_POWER_W, str(component)), float(p), ts_ns)
             except (TypeError, ValueError):
                 continue
 
-        if not normalized_batch:
+        if not batch:
             continue
 
         try:
-            # push the whole list and let the pusher flatten it
-            output_queue.put(normalized_batch, timeout=1)
+            # push the whole batch; the pusher merges batches per push window
+            output_queue.put(batch, timeout=1)
         except queue.Full:
             log.warning("process_data: processed queue full; dropping batch")
@@ -5,6 +5,10 @@ set -eu
 : "${PROMETHEUS_SCRAPE_INTERVAL:=2}"
 : "${PROMETHEUS_EVALUATE_INTERVAL:=1}"
 : "${PROMETHEUS_TARGET:=prometheus:9090}"
+# pull-mode clients (OUTPUT_MODE=pull/both): comma- or space-separated host:port list
+: "${PROMETHEUS_SCRAPE_TARGETS:=}"
+: "${PROMETHEUS_SCRAPE_JOB:=monitoring-clients}"
+: "${PROMETHEUS_CLIENT_SCRAPE_INTERVAL:=${PROMETHEUS_SCRAPE_INTERVAL}}"
 
 # -------- write out the real config file -----------------------------
 cat > /etc/prometheus/prometheus.yml <<EOF
@@ -18,6 +22,20 @@ scrape_configs:
       - targets: ["${PROMETHEUS_TARGET}"]
 EOF
 
+# -------- scrape job for pull-mode clients ---------------------------
+targets=""
+for target in $(echo "${PROMETHEUS_SCRAPE_TARGETS}" | tr ',' ' '); do
+  targets="${targets:+${targets}, }\"${target}\""
+done
+if [ -n "${targets}" ]; then
+  cat >> /etc/prometheus/prometheus.yml <<EOF
+  - job_name: "${PROMETHEUS_SCRAPE_JOB}"
+    scrape_interval: ${PROMETHEUS_CLIENT_SCRAPE_INTERVAL}s
+    static_configs:
+      - targets: [${targets}]
+EOF
+fi
+
 # -------- start prometheus ------------------------------------------
 exec /bin/prometheus \
   --config.file=/etc/prometheus/prometheus.yml \
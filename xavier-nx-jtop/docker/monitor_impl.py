@@ -1,6 +1,5 @@
 import os
 import time
-import datetime
 import logging
 import queue
 from dataclasses import dataclass
@@ -8,6 +7,11 @@ from typing import Any, Callable
 
 from jtop import jtop
 
+from sample_batch import SampleBatch, series_id
+from clock import now_ms
+from scheduler import DeadlineScheduler
+from self_metrics import observe_scrape
+
 log = logging.getLogger("xavier-nx-jtop")
 
 
@@ -42,19 +46,6 @@ def _safe_float(value: Any) -> float | None:
         return None
 
 
-def _utc_iso() -> str:
-    return datetime.datetime.utcnow().isoformat()
-
-
-def _iso_to_ms(iso_str: str) -> int:
-    dt = datetime.datetime.fromisoformat(iso_str)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=datetime.timezone.utc)
-    else:
-        dt = dt.astimezone(datetime.timezone.utc)
-    return int(dt.timestamp() * 1000)
-
-
 def _sanitize_component(value: Any) -> str:
     """
     Keep label values readable and stable.
@@ -353,7 +344,7 @@ class power_scraper:
         now = time.monotonic()
 
         raw: dict[str, Any] = {
-            "timestamp": _utc_iso(),
+            "timestamp": now_ms(),
         }
 
         for spec in COLLECTORS:
@@ -402,18 +393,11 @@ def get_power(output_queue, scrape_interval_s, stop_event):
     It does NOT wait on jetson.ok().
     It does NOT use jtop's update interval as the exporter interval.
 
-    Timing behavior per batch:
-
-        batch_start = time.monotonic()
-        collect one full batch
-        push raw batch to queue
-        elapsed = time.monotonic() - batch_start
-
-        if elapsed < SCRAPE_INTERVAL_S:
-            sleep(SCRAPE_INTERVAL_S - elapsed)
-        else:
-            do not sleep
-            print warning
+    Batches start on the absolute deadlines of a DeadlineScheduler
+    (scheduler.py), every SCRAPE_INTERVAL_S on a wall-clock-aligned grid.
+    A batch slower than the interval makes the next deadlines pass; what
+    happens to those is the scheduler's missed-tick policy (skipped ticks
+    are logged as a warning).
     """
 
     requested_interval_s = max(float(scrape_interval_s), 0.0)
@@ -432,6 +416,8 @@ def get_power(output_queue, scrape_interval_s, stop_event):
     )
 
     scraper = power_scraper()
+    # created once, so reconnects keep the sampling grid
+    scheduler = DeadlineScheduler(requested_interval_s, stop_event)
     batch_counter = 0
 
     while not stop_event.is_set():
@@ -451,10 +437,20 @@ def get_power(output_queue, scrape_interval_s, stop_event):
                     requested_interval_s,
                 )
 
-                while not stop_event.is_set():
+                for tick in scheduler:
                     batch_start_monotonic = time.monotonic()
                     batch_counter += 1
 
+                    if tick.skipped:
+                        log.warning(
+                            "jtop batch #%d is %.6fs late; skipped %d tick(s) "
+                            "of the requested interval %.6fs",
+                            batch_counter,
+                            tick.lateness_s + tick.skipped * requested_interval_s,
+                            tick.skipped,
+                            requested_interval_s,
+                        )
+
                     # Do not call jetson.ok() here.
                     #
                     # We only check whether the jtop background thread has
@@ -493,29 +489,7 @@ def get_power(output_queue, scrape_interval_s, stop_event):
                         )
 
                     batch_elapsed_s = time.monotonic() - batch_start_monotonic
-                    sleep_s = requested_interval_s - batch_elapsed_s
-
-                    if sleep_s > 0:
-                        log.debug(
-                            "jtop batch #%d took %.6fs; sleeping %.6fs "
-                            "to match requested interval %.6fs",
-                            batch_counter,
-                            batch_elapsed_s,
-                            sleep_s,
-                            requested_interval_s,
-                        )
-
-                        stop_event.wait(sleep_s)
-
-                    else:
-                        log.warning(
-                            "jtop batch #%d took %.6fs, which is slower than "
-                            "the requested interval %.6fs. "
-                            "Not sleeping before next batch.",
-                            batch_counter,
-                            batch_elapsed_s,
-                            requested_interval_s,
-                        )
+                    observe_scrape(batch_elapsed_s, requested_interval_s)
 
         except Exception as exc:
             log.exception(
@@ -527,7 +501,7 @@ def get_power(output_queue, scrape_interval_s, stop_event):
 
 def process_data(input_queue: queue.Queue, output_queue: queue.Queue, stop_event):
     """
-    Convert raw jtop dictionaries to normalized Prometheus remote-write records.
+    Convert raw jtop dictionaries to columnar SampleBatches for the pusher.
     """
     log.info("xavier-nx-jtop process_data thread started (normalizing)")
 
@@ -539,6 +513,9 @@ def process_data(input_queue: queue.Queue, output_queue: queue.Queue, stop_event
         "thermal": METRIC_THERMAL,
     }
 
+    # series ids are interned once per (metric, component)
+    series_ids: dict[tuple[str, str], int] = {}
+
     while not stop_event.is_set():
         try:
             raw = input_queue.get(timeout=1)
@@ -550,12 +527,12 @@ def process_data(input_queue: queue.Queue, output_queue: queue.Queue, stop_event
             continue
 
         try:
-            ts_ms = _iso_to_ms(str(raw["timestamp"]))
+            ts_ms = int(raw["timestamp"])
         except Exception as e:
             log.warning("process_data: bad timestamp %r (%s)", raw.get("timestamp"), e)
             continue
 
-        normalized_batch: list[dict[str, Any]] = []
+        batch = SampleBatch()
 
         for section_name, metric_name in metric_by_section.items():
             section_values = raw.get(section_name)
@@ -567,22 +544,21 @@ def process_data(input_queue: queue.Queue, output_queue: queue.Queue, stop_event
                 if v is None:
                     continue
 
-                normalized_batch.append(
-                    {
-                        "metric": metric_name,
-                        "labels": {
-                            "component": str(component),
-                            "source": SERVICE_LABEL,
-                        },
-                        "value": v,
-                        "timestamp_ms": ts_ms,
-                    }
-                )
+                key = (metric_name, str(component))
+                sid = series_ids.get(key)
+                if sid is None:
+                    sid = series_id(
+                        metric_name,
+                        {"component": key[1], "source": SERVICE_LABEL},
+                    )
+                    series_ids[key] = sid
+
+                batch.append(sid, v, ts_ms)
 
-        if not normalized_batch:
+        if not batch:
             continue
 
         try:
-            output_queue.put(normalized_batch, timeout=1)
+            output_queue.put(batch, timeout=1)
         except queue.Full:
             log.warning("process_data: processed queue full; dropping batch")
\ No newline at end of file